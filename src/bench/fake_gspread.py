@@ -0,0 +1,622 @@
+'''
+Эмуляция Google Sheets в памяти процесса для бенчмарков my_gspread и автопилотов.
+
+FakeClient / FakeSpreadsheet / FakeWorksheet повторяют методы gspread, которые используют скрипты
+(get, get_values, update, update_cell, batch_clear, clear, col_values, row_values, append_rows,
+delete_rows, add_rows, add_cols, get_all_values, values_batch_get, batch_update, format),
+считают запросы к API (чтения/записи, ячейки, байты) и имитируют квоту и задержку ответа.
+
+Квота и задержка по умолчанию не тормозят прогон: время, которое ушло бы на ожидание,
+накапливается в stats (simulated_seconds); с realtime=True процесс действительно спит.
+
+Пример:
+    client = FakeClient(latency=0.3)
+    table = client.create('UNIT 2.0 (tested)')
+    table.seed_worksheet('MAIN (tested)', [['wild', 'Артикул'], ['wild1', '123']])
+    uninstall = install(client)     # my_gspread.init_client() вернёт fake-клиент
+    ...
+    print(client.stats.summary())
+'''
+import os
+import re
+import json
+import time
+import itertools
+from collections import Counter
+from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+
+# те же лимиты, что у QuotaHTTPClient (utils/my_sheets_quota.py)
+SHEETS_READ_PER_MINUTE = int(os.getenv('SHEETS_READ_PER_MINUTE', 60))
+SHEETS_WRITE_PER_MINUTE = int(os.getenv('SHEETS_WRITE_PER_MINUTE', 60))
+SHEETS_BURST = int(os.getenv('SHEETS_BURST', 10))
+
+# лимит ячеек в одной таблице Google Sheets
+SHEETS_MAX_CELLS = 10_000_000
+
+_ids = itertools.count(1000)
+
+
+class FakeSheetsError(Exception):
+    '''Ошибка, которую вернул бы Sheets API (выход за сетку листа, лимит ячеек и т.п.)'''
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+# -------------------------------- УЧЁТ ЗАПРОСОВ --------------------------------
+
+
+class SheetsStats:
+    '''
+    Счётчики запросов к Sheets: по методам, чтения/записи, ячейки и байты в каждую сторону,
+    время имитированных задержек и ожидания квоты.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.reads = 0
+        self.writes = 0
+        self.cells_read = 0
+        self.cells_written = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.latency_seconds = 0.0
+        self.quota_wait_seconds = 0.0
+
+    def summary(self):
+        return {
+            'calls': dict(self.calls),
+            'total_calls': self.reads + self.writes,
+            'reads': self.reads,
+            'writes': self.writes,
+            'cells_read': self.cells_read,
+            'cells_written': self.cells_written,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'latency_seconds': round(self.latency_seconds, 3),
+            'quota_wait_seconds': round(self.quota_wait_seconds, 3),
+            'simulated_seconds': round(self.latency_seconds + self.quota_wait_seconds, 3),
+        }
+
+
+def _payload(values):
+    # размер тела запроса/ответа: значения, как их сериализует API
+    return len(json.dumps(values, ensure_ascii=False).encode('utf-8'))
+
+
+def _cells(values):
+    return sum(len(row) for row in values)
+
+
+class SheetsBackend:
+    '''
+    Общее для клиента состояние: учёт запросов, квота чтений и записей (token bucket на минуту),
+    задержка ответа. Без realtime время не тратится, а копится в stats.
+    '''
+
+    def __init__(self, latency=0.0, read_per_minute=SHEETS_READ_PER_MINUTE,
+                 write_per_minute=SHEETS_WRITE_PER_MINUTE, burst=SHEETS_BURST, realtime=False):
+        self.latency = latency
+        self.realtime = realtime
+        self.stats = SheetsStats()
+        self.quota = {kind: {'rate': rate, 'tokens': burst, 'updated_at': 0.0}
+                      for kind, rate in (('read', read_per_minute), ('write', write_per_minute))}
+        self.burst = burst
+        self._started = time.monotonic()
+
+    def now(self):
+        # время с учётом имитированного ожидания
+        elapsed = time.monotonic() - self._started
+        return elapsed if self.realtime else elapsed + self.stats.latency_seconds + self.stats.quota_wait_seconds
+
+    def _wait(self, seconds, counter):
+        setattr(self.stats, counter, getattr(self.stats, counter) + seconds)
+        if self.realtime:
+            time.sleep(seconds)
+
+    def call(self, method, kind):
+        self.stats.calls[method] += 1
+        if kind == 'read':
+            self.stats.reads += 1
+        else:
+            self.stats.writes += 1
+
+        bucket = self.quota[kind]
+        if bucket['rate']:
+            now = self.now()
+            bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated_at']) * bucket['rate'] / 60)
+            bucket['updated_at'] = now
+            if bucket['tokens'] < 1:
+                wait = (1 - bucket['tokens']) * 60 / bucket['rate']
+                self._wait(wait, 'quota_wait_seconds')
+                bucket['updated_at'] += wait
+                bucket['tokens'] = 1
+            bucket['tokens'] -= 1
+
+        if self.latency:
+            self._wait(self.latency, 'latency_seconds')
+
+    def read(self, values):
+        self.stats.cells_read += _cells(values)
+        self.stats.bytes_read += _payload(values)
+        return values
+
+    def written(self, values):
+        self.stats.cells_written += _cells(values)
+        self.stats.bytes_written += _payload(values)
+
+
+
+
+# -------------------------------- ДИАПАЗОНЫ --------------------------------
+
+
+_A1 = re.compile(r'^([A-Z]*)(\d*)$')
+
+
+def _col_num(letters):
+    num = 0
+    for ch in letters:
+        num = num * 26 + ord(ch) - ord('A') + 1
+    return num
+
+
+def split_sheet_name(a1):
+    '''"'Лист'!A1:B2" -> ('Лист', 'A1:B2'); диапазон без листа -> (None, диапазон)'''
+    if '!' in a1:
+        name, rng = a1.rsplit('!', 1)
+        return name.strip("'").replace("''", "'"), rng
+    if a1.startswith("'") or not re.match(r'^[A-Z]*\d*(:[A-Z]*\d*)?$', a1):
+        return a1.strip("'").replace("''", "'"), ''
+    return None, a1
+
+
+def parse_range(a1, row_count, col_count):
+    '''
+    A1-диапазон -> (первая строка, первая колонка, последняя строка, последняя колонка), нумерация с 1.
+    Открытые границы ('A:A', '2:10', 'A2:C') и пустой диапазон (весь лист) ограничиваются сеткой.
+    '''
+    if not a1:
+        return 1, 1, row_count, col_count
+    start, _, end = a1.upper().partition(':')
+    start_col, start_row = _A1.match(start).groups()
+    if not end:
+        end_col, end_row = start_col, start_row
+    else:
+        end_col, end_row = _A1.match(end).groups()
+    r0 = int(start_row) if start_row else 1
+    c0 = _col_num(start_col) if start_col else 1
+    r1 = int(end_row) if end_row else row_count
+    c1 = _col_num(end_col) if end_col else col_count
+    return r0, c0, r1, c1
+
+
+def _trim(values):
+    # как Sheets API: без пустых хвостов строк и пустых строк в конце
+    rows = []
+    for row in values:
+        while row and row[-1] == '':
+            row = row[:-1]
+        rows.append(row)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return str(value)
+
+
+
+
+# -------------------------------- ЛИСТ --------------------------------
+
+
+class FakeWorksheet:
+    '''
+    Лист: сетка row_count x col_count, значения хранятся строками (как их отдаёт API).
+    Формулы хранятся как текст и возвращаются как есть при любом value_render_option.
+    '''
+
+    def __init__(self, spreadsheet, title, rows=1000, cols=26, sheet_id=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id if sheet_id is not None else next(_ids)
+        self.row_count = int(rows)
+        self.col_count = int(cols)
+        self.hidden = False
+        self._cells = {}    # {(строка, колонка): значение}, нумерация с 1
+
+    @property
+    def spreadsheet_id(self):
+        return self.spreadsheet.id
+
+    @property
+    def _backend(self):
+        return self.spreadsheet.client.backend
+
+    def __repr__(self):
+        return f"<FakeWorksheet '{self.title}' id:{self.id}>"
+
+    # ---- внутреннее (без учёта запросов) ----
+
+    def _values(self, r0, c0, r1, c1):
+        r1, c1 = min(r1, self.row_count), min(c1, self.col_count)
+        return [[self._cells.get((r, c), '') for c in range(c0, c1 + 1)] for r in range(r0, r1 + 1)]
+
+    def _write(self, values, r0, c0):
+        r1 = r0 + len(values) - 1
+        c1 = c0 + max((len(row) for row in values), default=1) - 1
+        if r1 > self.row_count or c1 > self.col_count:
+            raise FakeSheetsError(400, f"Range ({self.title}!R{r0}C{c0}:R{r1}C{c1}) exceeds grid limits. "
+                                       f"Max rows: {self.row_count}, max columns: {self.col_count}")
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                value = _cell(value)
+                if value == '':
+                    self._cells.pop((r0 + i, c0 + j), None)
+                else:
+                    self._cells[(r0 + i, c0 + j)] = value
+
+    def _clear(self, r0, c0, r1, c1):
+        for key in [k for k in self._cells if r0 <= k[0] <= r1 and c0 <= k[1] <= c1]:
+            del self._cells[key]
+
+    def _range(self, a1):
+        _, rng = split_sheet_name(a1 or '')
+        return parse_range(rng, self.row_count, self.col_count)
+
+    def _resize(self, rows=None, cols=None):
+        if rows is not None:
+            self.row_count = int(rows)
+        if cols is not None:
+            self.col_count = int(cols)
+        self.spreadsheet._check_cells()
+        self._cells = {k: v for k, v in self._cells.items() if k[0] <= self.row_count and k[1] <= self.col_count}
+
+    def seed(self, values, start_row=1):
+        '''Заполняет лист данными без учёта запросов (подготовка бенчмарка); сетка расширяется по данным.'''
+        width = max((len(row) for row in values), default=0)
+        self.row_count = max(self.row_count, start_row + len(values) - 1)
+        self.col_count = max(self.col_count, width)
+        self._write(values, start_row, 1)
+        return self
+
+    # ---- чтение ----
+
+    def get(self, range_name=None, **kwargs):
+        self._backend.call('get', 'read')
+        return self._backend.read(_trim(self._values(*self._range(range_name))))
+
+    def get_values(self, range_name=None, **kwargs):
+        # gspread 6: get_values дополняет строки пустыми значениями до прямоугольника
+        self._backend.call('get_values', 'read')
+        values = _trim(self._values(*self._range(range_name)))
+        width = max((len(row) for row in values), default=0)
+        return self._backend.read([row + [''] * (width - len(row)) for row in values])
+
+    def get_all_values(self, **kwargs):
+        self._backend.call('get_all_values', 'read')
+        values = _trim(self._values(1, 1, self.row_count, self.col_count))
+        width = max((len(row) for row in values), default=0)
+        return self._backend.read([row + [''] * (width - len(row)) for row in values])
+
+    def col_values(self, col, **kwargs):
+        self._backend.call('col_values', 'read')
+        values = [row[0] if row else '' for row in _trim(self._values(1, col, self.row_count, col))]
+        self._backend.read([values])
+        return values
+
+    def row_values(self, row, **kwargs):
+        self._backend.call('row_values', 'read')
+        values = (_trim(self._values(row, 1, row, self.col_count)) or [[]])[0]
+        self._backend.read([values])
+        return values
+
+    def acell(self, label, **kwargs):
+        self._backend.call('acell', 'read')
+        r0, c0, _, _ = self._range(label)
+        return self._cells.get((r0, c0), '')
+
+    # ---- запись ----
+
+    def update(self, values=None, range_name=None, **kwargs):
+        # gspread 6: update(values, range_name); одно значение в range_name допускается как в gspread
+        if isinstance(values, str) and isinstance(range_name, list):
+            values, range_name = range_name, values
+        if not isinstance(values, list):
+            values = [[values]]
+        elif values and not isinstance(values[0], list):
+            values = [values]
+        self._backend.call('update', 'write')
+        r0, c0, r1, c1 = self._range(range_name or 'A1')
+        if ':' in (range_name or ''):
+            # как API: данные не должны выходить за явно заданный диапазон
+            if r0 + len(values) - 1 > r1 or c0 + max((len(row) for row in values), default=0) - 1 > c1:
+                raise FakeSheetsError(400, f"Requested writing within range [{range_name}], but tried writing outside of it")
+        self._write(values, r0, c0)
+        self._backend.written(values)
+        return {'updatedRange': range_name, 'updatedRows': len(values), 'updatedCells': _cells(values)}
+
+    def update_cell(self, row, col, value):
+        self._backend.call('update_cell', 'write')
+        self._write([[value]], row, col)
+        self._backend.written([[value]])
+
+    def update_acell(self, label, value):
+        r0, c0, _, _ = self._range(label)
+        return self.update_cell(r0, c0, value)
+
+    def batch_clear(self, ranges):
+        self._backend.call('batch_clear', 'write')
+        for a1 in ranges:
+            self._clear(*self._range(a1))
+
+    def clear(self):
+        self._backend.call('clear', 'write')
+        self._cells = {}
+
+    def append_rows(self, values, **kwargs):
+        # как values.append: пишет после последней заполненной строки, расширяя сетку
+        self._backend.call('append_rows', 'write')
+        last_row = max((r for r, _ in self._cells), default=0)
+        width = max((len(row) for row in values), default=0)
+        if last_row + len(values) > self.row_count or width > self.col_count:
+            self._resize(max(self.row_count, last_row + len(values)), max(self.col_count, width))
+        self._write(values, last_row + 1, 1)
+        self._backend.written(values)
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._backend.call('delete_rows', 'write')
+        end_index = end_index or start_index
+        count = end_index - start_index + 1
+        cells = {}
+        for (r, c), value in self._cells.items():
+            if r < start_index:
+                cells[(r, c)] = value
+            elif r > end_index:
+                cells[(r - count, c)] = value
+        self._cells = cells
+        self.row_count -= count
+
+    def add_rows(self, rows):
+        self._backend.call('add_rows', 'write')
+        self._resize(rows=self.row_count + int(rows))
+
+    def add_cols(self, cols):
+        self._backend.call('add_cols', 'write')
+        self._resize(cols=self.col_count + int(cols))
+
+    def resize(self, rows=None, cols=None):
+        self._backend.call('resize', 'write')
+        self._resize(rows, cols)
+
+    def format(self, ranges, format, **kwargs):
+        # оформление не хранится, учитывается только запрос
+        self._backend.call('format', 'write')
+
+    def batch_update(self, data, **kwargs):
+        # values.batchUpdate: [{'range': 'A1', 'values': [[...]]}, ...] - один запрос
+        self._backend.call('worksheet.batch_update', 'write')
+        for item in data:
+            r0, c0, _, _ = self._range(item['range'])
+            self._write(item['values'], r0, c0)
+            self._backend.written(item['values'])
+
+
+
+
+# -------------------------------- ТАБЛИЦА И КЛИЕНТ --------------------------------
+
+
+def _grid_bounds(grid, sheet):
+    return (grid.get('startRowIndex', 0) + 1, grid.get('startColumnIndex', 0) + 1,
+            grid.get('endRowIndex', sheet.row_count), grid.get('endColumnIndex', sheet.col_count))
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, title, spreadsheet_id=None):
+        self.client = client
+        self.title = title
+        self.id = spreadsheet_id or f"fake-{next(_ids)}"
+        self._sheets = []
+
+    @property
+    def url(self):
+        return f"https://docs.google.com/spreadsheets/d/{self.id}"
+
+    def __repr__(self):
+        return f"<FakeSpreadsheet '{self.title}' id:{self.id}>"
+
+    def _check_cells(self):
+        cells = sum(ws.row_count * ws.col_count for ws in self._sheets)
+        if cells > SHEETS_MAX_CELLS:
+            raise FakeSheetsError(400, f"This action would increase the number of cells in the workbook above the limit of {SHEETS_MAX_CELLS} cells.")
+
+    def _sheet_by_id(self, sheet_id):
+        for ws in self._sheets:
+            if ws.id == sheet_id:
+                return ws
+        raise FakeSheetsError(400, f"No grid with id: {sheet_id}")
+
+    def _sheet_by_title(self, title):
+        for ws in self._sheets:
+            if ws.title == title:
+                return ws
+        raise WorksheetNotFound(title)
+
+    def seed_worksheet(self, title, values=(), rows=1000, cols=26):
+        '''Создаёт лист с данными без учёта запросов (подготовка бенчмарка).'''
+        ws = FakeWorksheet(self, title, rows, cols)
+        self._sheets.append(ws)
+        ws.seed([list(row) for row in values])
+        self._check_cells()
+        return ws
+
+    # ---- методы gspread ----
+
+    def worksheet(self, title):
+        self.client.backend.call('worksheet', 'read')
+        return self._sheet_by_title(title)
+
+    def worksheets(self, exclude_hidden=False):
+        self.client.backend.call('worksheets', 'read')
+        return [ws for ws in self._sheets if not (exclude_hidden and ws.hidden)]
+
+    def get_worksheet(self, index):
+        self.client.backend.call('get_worksheet', 'read')
+        return self._sheets[index] if index < len(self._sheets) else None
+
+    @property
+    def sheet1(self):
+        return self.get_worksheet(0)
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self.client.backend.call('add_worksheet', 'write')
+        if any(ws.title == title for ws in self._sheets):
+            raise FakeSheetsError(400, f'A sheet with the name "{title}" already exists.')
+        ws = FakeWorksheet(self, title, rows, cols)
+        self._sheets.insert(len(self._sheets) if index is None else index, ws)
+        self._check_cells()
+        return ws
+
+    def del_worksheet(self, worksheet):
+        self.client.backend.call('del_worksheet', 'write')
+        self._sheets.remove(worksheet)
+
+    def values_batch_get(self, ranges, params=None):
+        self.client.backend.call('values_batch_get', 'read')
+        value_ranges = []
+        for a1 in ranges:
+            name, rng = split_sheet_name(a1)
+            ws = self._sheet_by_title(name) if name else self._sheets[0]
+            values = self.client.backend.read(_trim(ws._values(*parse_range(rng, ws.row_count, ws.col_count))))
+            value_range = {'range': a1, 'majorDimension': 'ROWS'}
+            if values:
+                value_range['values'] = values
+            value_ranges.append(value_range)
+        return {'spreadsheetId': self.id, 'valueRanges': value_ranges}
+
+    def batch_update(self, body):
+        '''
+        spreadsheets.batchUpdate - один запрос. Поддерживаются duplicateSheet, copyPaste, deleteSheet,
+        updateSheetProperties (hidden/title); остальные запросы (оформление и т.п.) только учитываются.
+        '''
+        self.client.backend.call('batch_update', 'write')
+        replies = []
+        for request in body.get('requests', []):
+            reply = {}
+            if 'duplicateSheet' in request:
+                params = request['duplicateSheet']
+                source = self._sheet_by_id(params['sourceSheetId'])
+                copy = FakeWorksheet(self, params.get('newSheetName') or f"Копия {source.title}",
+                                     source.row_count, source.col_count, params.get('newSheetId'))
+                copy._cells = dict(source._cells)
+                self._sheets.insert(params.get('insertSheetIndex', len(self._sheets)), copy)
+                self._check_cells()
+                reply = {'duplicateSheet': {'properties': {'sheetId': copy.id, 'title': copy.title}}}
+            elif 'copyPaste' in request:
+                params = request['copyPaste']
+                source = self._sheet_by_id(params['source']['sheetId'])
+                destination = self._sheet_by_id(params['destination']['sheetId'])
+                r0, c0, r1, c1 = _grid_bounds(params['source'], source)
+                d0, e0, _, _ = _grid_bounds(params['destination'], destination)
+                values = source._values(r0, c0, r1, c1)
+                destination._clear(d0, e0, d0 + len(values) - 1, e0 + c1 - c0)
+                destination._write(values, d0, e0)
+            elif 'deleteSheet' in request:
+                self._sheets.remove(self._sheet_by_id(request['deleteSheet']['sheetId']))
+            elif 'updateSheetProperties' in request:
+                props = request['updateSheetProperties']['properties']
+                ws = self._sheet_by_id(props['sheetId'])
+                ws.hidden = props.get('hidden', ws.hidden)
+                ws.title = props.get('title', ws.title)
+            replies.append(reply)
+        return {'spreadsheetId': self.id, 'replies': replies}
+
+
+class FakeClient:
+    '''
+    Клиент gspread в памяти: таблицы создаются через create() и заполняются через seed_worksheet().
+    Счётчики запросов всех таблиц клиента - в client.stats.
+    '''
+
+    def __init__(self, latency=0.0, read_per_minute=SHEETS_READ_PER_MINUTE,
+                 write_per_minute=SHEETS_WRITE_PER_MINUTE, burst=SHEETS_BURST, realtime=False):
+        self.backend = SheetsBackend(latency, read_per_minute, write_per_minute, burst, realtime)
+        self._spreadsheets = {}
+
+    @property
+    def stats(self):
+        return self.backend.stats
+
+    def create(self, title, spreadsheet_id=None):
+        '''Создаёт таблицу без учёта запросов (подготовка бенчмарка).'''
+        table = FakeSpreadsheet(self, title, spreadsheet_id)
+        self._spreadsheets[table.id] = table
+        return table
+
+    def open(self, title, folder_id=None):
+        # поиск по Drive + метаданные таблицы - два запроса
+        self.backend.call('drive.list', 'read')
+        self.backend.call('open', 'read')
+        for table in self._spreadsheets.values():
+            if table.title == title:
+                return table
+        raise SpreadsheetNotFound(title)
+
+    def open_by_key(self, key):
+        self.backend.call('open_by_key', 'read')
+        if key not in self._spreadsheets:
+            raise SpreadsheetNotFound(key)
+        return self._spreadsheets[key]
+
+    def open_by_url(self, url):
+        match = re.search(r'/spreadsheets/d/([a-zA-Z0-9_-]+)', url)
+        if not match:
+            raise SpreadsheetNotFound(url)
+        return self.open_by_key(match.group(1))
+
+
+
+
+# -------------------------------- ПОДКЛЮЧЕНИЕ К MY_GSPREAD --------------------------------
+
+
+def install(client):
+    '''
+    Подменяет gspread.service_account на выдачу client и сбрасывает кэши my_gspread,
+    так что init_client/open_spreadsheet/get_worksheet начинают работать с fake-таблицами.
+    Возвращает функцию, которая возвращает всё как было.
+    '''
+    import gspread
+    from utils import my_gspread
+
+    original = gspread.service_account
+    gspread.service_account = lambda *args, **kwargs: client
+
+    def reset_caches():
+        my_gspread._clients.clear()
+        my_gspread._spreadsheets.clear()
+        my_gspread._worksheets.clear()
+        my_gspread._snapshots.clear()
+        my_gspread.invalidate_headers()
+        my_gspread._spreadsheet_ids = None
+
+    def uninstall():
+        gspread.service_account = original
+        reset_caches()
+
+    reset_caches()
+    return uninstall
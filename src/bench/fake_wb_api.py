@@ -0,0 +1,552 @@
+'''
+Локальная заглушка WB API для нагрузочных и регрессионных прогонов загрузчиков без реальных запросов к WB.
+
+Отдаёт сгенерированные (детерминированные по seed) ответы для методов, которые используют скрипты:
+supplier/stocks, supplier/orders, sales-funnel/products, adv/v3/fullstats, adv/v1/promotion/count,
+feedbacks, supplies, seller/events, deductions, search-report/table/details, list/goods/filter,
+content/v2/get/cards/list и cards/trash (пагинация курсором updatedAt/nmID),
+а также карточку с сайта (card.wb.ru/cards/v4/detail) и автопилоты Кометы (v1/autopilots).
+Соблюдает лимиты запросов по токену (429 + X-Ratelimit-Retry), может добавлять задержку и случайные 5xx.
+
+Запуск:
+    python src/bench/fake_wb_api.py --port 8081 --skus 1000 --rate-scale 10
+Скрипты переключаются на заглушку переменными окружения WB_API_BASE=http://127.0.0.1:8081
+(см. utils.my_general.wb_url) и COMETA_API_BASE=http://127.0.0.1:8081.
+Токен вида bench-token-<N> относится к кабинету N каталога, остальные токены распределяются по хэшу. Счётчики запросов: GET /__stats, сброс: POST /__reset.
+'''
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.my_async_api import RateLimiter
+
+
+# лимиты по группам методов на один токен: (запросов, за сколько секунд, всплеск)
+DEFAULT_LIMITS = {
+    'statistics': (1, 60, 1),
+    'analytics': (3, 60, 3),
+    'adv_fullstats': (3, 60, 1),
+    'adv': (5, 1, 5),
+    'feedbacks': (3, 1, 3),
+    'supplies': (30, 60, 10),
+    'chat': (10, 10, 10),
+    'prices': (10, 6, 10),
+    'content': (100, 60, 5),
+    'deductions': (1, 60, 1),
+    'card': (100, 1, 100),
+    'cometa': (10, 1, 10),
+}
+
+WAREHOUSES = ['Коледино', 'Электросталь', 'Казань', 'Краснодар', 'Новосибирск']
+SUBJECTS = ['Наушники', 'Колонки', 'Кабели', 'Зарядные устройства', 'Чехлы', 'Держатели']
+BASE_DATE = datetime(2024, 1, 1)
+
+
+# -------------------------------- ДАННЫЕ --------------------------------
+
+
+class FakeCatalog:
+    '''
+    Детерминированный каталог: skus артикулов, распределённых по accounts кабинетам,
+    и производные от него остатки, заказы, кампании, отзывы, поставки, события чатов.
+    '''
+
+    def __init__(self, skus=1000, accounts=8, seed=42, days=30):
+        self.accounts = accounts
+        self.days = days
+        rnd = random.Random(seed)
+
+        self.products = []
+        for i in range(skus):
+            nm_id = 100000000 + i * 7
+            self.products.append({
+                'nmId': nm_id,
+                'account': i % accounts,
+                'vendorCode': f'wild{1000 + i}',
+                'subject': rnd.choice(SUBJECTS),
+                'brand': 'Вектор',
+                'price': rnd.randint(300, 9000),
+                'discount': rnd.choice([0, 10, 20, 30, 50]),
+                'stock': rnd.randint(0, 500),
+                'views': rnd.randint(50, 5000),
+                'ctr': rnd.uniform(0.01, 0.08),
+                'cr': rnd.uniform(0.02, 0.2),
+                'rating': round(rnd.uniform(3.5, 5), 1),
+                'feedbacks': rnd.randint(0, 40),
+                'campaign': 20000000 + i if rnd.random() < 0.6 else None,
+            })
+
+        # остатки: строка на (артикул, склад), lastChangeDate растёт по строкам (пагинация по курсору)
+        self.stocks = []
+        for product in self.products:
+            for w, warehouse in enumerate(WAREHOUSES[:3]):
+                n = len(self.stocks)
+                self.stocks.append({
+                    'lastChangeDate': (BASE_DATE + timedelta(seconds=n)).strftime('%Y-%m-%dT%H:%M:%S'),
+                    'warehouseName': warehouse,
+                    'supplierArticle': product['vendorCode'],
+                    'nmId': product['nmId'],
+                    'barcode': str(2040000000000 + product['nmId'] * 10 + w),
+                    'quantity': product['stock'] // 3,
+                    'inWayToClient': product['stock'] % 7,
+                    'inWayFromClient': product['stock'] % 3,
+                    'quantityFull': product['stock'] // 3 + product['stock'] % 7,
+                    'category': 'Электроника',
+                    'subject': product['subject'],
+                    'brand': product['brand'],
+                    'techSize': '0',
+                    'Price': product['price'],
+                    'Discount': product['discount'],
+                    'isSupply': True,
+                    'isRealization': False,
+                    'SCCode': 'Tech',
+                    '_account': product['account'],
+                })
+
+    def account_of(self, token):
+        if token.startswith('bench-token-') and token[12:].isdigit():
+            return int(token[12:]) % self.accounts
+        digest = hashlib.sha1(token.encode('utf-8')).hexdigest()
+        return int(digest, 16) % self.accounts
+
+    def products_of(self, account):
+        return [p for p in self.products if p['account'] == account]
+
+    def by_nm_id(self):
+        if not hasattr(self, '_by_nm_id'):
+            self._by_nm_id = {p['nmId']: p for p in self.products}
+        return self._by_nm_id
+
+
+def _rnd(*key):
+    return random.Random('/'.join(str(k) for k in key))
+
+
+def funnel_stat(product, start, end):
+    rnd = _rnd('funnel', product['nmId'], start, end)
+    open_count = int(product['views'] * product['ctr'] * rnd.uniform(0.5, 1.5))
+    cart = int(open_count * rnd.uniform(0.05, 0.3))
+    orders = int(cart * product['cr'] * 3)
+    buyouts = int(orders * 0.8)
+    cancels = orders - buyouts
+    price = product['price'] * (100 - product['discount']) // 100
+    return {
+        'period': {'start': start, 'end': end},
+        'openCount': open_count, 'cartCount': cart, 'orderCount': orders, 'orderSum': orders * price,
+        'buyoutCount': buyouts, 'buyoutSum': buyouts * price, 'cancelCount': cancels, 'cancelSum': cancels * price,
+        'avgPrice': price, 'avgOrdersCountPerDay': round(orders / 7, 2),
+        'conversions': {
+            'addToCartPercent': round(100 * cart / open_count, 1) if open_count else 0,
+            'cartToOrderPercent': round(100 * orders / cart, 1) if cart else 0,
+            'buyoutPercent': 80,
+        },
+    }
+
+
+def campaign_stat(product, date_from, date_to):
+    rnd = _rnd('adv', product['campaign'], date_from, date_to)
+    apps = []
+    for app_type in (1, 32, 64):
+        views = rnd.randint(100, 20000)
+        clicks = int(views * rnd.uniform(0.01, 0.06))
+        spend = round(clicks * rnd.uniform(5, 30), 2)
+        orders = int(clicks * rnd.uniform(0.01, 0.1))
+        apps.append({
+            'appType': app_type, 'views': views, 'clicks': clicks, 'sum': spend, 'orders': orders,
+            'atbs': int(clicks * 0.2), 'canceled': 0, 'shks': orders, 'sum_price': orders * product['price'],
+            'ctr': round(100 * clicks / views, 2), 'cpc': round(spend / clicks, 2) if clicks else 0,
+            'cr': round(100 * orders / clicks, 2) if clicks else 0,
+            'nms': [{'nmId': product['nmId'], 'name': product['subject'], 'views': views, 'clicks': clicks}],
+        })
+    total = {k: sum(a[k] for a in apps) for k in ('views', 'clicks', 'sum', 'orders', 'atbs', 'shks', 'sum_price')}
+    return {
+        'advertId': product['campaign'], **total, 'canceled': 0,
+        'ctr': round(100 * total['clicks'] / total['views'], 2),
+        'cpc': round(total['sum'] / total['clicks'], 2) if total['clicks'] else 0,
+        'cr': round(100 * total['orders'] / total['clicks'], 2) if total['clicks'] else 0,
+        'boosterStats': [{'date': date_to, 'nm': product['nmId'], 'avg_position': rnd.randint(1, 120)}],
+        'days': [{'date': date_to, 'apps': apps}],
+    }
+
+
+def feedback(product, n):
+    rnd = _rnd('feedback', product['nmId'], n)
+    created = BASE_DATE + timedelta(hours=n * 13 + product['nmId'] % 100)
+    answered = rnd.random() < 0.7
+    return {
+        'id': hashlib.md5(f"{product['nmId']}-{n}".encode()).hexdigest()[:20],
+        'text': 'Хороший товар', 'pros': 'Качество', 'cons': '',
+        'productValuation': rnd.randint(1, 5),
+        'createdDate': created.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'answer': {'text': 'Спасибо за отзыв!', 'state': 'wbRu', 'editable': False} if answered else None,
+        'state': 'wbRu',
+        'productDetails': {'nmId': product['nmId'], 'supplierArticle': product['vendorCode'],
+                           'productName': product['subject'], 'brandName': product['brand']},
+        'video': None, 'wasViewed': True, 'photoLinks': None, 'userName': 'Покупатель',
+        'matchingSize': 'ok', 'isAbleSupplierFeedbackValuation': True, 'supplierFeedbackValuation': 0,
+        'isAbleSupplierProductValuation': True, 'supplierProductValuation': 0,
+        'isAbleReturnProductOrders': False, 'returnProductOrdersDate': None, 'bables': ['качество'],
+        'lastOrderShkId': 1000000 + n, 'lastOrderCreatedAt': created.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'color': '', 'subjectId': 1, 'subjectName': product['subject'],
+        'parentFeedbackId': None, 'childFeedbackId': None, '_answered': answered,
+    }
+
+
+
+
+def product_card(product):
+    # updatedAt растёт с номером артикула - каталог листается курсором updatedAt/nmID
+    updated = BASE_DATE + timedelta(minutes=(product['nmId'] - 100000000) // 7)
+    return {
+        'nmID': product['nmId'], 'imtID': product['nmId'] + 1, 'subjectID': SUBJECTS.index(product['subject']) + 1,
+        'subjectName': product['subject'], 'vendorCode': product['vendorCode'], 'brand': product['brand'],
+        'title': f"{product['subject']} {product['vendorCode']}", 'description': '',
+        'photos': [], 'video': '', 'dimensions': {'length': 10, 'width': 10, 'height': 10, 'isValid': True},
+        'characteristics': [{'id': 14177449, 'name': 'Цвет', 'value': ['черный']}],
+        'sizes': [{'chrtID': product['nmId'] * 10, 'techSize': '0', 'wbSize': '', 'skus': [str(2040000000000 + product['nmId'] * 10)]}],
+        'tags': [], 'createdAt': BASE_DATE.strftime('%Y-%m-%dT%H:%M:%SZ'), 'updatedAt': updated.strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+
+
+
+
+# -------------------------------- СЕРВЕР --------------------------------
+
+
+def _json(data, status=200, headers=None):
+    return web.Response(text=json.dumps(data, ensure_ascii=False), status=status,
+                        content_type='application/json', headers=headers)
+
+
+class FakeWBApi:
+    '''
+    aiohttp-приложение заглушки. Лимиты: DEFAULT_LIMITS, умноженные на rate_scale
+    (rate_scale=0 - без лимитов), latency - задержка ответа в секундах, error_rate - доля ответов 500.
+    '''
+
+    def __init__(self, catalog, rate_scale=1.0, latency=0.0, error_rate=0.0, seed=42):
+        self.catalog = catalog
+        self.rate_scale = rate_scale
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.limiters = {}
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ---- лимиты и статистика ----
+
+    def _limited(self, group, token):
+        if not self.rate_scale:
+            return None
+        key = (group, token)
+        if key not in self.limiters:
+            rate, period, burst = DEFAULT_LIMITS[group]
+            self.limiters[key] = RateLimiter(rate * self.rate_scale, period, max(1, int(burst * self.rate_scale)))
+        limiter = self.limiters[key]
+        now = time.monotonic()
+        limiter.tokens = min(limiter.capacity, limiter.tokens + (now - limiter.updated_at) * limiter.rate / limiter.period)
+        limiter.updated_at = now
+        if limiter.tokens >= 1:
+            limiter.tokens -= 1
+            return None
+        return (1 - limiter.tokens) * limiter.period / limiter.rate
+
+    def _count(self, route, status, size):
+        with self._stats_lock:
+            stat = self.stats.setdefault(route, {'requests': 0, 'status': {}, 'bytes': 0})
+            stat['requests'] += 1
+            stat['status'][str(status)] = stat['status'].get(str(status), 0) + 1
+            stat['bytes'] += size
+
+    def route(self, group, handler, auth=True):
+        async def wrapped(request):
+            route = request.match_info.route.resource.canonical
+            token = request.headers.get('Authorization') if auth else f'public:{request.remote}'
+            if not token:
+                response = _json({'title': 'unauthorized'}, 401)
+            else:
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                retry = self._limited(group, token)
+                if retry is not None:
+                    response = _json({'title': 'too many requests'}, 429, {'X-Ratelimit-Retry': f'{retry:.2f}'})
+                elif self.error_rate and self.random.random() < self.error_rate:
+                    response = _json({'title': 'internal server error'}, 500)
+                else:
+                    body = await request.json() if request.body_exists and await request.read() else None
+                    result = await handler(request, self.catalog.account_of(token) if auth else None, body)
+                    response = result if isinstance(result, web.Response) else _json(result)
+            self._count(route, response.status, len(response.text.encode('utf-8')))
+            return response
+        return wrapped
+
+    # ---- методы ----
+
+    async def stocks(self, request, account, body):
+        date_from = request.query.get('dateFrom', '')
+        rows = [s for s in self.catalog.stocks if s['_account'] == account and s['lastChangeDate'] > date_from]
+        return [{k: v for k, v in row.items() if k != '_account'} for row in rows[:60000]]
+
+    async def orders(self, request, account, body):
+        date_from = request.query.get('dateFrom', BASE_DATE.strftime('%Y-%m-%d'))[:10]
+        start = datetime.strptime(date_from, '%Y-%m-%d')
+        orders = []
+        for product in self.catalog.products_of(account):
+            rnd = _rnd('orders', product['nmId'], date_from)
+            for n in range(rnd.randint(0, 3)):
+                dt = start + timedelta(minutes=rnd.randint(0, 1439))
+                orders.append({
+                    'date': dt.strftime('%Y-%m-%dT%H:%M:%S'), 'lastChangeDate': dt.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'warehouseName': rnd.choice(WAREHOUSES), 'regionName': 'Московская область',
+                    'supplierArticle': product['vendorCode'], 'nmId': product['nmId'],
+                    'barcode': str(2040000000000 + product['nmId'] * 10), 'category': 'Электроника',
+                    'subject': product['subject'], 'brand': product['brand'], 'techSize': '0',
+                    'totalPrice': product['price'], 'discountPercent': product['discount'],
+                    'finishedPrice': product['price'] * (100 - product['discount']) / 100,
+                    'priceWithDisc': product['price'] * (100 - product['discount']) / 100,
+                    'isCancel': False, 'srid': f"{product['nmId']}.{date_from}.{n}",
+                })
+        return orders
+
+    async def sales_funnel(self, request, account, body):
+        body = body or {}
+        nm_ids = set(body.get('nmIds') or [])
+        period = body.get('selectedPeriod', {})
+        products = [p for p in self.catalog.products_of(account) if not nm_ids or p['nmId'] in nm_ids]
+        offset, limit = body.get('offset', 0), body.get('limit', 1000)
+        return {'data': {'products': [{
+            'product': {'nmId': p['nmId'], 'title': p['subject'], 'vendorCode': p['vendorCode'],
+                        'brandName': p['brand'], 'stocks': {'mp': 0, 'wb': p['stock']}},
+            'statistic': {'selected': funnel_stat(p, period.get('start'), period.get('end'))},
+        } for p in products[offset:offset + limit]]}}
+
+    async def fullstats(self, request, account, body):
+        ids = [int(i) for i in request.query.get('ids', '').split(',') if i]
+        if len(ids) > 50:
+            return _json({'title': 'too many ids', 'detail': 'не больше 50 кампаний в запросе'}, 400)
+        by_campaign = {p['campaign']: p for p in self.catalog.products_of(account) if p['campaign']}
+        date_from, date_to = request.query.get('beginDate'), request.query.get('endDate')
+        return [campaign_stat(by_campaign[i], date_from, date_to) for i in ids if i in by_campaign]
+
+    async def promotion_count(self, request, account, body):
+        campaigns = [p['campaign'] for p in self.catalog.products_of(account) if p['campaign']]
+        groups = {}
+        for campaign in campaigns:
+            status = 9 if campaign % 5 else 11
+            groups.setdefault(status, []).append({'advertId': campaign, 'changeTime': BASE_DATE.isoformat()})
+        return {'adverts': [{'type': 9, 'status': status, 'count': len(items), 'advert_list': items}
+                            for status, items in groups.items()], 'all': len(campaigns)}
+
+    async def feedbacks(self, request, account, body):
+        query = request.query
+        take, skip = int(query.get('take', 5000)), int(query.get('skip', 0))
+        is_answered = query.get('isAnswered', 'false') == 'true'
+        nm_id = int(query['nmId']) if query.get('nmId') else None
+        items = []
+        for product in self.catalog.products_of(account):
+            if nm_id and product['nmId'] != nm_id:
+                continue
+            for n in range(product['feedbacks']):
+                fb = feedback(product, n)
+                if fb.pop('_answered') == is_answered:
+                    items.append(fb)
+        return {'data': {'countUnanswered': 0, 'countArchive': len(items), 'feedbacks': items[skip:skip + take]},
+                'error': False, 'errorText': '', 'additionalErrors': None}
+
+    async def supplies(self, request, account, body):
+        limit, offset = int(request.query.get('limit', 1000)), int(request.query.get('offset', 0))
+        supplies = [{'supplyID': 30000000 + account * 1000 + n, 'preorderID': 40000000 + account * 1000 + n,
+                     'phone': '', 'createDate': (BASE_DATE + timedelta(days=n)).isoformat(),
+                     'supplyDate': (BASE_DATE + timedelta(days=n + 3)).isoformat(),
+                     'factDate': (BASE_DATE + timedelta(days=n + 4)).isoformat(),
+                     'updatedDate': (BASE_DATE + timedelta(days=n + 4)).isoformat(), 'statusID': 5}
+                    for n in range(max(1, len(self.catalog.products_of(account)) // 20))]
+        return supplies[offset:offset + limit]
+
+    async def supply(self, request, account, body):
+        supply_id = int(request.match_info['ID'])
+        return {'phone': '', 'statusID': 5, 'boxTypeID': 2, 'createDate': BASE_DATE.isoformat(),
+                'supplyDate': BASE_DATE.isoformat(), 'factDate': BASE_DATE.isoformat(),
+                'updatedDate': BASE_DATE.isoformat(), 'warehouseID': 507, 'warehouseName': WAREHOUSES[supply_id % 5],
+                'actualWarehouseID': 507, 'actualWarehouseName': WAREHOUSES[supply_id % 5],
+                'acceptanceCost': 0, 'paidAcceptanceCoefficient': 0, 'quantity': 100, 'acceptedQuantity': 100,
+                'readyForSaleQuantity': 100, 'unloadingQuantity': 0, 'depersonalizedQuantity': 0}
+
+    async def supply_goods(self, request, account, body):
+        supply_id = int(request.match_info['ID'])
+        products = self.catalog.products_of(account)
+        rnd = _rnd('supply', supply_id)
+        return [{'barcode': str(2040000000000 + p['nmId'] * 10), 'vendorCode': p['vendorCode'], 'nmID': p['nmId'],
+                 'needKiz': False, 'tnved': None, 'techSize': '0', 'color': '', 'supplierBoxAmount': None,
+                 'quantity': 10, 'readyForSaleQuantity': 10, 'acceptedQuantity': 10, 'unloadingQuantity': 0}
+                for p in rnd.sample(products, min(20, len(products)))]
+
+    async def seller_events(self, request, account, body):
+        next_ts = int(request.query.get('next', 0) or 0)
+        base_ts = int(BASE_DATE.timestamp() * 1000)
+        total = len(self.catalog.products_of(account)) * 2
+        start = max(0, (next_ts - base_ts) // 60000 + 1) if next_ts else 0
+        events = []
+        for n in range(start, min(start + 100, total)):
+            ts = base_ts + n * 60000
+            events.append({'chatID': f'{account}:{n // 5}', 'eventID': f'{account}-{n}', 'eventType': 'message',
+                           'isNewChat': n % 5 == 0, 'addTimestamp': ts,
+                           'addTime': datetime.utcfromtimestamp(ts / 1000).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                           'sender': 'client' if n % 2 else 'seller', 'clientID': str(n // 5), 'clientName': 'Покупатель',
+                           'message': {'text': 'Здравствуйте!', 'attachments': None}})
+        return {'result': {'next': events[-1]['addTimestamp'] if events else next_ts, 'newestEventTime': None,
+                           'oldestEventTime': BASE_DATE.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                           'totalEvents': len(events), 'events': events}, 'errors': None}
+
+    async def deductions(self, request, account, body):
+        limit, offset = int(request.query.get('limit', 1000)), int(request.query.get('offset', 0))
+        reports = []
+        for n, product in enumerate(self.catalog.products_of(account)[::10]):
+            reports.append({'dtBonus': (BASE_DATE + timedelta(days=n % 30)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                            'nmId': product['nmId'], 'oldShkId': 1000 + n, 'oldColor': '', 'oldSize': '0',
+                            'oldSku': str(2040000000000 + product['nmId'] * 10), 'oldVendorCode': product['vendorCode'],
+                            'newShkId': 2000 + n, 'newColor': '', 'newSize': '0',
+                            'newSku': str(2040000000001 + product['nmId'] * 10), 'newVendorCode': product['vendorCode'],
+                            'bonusSumm': 100 + n % 50, 'bonusType': 'Подмена товара', 'photoUrls': []})
+        return {'data': {'reports': reports[offset:offset + limit], 'total': len(reports)}}
+
+    async def search_report(self, request, account, body):
+        body = body or {}
+        nm_ids = set(body.get('nmIds') or [])
+        offset, limit = body.get('offset', 0), body.get('limit', 1000)
+        products = [p for p in self.catalog.products_of(account) if not nm_ids or p['nmId'] in nm_ids]
+        items = []
+        for p in products[offset:offset + limit]:
+            rnd = _rnd('search', p['nmId'], json.dumps(body.get('currentPeriod')))
+            metric = lambda lo, hi: {'current': rnd.randint(lo, hi), 'dynamics': rnd.randint(-50, 50)}
+            items.append({'nmId': p['nmId'], 'name': p['subject'], 'vendorCode': p['vendorCode'],
+                          'subjectName': p['subject'], 'brandName': p['brand'], 'mainPhoto': '',
+                          'isAdvertised': bool(p['campaign']), 'isSubstitutedSKU': False, 'isCardRated': True,
+                          'rating': p['rating'], 'feedbackRating': p['rating'],
+                          'price': {'minPrice': p['price'], 'maxPrice': p['price']},
+                          'avgPosition': metric(1, 300), 'openCard': metric(0, 500), 'addToCart': metric(0, 100),
+                          'openToCart': metric(0, 50), 'orders': metric(0, 30), 'cartToOrder': metric(0, 50),
+                          'visibility': metric(0, 100)})
+        return {'data': {'products': items}}
+
+    async def goods_prices(self, request, account, body):
+        limit, offset = int(request.query.get('limit', 1000)), int(request.query.get('offset', 0))
+        products = self.catalog.products_of(account)[offset:offset + limit]
+        return {'data': {'listGoods': [{
+            'nmID': p['nmId'], 'vendorCode': p['vendorCode'], 'currencyIsoCode4217': 'RUB',
+            'discount': p['discount'], 'clubDiscount': 0, 'editableSizePrice': False,
+            'sizes': [{'sizeID': p['nmId'] * 10, 'price': p['price'], 'techSizeName': '0',
+                       'discountedPrice': p['price'] * (100 - p['discount']) / 100,
+                       'clubDiscountedPrice': p['price'] * (100 - p['discount']) / 100}],
+        } for p in products]}}
+
+    async def cards_list(self, request, account, body):
+        settings = (body or {}).get('settings', {})
+        cursor = settings.get('cursor', {})
+        limit = min(int(cursor.get('limit', 100)), 100)
+        ascending = settings.get('sort', {}).get('ascending', False)
+        search = str(settings.get('filter', {}).get('textSearch', '') or '')
+        cards = [product_card(p) for p in self.catalog.products_of(account)
+                 if not search or search in (str(p['nmId']), p['vendorCode'])]
+        cards.sort(key=lambda c: (c['updatedAt'], c['nmID']), reverse=not ascending)
+        if cursor.get('updatedAt'):
+            position = (cursor['updatedAt'], cursor.get('nmID', 0))
+            cards = [c for c in cards if ((c['updatedAt'], c['nmID']) > position) == ascending
+                     and (c['updatedAt'], c['nmID']) != position]
+        page = cards[:limit]
+        last = page[-1] if page else {}
+        return {'cards': page, 'cursor': {'updatedAt': last.get('updatedAt'), 'nmID': last.get('nmID'), 'total': len(page)}}
+
+    async def cards_trash(self, request, account, body):
+        return {'cards': [], 'cursor': {'trashedAt': None, 'nmID': None, 'total': 0}}
+
+    async def card_detail(self, request, account, body):
+        product = self.catalog.by_nm_id().get(int(request.query.get('nm', 0) or 0))
+        if product is None:
+            return {'products': []}
+        price = product['price'] * (100 - product['discount'])
+        card = {'id': product['nmId'], 'name': product['subject'], 'brand': product['brand'],
+                'reviewRating': product['rating'], 'feedbacks': product['feedbacks'],
+                'sizes': [{'name': '', 'origName': '0', 'price': {'basic': product['price'] * 100, 'product': price * 70 // 100,
+                                                               'total': price * 70 // 100}}]}
+        if product['discount'] >= 30:
+            card['promoTextCard'] = 'РАСПРОДАЖА'
+        return {'products': [card]}
+
+    async def cometa_autopilots(self, request, account, body):
+        return [{'product_id': p['nmId'], 'active': True,
+                 'budget_spent_today': _rnd('cometa', p['campaign']).randint(0, 3000)}
+                for p in self.catalog.products if p['campaign']]
+
+    # ---- служебные ----
+
+    async def get_stats(self, request):
+        with self._stats_lock:
+            return _json(self.stats)
+
+    async def reset_stats(self, request):
+        with self._stats_lock:
+            self.stats = {}
+            self.limiters = {}
+        return _json({'ok': True})
+
+    def make_app(self):
+        app = web.Application()
+        r = self.route
+        app.add_routes([
+            web.get('/api/v1/supplier/stocks', r('statistics', self.stocks)),
+            web.get('/api/v1/supplier/orders', r('statistics', self.orders)),
+            web.post('/api/analytics/v3/sales-funnel/products', r('analytics', self.sales_funnel)),
+            web.get('/adv/v3/fullstats', r('adv_fullstats', self.fullstats)),
+            web.get('/adv/v1/promotion/count', r('adv', self.promotion_count)),
+            web.get('/api/v1/feedbacks', r('feedbacks', self.feedbacks)),
+            web.post('/api/v1/supplies', r('supplies', self.supplies)),
+            web.get('/api/v1/supplies/{ID}', r('supplies', self.supply)),
+            web.get('/api/v1/supplies/{ID}/goods', r('supplies', self.supply_goods)),
+            web.get('/api/v1/seller/events', r('chat', self.seller_events)),
+            web.get('/api/analytics/v1/deductions', r('deductions', self.deductions)),
+            web.post('/api/v2/search-report/table/details', r('analytics', self.search_report)),
+            web.get('/api/v2/list/goods/filter', r('prices', self.goods_prices)),
+            web.post('/content/v2/get/cards/list', r('content', self.cards_list)),
+            web.post('/content/v2/get/cards/trash', r('content', self.cards_trash)),
+            web.get('/cards/v4/detail', r('card', self.card_detail, auth=False)),
+            web.get('/v1/autopilots', r('cometa', self.cometa_autopilots)),
+            web.get('/__stats', self.get_stats),
+            web.post('/__reset', self.reset_stats),
+        ])
+        return app
+
+
+def make_app(skus=1000, accounts=8, seed=42, rate_scale=1.0, latency=0.0, error_rate=0.0):
+    '''
+    Собирает приложение заглушки (для запуска внутри бенчмарка через aiohttp.web.AppRunner).
+    '''
+    catalog = FakeCatalog(skus=skus, accounts=accounts, seed=seed)
+    return FakeWBApi(catalog, rate_scale=rate_scale, latency=latency, error_rate=error_rate, seed=seed).make_app()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная заглушка WB API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('FAKE_WB_PORT', 8081)))
+    parser.add_argument('--skus', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate-scale', type=float, default=1.0, help='множитель лимитов WB, 0 - без лимитов')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, сек.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500')
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.skus, args.accounts, args.seed, args.rate_scale, args.latency, args.error_rate),
+                host=args.host, port=args.port)
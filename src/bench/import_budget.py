@@ -0,0 +1,97 @@
+'''
+Проверка времени холодного старта скриптов src/main: python -X importtime на импорт скрипта
+(без блока __main__) в отдельном процессе.
+
+    python -m bench.import_budget                      - короткие задачи (LIGHT_SCRIPTS), код выхода 1 при превышении
+    python -m bench.import_budget autopilot_hourly -v  - любой скрипт, с самыми тяжёлыми импортами
+
+Для коротких задач проверяются бюджет IMPORT_BUDGET_SECONDS (старт интерпретатора + импорт)
+и то, что тяжёлые библиотеки (HEAVY_MODULES) не загружаются при импорте - только при использовании (utils/my_lazy.py).
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(SRC_PATH, 'main')
+
+IMPORT_BUDGET_SECONDS = float(os.getenv('IMPORT_BUDGET_SECONDS', 1.0))
+
+# задачи, которые работают только с Postgres и должны стартовать быстро
+LIGHT_SCRIPTS = ['balance_history', 'temp_refresh']
+HEAVY_MODULES = ['pandas', 'numpy', 'gspread', 'gspread_dataframe', 'aiohttp', 'requests', 'sqlalchemy',
+                 'clickhouse_driver', 'openpyxl']
+
+
+def measure(script):
+    '''
+    Импортирует скрипт в новом процессе с -X importtime.
+    Возвращает {'wall_seconds', 'import_seconds', 'modules': {модуль: накопленное время, сек.}, 'error'}.
+    '''
+    code = f"import sys; sys.path[:0] = [{SRC_PATH!r}, {MAIN_PATH!r}]; import {script}"
+    with tempfile.TemporaryDirectory() as logs:
+        env = dict(os.environ, LOGS_PATH=logs, JOB_RUNS_TO_DB='0')
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SRC_PATH, env=env,
+                              capture_output=True, text=True)
+        wall = time.perf_counter() - started
+
+    modules, errors, import_seconds = {}, [], 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            errors.append(line)
+            continue
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue    # заголовок
+        name, seconds = parts[2].strip(), int(parts[1]) / 1e6
+        modules[name] = seconds
+        if name == script:
+            import_seconds = seconds
+
+    return {
+        'wall_seconds': round(wall, 3),
+        'import_seconds': round(import_seconds, 3),
+        'modules': modules,
+        'error': '\n'.join(errors[-5:]) if proc.returncode else None,
+    }
+
+
+def check(script, result, budget=IMPORT_BUDGET_SECONDS):
+    '''Список нарушений бюджета для короткой задачи.'''
+    problems = []
+    if result['error']:
+        problems.append(f"импорт завершился ошибкой:\n{result['error']}")
+    if result['wall_seconds'] > budget:
+        problems.append(f"старт {result['wall_seconds']} сек. > бюджета {budget} сек.")
+    heavy = [name for name in HEAVY_MODULES if name in result['modules']]
+    if heavy:
+        problems.append(f"при импорте загружаются тяжёлые модули: {', '.join(heavy)}")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Время импорта скриптов src/main (python -X importtime)')
+    parser.add_argument('scripts', nargs='*', help=f"скрипты (по умолчанию {', '.join(LIGHT_SCRIPTS)})")
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS, help='бюджет старта короткой задачи, сек.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='показать самые тяжёлые импорты')
+    args = parser.parse_args()
+
+    failed = False
+    for script in args.scripts or LIGHT_SCRIPTS:
+        result = measure(script)
+        print(f"{script}: старт {result['wall_seconds']} сек., импорт скрипта {result['import_seconds']} сек.")
+        if args.verbose:
+            top = sorted(((seconds, name) for name, seconds in result['modules'].items()
+                          if '.' not in name and name != script), reverse=True)[:15]
+            for seconds, name in top:
+                print(f"    {seconds:8.3f}  {name}")
+        if script in LIGHT_SCRIPTS or not args.scripts:
+            for problem in check(script, result, args.budget):
+                failed = True
+                print(f"  ! {problem}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,147 @@
+'''
+Заполнение Postgres для бенчмарков автопилотов.
+
+Таблицы создаются в отдельной схеме (BENCH_SCHEMA, по умолчанию bench), которая пересоздаётся целиком;
+остальные схемы не трогаются. Скрипты работают со схемой через search_path:
+переменная окружения PGOPTIONS='-c search_path=bench' (см. pg_options).
+Данные строятся по тому же каталогу FakeCatalog, что отдаёт заглушка WB API.
+'''
+import os
+import random
+from datetime import date, timedelta
+from psycopg2.extras import execute_values
+
+from .fake_wb_api import FakeCatalog
+
+BENCH_SCHEMA = os.getenv('BENCH_SCHEMA', 'bench')
+
+# названия кабинетов: как в UNIT (ЛК) и в файле токенов
+ACCOUNTS = ['Вектор', 'Альфа', 'Бета', 'Гамма', 'Дельта', 'Омега', 'Сигма', 'Зета']
+
+REGIONS = ['Москва', 'Московская область', 'Санкт-Петербург', 'Краснодарский край', 'Республика Татарстан',
+           'Свердловская область', 'Новосибирская область', 'Минск', 'Алматы']
+
+TABLES = {
+    'article': '''
+        nm_id bigint primary key,
+        local_vendor_code text,
+        account text
+    ''',
+    'card_data': '''
+        article_id bigint,
+        subject_name text
+    ''',
+    'spp_history': '''
+        nm_id bigint,
+        full_price numeric,
+        spp_percent numeric,
+        spp_price numeric,
+        created_at timestamp default now()
+    ''',
+    'orders_articles_analyze': '''
+        date date,
+        article_id bigint,
+        subject_name text,
+        account text,
+        local_vendor_code text,
+        promo_title text,
+        orders_sum_rub numeric,
+        orders_count integer,
+        adv_spend numeric,
+        price_with_disc numeric,
+        spp numeric,
+        total_quantity integer,
+        profit_by_cond_orders numeric,
+        views integer,
+        clicks integer,
+        ctr numeric,
+        to_cart_convers numeric,
+        to_orders_convers numeric,
+        add_to_cart_count integer,
+        open_card_count integer,
+        cpc numeric,
+        rating numeric
+    ''',
+    'avg_position': '''
+        nmid bigint,
+        avgposition numeric,
+        report_date date
+    ''',
+    'funnel_daily': '''
+        date date,
+        nm_id bigint,
+        order_count integer
+    ''',
+    'orders': '''
+        date date,
+        article_id bigint,
+        region_name text,
+        is_realization boolean
+    ''',
+}
+
+
+def account_name(index):
+    return ACCOUNTS[index] if index < len(ACCOUNTS) else f'Кабинет{index + 1}'
+
+
+def pg_options(schema=BENCH_SCHEMA):
+    '''Значение PGOPTIONS, при котором запросы без схемы идут в схему бенчмарка.'''
+    return f'-c search_path={schema}'
+
+
+def _rows(catalog, days):
+    today = date.today()
+    rnd = random.Random(len(catalog.products))
+    tables = {name: [] for name in TABLES}
+
+    for p in catalog.products:
+        nm_id = p['nmId']
+        account = account_name(p['account'])
+        tables['article'].append((nm_id, p['vendorCode'], account))
+        tables['card_data'].append((nm_id, p['subject']))
+        price = p['price'] * (100 - p['discount']) / 100
+
+        for d in range(days):
+            day = today - timedelta(days=d)
+            views = rnd.randint(0, p['views'])
+            clicks = int(views * p['ctr'])
+            open_card = clicks + rnd.randint(0, 200)
+            to_cart = int(open_card * rnd.uniform(0.05, 0.3))
+            orders = int(to_cart * p['cr'] * 3)
+            spend = round(clicks * rnd.uniform(5, 30), 2)
+            tables['orders_articles_analyze'].append((
+                day, nm_id, p['subject'], account, p['vendorCode'], 'Распродажа' if p['discount'] >= 30 else '',
+                orders * price, orders, spend, price, rnd.randint(5, 35), p['stock'], orders * price * 0.2,
+                views, clicks, round(100 * clicks / views, 2) if views else 0,
+                round(100 * to_cart / open_card, 2) if open_card else 0, round(100 * orders / to_cart, 2) if to_cart else 0,
+                to_cart, open_card, round(spend / clicks, 2) if clicks else 0, p['rating'],
+            ))
+            tables['funnel_daily'].append((day, nm_id, orders))
+            if d < 14:
+                tables['avg_position'].append((nm_id, rnd.randint(1, 300), day))
+                for _ in range(min(orders, 3)):
+                    tables['orders'].append((day, nm_id, rnd.choice(REGIONS), True))
+    return tables
+
+
+def seed_database(conn, skus=1000, accounts=8, seed=42, days=31, schema=BENCH_SCHEMA):
+    '''
+    Пересоздаёт схему бенчмарка и заполняет таблицы, которые читают автопилоты.
+    Возвращает {таблица: кол-во строк}.
+    '''
+    catalog = FakeCatalog(skus=skus, accounts=accounts, seed=seed)
+    tables = _rows(catalog, days)
+
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {schema}')
+        for name, columns in TABLES.items():
+            cursor.execute(f'CREATE TABLE {schema}.{name} ({columns})')
+            execute_values(cursor, f'INSERT INTO {schema}.{name} VALUES %s', tables[name], page_size=10000)
+        cursor.execute(f'CREATE INDEX ON {schema}.orders_articles_analyze (date)')
+        cursor.execute(f'CREATE INDEX ON {schema}.avg_position (report_date)')
+        cursor.execute(f'CREATE INDEX ON {schema}.spp_history (nm_id, created_at)')
+        cursor.execute('ANALYZE')
+    conn.commit()
+    return {name: len(rows) for name, rows in tables.items()}
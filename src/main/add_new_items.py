@@ -10,9 +10,10 @@ import os
 
 from utils.logger import setup_logger
 from utils.my_db_functions import fetch_db_data_into_list
-from utils.my_gspread import get_col_index, remove_duplicates_from_col, connect_to_remote_sheet, remove_duplicates_by_val, find_duplicates_by_val_and_warn
-from utils.my_api import get_product_by_nmid
+from utils.my_gspread import get_col_index, remove_duplicates_from_col, connect_to_remote_sheet, remove_duplicates_by_val, find_duplicates_by_val_and_warn, open_spreadsheet, get_headers
+from utils.my_cards import get_cached_card
 from utils.my_general import open_json
+from utils import my_metrics
 
 import requests
 import pandas as pd
@@ -281,7 +282,7 @@ def define_num_index_range_by_col_names(colname_start, colname_end, headers = No
     '''
     if not headers:
         if sh and headers_row_num:
-            headers = sh.row_values(headers_row_num)
+            headers = get_headers(sh, headers_row_num)
         else:
             logger.error('Have to pass either headers, or sh and headers_row_num')
             raise ValueError
@@ -392,6 +393,7 @@ def api_add_product(id, name, photo_link, is_kit = False, share_of_kit = False,
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     logger.info("Starting script execution.")
 
     # False для локальных тестов
@@ -402,13 +404,12 @@ if __name__ == "__main__":
     only_warn = True    # <--- поставить only_warn=False если нужно удалять дубликаты  !!!!!
 
     try:
-        my_client = gspread.service_account(filename='creds.json') 
         if remote:
-            new_items_table = my_client.open('Новый товар')
+            new_items_table = open_spreadsheet('Новый товар', creds_file='creds.json')
             new_items_sh = new_items_table.worksheet('Для юнит')
             trash_sheet = new_items_table.worksheet('Удалено')
         else:
-            local_table = my_client.open('БД универсальное')
+            local_table = open_spreadsheet('БД универсальное', creds_file='creds.json')
             new_items_sh = local_table.worksheet('Для юнит')
             trash_sheet = None
         logger.info("Connected to 'Новый товар' spreadsheet. Worksheets loaded.")
@@ -426,7 +427,7 @@ if __name__ == "__main__":
 
         # - - - - - - - - - - - - - - - - 1. sopost - - - - - - - - - - - - - - - -
         if remote:
-            unit_table = my_client.open('UNIT 2.0 (tested)')
+            unit_table = open_spreadsheet('UNIT 2.0 (tested)', creds_file='creds.json')
             sopost = unit_table.worksheet('Сопост')
         else:
             unit_table = local_table
@@ -483,8 +484,9 @@ if __name__ == "__main__":
             for w in missing_wilds:
 
                 try:
-                    card = get_product_by_nmid(tokens[wild_client_match[w]], w)
-                    photo = card[0]['photos'][0]['tm']
+                    client = wild_client_match[w]
+                    card = get_cached_card(w, account=client, api_token=tokens[client])
+                    photo = card['photos'][0]['tm']
                     api_add_product(id = w, name = wild_name_match[w], photo_link=photo)
 
                 except Exception as e:
@@ -547,9 +549,9 @@ if __name__ == "__main__":
 
         # - - - - - - - - - - - - - - - - 5. Автопилот & Анализ акций - - - - - - - - - - - - - - - -
         if remote:
-            pilot_table = my_client.open('Панель управления продажами Вектор')
+            pilot_table = open_spreadsheet('Панель управления продажами Вектор', creds_file='creds.json')
             pilot_sh = pilot_table.worksheet('Автопилот')
-            adv_table = my_client.open('Анализ акций')
+            adv_table = open_spreadsheet('Анализ акций', creds_file='creds.json')
             adv_sh = adv_table.worksheet('Анализ акций v 2.0')
         else:
             pilot_sh = local_table.worksheet('Автопилот')
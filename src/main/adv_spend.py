@@ -9,8 +9,9 @@ from psycopg2.extras import execute_values
 
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
-from utils.my_general import ensure_datetime
+from utils.my_general import ensure_datetime, wb_url
 from utils.my_db_functions import create_connection_w_env
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -31,7 +32,7 @@ def get_wb_adv_costs(token: str, date_from: str, date_to: str):
     Returns:
         dict: JSON response from the API, or error details.
     """
-    url = "https://advert-api.wildberries.ru/adv/v1/upd"
+    url = wb_url("https://advert-api.wildberries.ru/adv/v1/upd")
     
     headers = {
         "Authorization": token
@@ -191,6 +192,7 @@ async def upload_data_for_range(start_date, end_date):
     await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     # dynamically get yesterday
     yesterday = datetime.today() - timedelta(days=1)
     
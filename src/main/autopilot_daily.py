@@ -18,11 +18,12 @@ from gspread.exceptions import APIError
 # my packages
 from db_data_to_purch_gs import update_orders_by_regions
 from autopilot_hourly import parse_data_from_WB
-from utils.my_gspread import init_client
+from utils.my_gspread import init_client, open_spreadsheet
 from utils import my_pandas, my_gspread
 from utils import my_db_functions as db
 from utils.logger import setup_logger
 from utils.env_loader import *
+from utils import my_metrics
 
 
 # ---- SET UP ----
@@ -121,6 +122,7 @@ LOGS_PATH = os.getenv("LOGS_PATH")
 logger = setup_logger("autopilot_daily.log")
 
 
+@my_metrics.span()
 def load_data(rename = True):
 
     # берём метрики (рус и англ) из файла
@@ -252,6 +254,7 @@ def load_data(rename = True):
     return curr, hist
 
 
+@my_metrics.span()
 def push_data(df, headers, col_num, articles_sorted, values_first_row, sh_len, pivot):
     cols = list(df.columns)
     absent_metrics = set(cols) - set(headers)
@@ -262,48 +265,33 @@ def push_data(df, headers, col_num, articles_sorted, values_first_row, sh_len, p
     present_metrics = list(set(cols) - set(absent_metrics))
     
     for metric in present_metrics:
-        retry_count = 0
-        max_retries = 3
-        
-        while retry_count < max_retries:
-            try:
-                if pivot:
-                    temp_df = df.pivot(columns='date', index='article_id', values=metric)
-                    if metric == 'spp' or metric == "скидка WB":
-                        temp_df = temp_df.reindex(articles_sorted).fillna('')
-                    else:
-                        temp_df = temp_df.reindex(articles_sorted).fillna(0)
+        try:
+            if pivot:
+                temp_df = df.pivot(columns='date', index='article_id', values=metric)
+                if metric == 'spp' or metric == "скидка WB":
+                    temp_df = temp_df.reindex(articles_sorted).fillna('')
                 else:
-                    temp_df = df[['article_id', metric]].set_index('article_id')
-                    if metric == 'spp' or metric == "скидка WB":
-                        temp_df = temp_df.reindex(articles_sorted).fillna('')
-                    else:
-                        temp_df = temp_df.reindex(articles_sorted).fillna(0)
-                    temp_df = temp_df[[metric]]
-
-                metric_range = my_gspread.define_range(metric, headers, col_num, values_first_row, sh_len)
-                my_gspread.add_data_to_range(sh, temp_df, metric_range)
-                logger.info(f'Данные по "{metric}" успешно добавлены в диапазон {metric_range}')
-                break
-                
-            except APIError as e:
-                if e.response.status_code == 429:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        logger.error(f'Достигнуто максимальное количество попыток для метрики "{metric}"')
-                        break
-                    wait_time = random.uniform(1, 5) * retry_count
-                    logger.error(f'Превышен лимит запросов. Попытка {retry_count}/{max_retries} через {wait_time:.1f} сек...')
-                    time.sleep(wait_time)
+                    temp_df = temp_df.reindex(articles_sorted).fillna(0)
+            else:
+                temp_df = df[['article_id', metric]].set_index('article_id')
+                if metric == 'spp' or metric == "скидка WB":
+                    temp_df = temp_df.reindex(articles_sorted).fillna('')
                 else:
-                    logger.error(f'Ошибка API при загрузке "{metric}":\n{e}')
-                    break
-                    
-            except Exception as e:
-                logger.error(f'Неизвестная ошибка при загрузке "{metric}":\n{e}')
-                break
+                    temp_df = temp_df.reindex(articles_sorted).fillna(0)
+                temp_df = temp_df[[metric]]
+
+            metric_range = my_gspread.define_range(metric, headers, col_num, values_first_row, sh_len)
+            my_gspread.add_data_to_range(sh, temp_df, metric_range)
+            logger.info(f'Данные по "{metric}" успешно добавлены в диапазон {metric_range}')
+
+        except APIError as e:
+            logger.error(f'Ошибка API при загрузке "{metric}" (повторы исчерпаны):\n{e}')
 
+        except Exception as e:
+            logger.error(f'Неизвестная ошибка при загрузке "{metric}":\n{e}')
 
+
+@my_metrics.span()
 def process_adv_status(unit_sh, autopilot_adv_status, unit_skus = None):
     '''
     Склеивает статус "реклама" из Автопилота со статусом "Товар удалён" из UNIT
@@ -333,6 +321,7 @@ def process_adv_status(unit_sh, autopilot_adv_status, unit_skus = None):
     return output_data
     
 
+@my_metrics.span()
 def update_adv_status_in_unit(unit_sh, adv_dict):
     '''
     Принимает adv_dict вида {unit_sku : 'реклама', unit_sku : ''}.
@@ -341,19 +330,21 @@ def update_adv_status_in_unit(unit_sh, adv_dict):
     Преобразует adv_dict в лист вида [['реклама'],['']...] и отправляет в gs
     '''
     output_data = [[adv_dict[key]] for key in adv_dict]
-    output_range = my_gspread.define_range('Реклама', unit_sh.row_values(1), number_of_columns=1, values_first_row=2, sh_len = unit_sh.row_count)
+    output_range = my_gspread.define_range('Реклама', my_gspread.unit_sheet().headers, number_of_columns=1, values_first_row=2, sh_len = unit_sh.row_count)
     my_gspread.add_data_to_range(unit_sh, output_data, output_range, False)
     logger.info(f'Статус рекламы успешно добавлен в диапазон {output_range}')
 
 
+@my_metrics.span()
 def load_and_update_feedbacks_unit(unit_sh, unit_skus):
     feedback_data = parse_data_from_WB(articles=unit_skus, return_keys=['feedbacks'])
     output_data = [value for key, value in feedback_data.items()]
-    ouput_range = my_gspread.define_range('Кол-во отзывов ВБ', unit_sh.row_values(1), 1, 2, unit_sh.row_count)
+    ouput_range = my_gspread.define_range('Кол-во отзывов ВБ', my_gspread.unit_sheet().headers, 1, 2, unit_sh.row_count)
     my_gspread.add_data_to_range(unit_sh, output_data, ouput_range, True)
 
 
 # new function to avoid 503 error
+@my_metrics.span()
 def push_data_static_range(df, headers, col_num, articles_sorted, values_first_row, sh_len, pivot):
     """
     Pushes data using STATIC column ranges defined in METRIC_TO_COL.
@@ -370,56 +361,41 @@ def push_data_static_range(df, headers, col_num, articles_sorted, values_first_r
     present_metrics = list(set(cols) - set(absent_metrics))
     
     for metric in present_metrics:
-        retry_count = 0
-        max_retries = 3
-        
-        while retry_count < max_retries:
-            try:
-                # Data preparation (unchanged)
-                if pivot:
-                    temp_df = df.pivot(columns='date', index='article_id', values=metric)
-                    if metric == 'spp' or metric == "скидка WB":
-                        temp_df = temp_df.reindex(articles_sorted).fillna('')
-                    else:
-                        temp_df = temp_df.reindex(articles_sorted).fillna(0)
+        try:
+            # Data preparation (unchanged)
+            if pivot:
+                temp_df = df.pivot(columns='date', index='article_id', values=metric)
+                if metric == 'spp' or metric == "скидка WB":
+                    temp_df = temp_df.reindex(articles_sorted).fillna('')
                 else:
-                    temp_df = df[['article_id', metric]].set_index('article_id')
-                    if metric == 'spp' or metric == "скидка WB":
-                        temp_df = temp_df.reindex(articles_sorted).fillna('')
-                    else:
-                        temp_df = temp_df.reindex(articles_sorted).fillna(0)
-                    temp_df = temp_df[[metric]]
-
-                # === STATIC RANGE LOGIC REPLACES define_range() ===
-                range_start = METRIC_TO_COL[metric]  # Start column from dict
-                range_end = my_gspread.calculate_range_end(range_start, col_num)  # Expand by col_num columns
-
-                # Format range: StartColRow:EndColRow
-                metric_range = f'{range_start}{values_first_row}:{range_end}{sh_len + 1}'
-
-                # Push data (assumes my_gspread.add_data_to_range iss available)
-                my_gspread.add_data_to_range(sh, temp_df, metric_range, clean_range=False)
-                logger.info(f'Данные по "{metric}" успешно добавлены в диапазон {metric_range}')
-                break
-                
-            except APIError as e:
-                if e.response.status_code == 429:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        logger.warning(f'Достигнуто максимальное количество попыток для метрики "{metric}"')
-                        break
-                    wait_time = random.uniform(1, 5) * retry_count
-                    logger.warning(f'Превышен лимит запросов. Попытка {retry_count}/{max_retries} через {wait_time:.1f} сек...')
-                    time.sleep(wait_time)
+                    temp_df = temp_df.reindex(articles_sorted).fillna(0)
+            else:
+                temp_df = df[['article_id', metric]].set_index('article_id')
+                if metric == 'spp' or metric == "скидка WB":
+                    temp_df = temp_df.reindex(articles_sorted).fillna('')
                 else:
-                    logger.error(f'Ошибка API при загрузке "{metric}":\n{e}')
-                    break
-                    
-            except Exception as e:
-                logger.error(f'Неизвестная ошибка при загрузке "{metric}":\n{e}')
-                break
+                    temp_df = temp_df.reindex(articles_sorted).fillna(0)
+                temp_df = temp_df[[metric]]
+
+            # === STATIC RANGE LOGIC REPLACES define_range() ===
+            range_start = METRIC_TO_COL[metric]  # Start column from dict
+            range_end = my_gspread.calculate_range_end(range_start, col_num)  # Expand by col_num columns
+
+            # Format range: StartColRow:EndColRow
+            metric_range = f'{range_start}{values_first_row}:{range_end}{sh_len + 1}'
+
+            # Push data (assumes my_gspread.add_data_to_range iss available)
+            my_gspread.add_data_to_range(sh, temp_df, metric_range, clean_range=False)
+            logger.info(f'Данные по "{metric}" успешно добавлены в диапазон {metric_range}')
+
+        except APIError as e:
+            logger.error(f'Ошибка API при загрузке "{metric}" (повторы исчерпаны):\n{e}')
+
+        except Exception as e:
+            logger.error(f'Неизвестная ошибка при загрузке "{metric}":\n{e}')
 
 
+@my_metrics.span()
 def load_avg_position_curr(articles_sorted = None):
     '''
     Description:
@@ -448,6 +424,7 @@ def load_avg_position_curr(articles_sorted = None):
     return pivot
 
 
+@my_metrics.span()
 def load_avg_position_hist(articles_sorted = None):
     '''
     Description:
@@ -474,6 +451,7 @@ def load_avg_position_hist(articles_sorted = None):
     
     return hist
     
+@my_metrics.span()
 def load_vendor_codes_info(filter_skus = None):
     '''
     Отдает словарь {sku : {
@@ -504,6 +482,7 @@ def load_vendor_codes_info(filter_skus = None):
     return {i['nm_id']:{'local_vendor_code': i['local_vendor_code'], 'account': i['account'], 'category': i['category']} for i in data}
 
 
+@my_metrics.span()
 def load_db_orders():
     query = '''
     select
@@ -534,6 +513,7 @@ def load_db_orders():
 
     return pivot_df.reset_index()
 
+@my_metrics.span()
 def update_orders_sopost(sopost_sheet):
     n_rows = sopost_sheet.row_count
     wilds_ordered = sopost_sheet.col_values(5)[1:]
@@ -551,6 +531,7 @@ def update_orders_sopost(sopost_sheet):
     logger.info('Successfully updated orders at the Sopost')
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     # ----- 1. загрузка данных из бд -----
     curr_data, hist_data = load_data()
@@ -643,13 +624,14 @@ if __name__ == "__main__":
     autopilot_adv_status = {int(key): 'реклама' if value > 0 else '' for key, value in autopilot_adv_status.items()}
 
     # connect to unit
-    client = gspread.service_account(filename=CREDS_PATH)
-    unit_table = client.open(UNIT_TABLE)
+    unit_table = open_spreadsheet(UNIT_TABLE, creds_file=CREDS_PATH)
     unit_sh = unit_table.worksheet(UNIT_MAIN_SHEET)
 
 
-    unit_skus = my_gspread.get_skus_unit(unit_sh)
-    new_adv_status_sorted = process_adv_status(unit_sh, autopilot_adv_status, unit_skus)
+    # чтение - из снимка UNIT (один запрос за запуск), unit_sh - для записи
+    unit_snapshot = my_gspread.unit_sheet()
+    unit_skus = my_gspread.get_skus_unit(unit_snapshot)
+    new_adv_status_sorted = process_adv_status(unit_snapshot, autopilot_adv_status, unit_skus)
     
     # отправляем данные в gs
     update_adv_status_in_unit(unit_sh, new_adv_status_sorted)
@@ -16,7 +16,6 @@ import numpy as np
 import pandas as pd
 from time import sleep
 from datetime import datetime, timedelta
-from collections import defaultdict
 from gspread.exceptions import APIError
 from psycopg2.extras import execute_values
 
@@ -24,9 +23,12 @@ from psycopg2.extras import execute_values
 from utils.env_loader import *
 from utils import my_pandas, my_gspread
 from utils.utils import load_api_tokens
+from utils.my_async_api import get_limiter
 from utils.my_db_functions import fetch_db_data_into_dict, create_connection_w_env
+from utils.my_general import wb_url
+from utils import my_metrics, my_api_cache
 
-from new_adv import get_all_adv_data, processed_adv_data
+from new_adv import get_all_adv_data, adv_data_to_frame, aggregate_adv_by_article
 
 
 # ---- SET UP ----
@@ -102,9 +104,11 @@ logging.basicConfig(
 
 
 
+@my_api_cache.cached('sales_funnel',
+                      key=lambda account, api_token, nmIDs: (account, {'nmIds': nmIDs, 'date': datetime.now().strftime('%Y-%m-%d')}))
 def get_fun(account: str, api_token: str, nmIDs: list):
     logging.info(f"Начало обработки аккаунта {account}")
-    url = 'https://seller-analytics-api.wildberries.ru/api/analytics/v3/sales-funnel/products'
+    url = wb_url('https://seller-analytics-api.wildberries.ru/api/analytics/v3/sales-funnel/products')
     headers = {'Authorization': api_token}
 
     my_date = datetime.now()
@@ -141,6 +145,7 @@ def get_fun(account: str, api_token: str, nmIDs: list):
 
             if res.status_code != 200:
                 logging.warning(f"Код ответа {res.status_code} для {account}.")
+                my_metrics.count('http_retries', host=my_metrics.host_of(url), status=res.status_code)
                 delay = min(base_delay * (2 ** retry_count), 60)
                 sleep(delay)
                 retry_count += 1
@@ -216,6 +221,7 @@ def get_fun(account: str, api_token: str, nmIDs: list):
 
 
 
+@my_metrics.span()
 def collect_full_funnel_data(articles_sorted = None):
     '''
     Собирает данные по воронке по всем клиентам. Отдаёт словарь и заголовки колонок.
@@ -262,6 +268,7 @@ def collect_full_funnel_data(articles_sorted = None):
 
 
 
+@my_metrics.span()
 def get_full_prices_from_API_WB(filter_articles = None):
     '''
     Возвращает данные полной цены товаров по всем клиентов из API WB  
@@ -279,7 +286,7 @@ def get_full_prices_from_API_WB(filter_articles = None):
     articles_clients = {i['article_id'] : str(i['account']).capitalize() for i in data}
 
     tokens = load_api_tokens()
-    url = 'https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter'
+    url = wb_url('https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter')
     all_prices = {}
     
     for account, api_token in tokens.items():
@@ -298,10 +305,14 @@ def get_full_prices_from_API_WB(filter_articles = None):
             #     for item in data if item.get('sizes')
             # }
 
-            data = my_gspread.get_data_offset(url,
-                                              {"Authorization": api_token},
-                                              extract_callback = lambda r: r['data']['listGoods'],
-                                              return_keys = ['nmID', 'sizes'])
+            # снимок выгрузки общий для запусков в одном окне API_CACHE_TTL
+            data = my_api_cache.fetch('prices', account, {},
+                                      lambda: my_gspread.get_data_offset(url,
+                                                                         {"Authorization": api_token},
+                                                                         extract_callback = lambda r: r['data']['listGoods'],
+                                                                         return_keys = ['nmID', 'sizes'],
+                                                                         prefetch = 3,
+                                                                         limiter = get_limiter(('prices', api_token), rate=10, period=6, burst=3)))
             wb_articles_prices = {item['nmID']: item['sizes'][0]['discountedPrice'] for item in data}
 
             # оставляем только позиции из UNIT    
@@ -324,7 +335,7 @@ def parse_data_from_WB(articles, return_keys=None, handle_nested_keys=None, show
     Пример: [['sizes', 0, 'price']] → data['sizes'][0]['price']
     '''
     
-    url = "https://card.wb.ru/cards/v4/detail"
+    url = wb_url("https://card.wb.ru/cards/v4/detail")
     params = {
         "appType": 1,
         "curr": "rub",
@@ -391,6 +402,7 @@ def parse_data_from_WB(articles, return_keys=None, handle_nested_keys=None, show
 
 
 
+@my_metrics.span()
 def load_adv_spend(articles_sorted=None):
     '''
     Возвращает данные по Сумме затрат из API Кометы.
@@ -399,7 +411,7 @@ def load_adv_spend(articles_sorted=None):
     суммируя затраты по артикулам, добавляет отсутствующие артикулы из списка с нулевыми значениями
     '''
     cometa_api_key = os.getenv('COMETA_API_KEY')
-    url_autopilots = 'https://api.e-comet.io/v1/autopilots'
+    url_autopilots = os.getenv('COMETA_API_BASE', 'https://api.e-comet.io').rstrip('/') + '/v1/autopilots'
     headers = {'Authorization': cometa_api_key}
     response = requests.get(url_autopilots, headers=headers)
     result = {i['product_id']:i['budget_spent_today'] for i in response.json() if i['active'] == True}
@@ -421,6 +433,7 @@ def load_adv_spend(articles_sorted=None):
 
 
 
+@my_metrics.span()
 def get_data_from_WB(articles = None):
 
     '''
@@ -463,91 +476,80 @@ def get_data_from_WB(articles = None):
     return result
 
 
-def get_calc_data(adv_spend, fun_data, fun_headers):
+@my_metrics.span()
+def load_unit_margin():
     '''
-    'Прибыль с заказов по ИУ', ЧП-РК, ДРР, cpo
+    Маржа по артикулам из UNIT (колонка 'Мар') в виде Series {артикул: маржа}.
+    Берётся из снимка UNIT, который читается из таблицы один раз за запуск.
     '''
-    # маржа из UNIT
-    unit_sh = my_gspread.connect_to_remote_sheet('UNIT 2.0 (tested)', 'MAIN (tested)')
-    margin = my_gspread.col_values_by_name('Мар', unit_sh, 1)[1:]
-    # margin = [float(i.strip('%')) / 100 for i in margin]
-    margin = [float(i.strip('%').replace(',', '.')) / 100 for i in margin]
+    unit_sh = my_gspread.unit_sheet()
+    margin = unit_sh.column('Мар')
     articles = unit_sh.col_values(1)[1:]
-    margin_by_article = {int(articles[i]):margin[i] for i in range(len(articles))}
+    margin = pd.Series(margin, dtype=str).str.strip('%').str.replace(',', '.', regex=False).astype(float) / 100
+    return pd.Series(margin.to_numpy(), index=[int(i) for i in articles[:len(margin)]])
+
+
+@my_metrics.span()
+def get_calc_data(adv_spend, fun_data, fun_headers, articles_sorted=None):
+    '''
+    'Прибыль с заказов по ИУ', ЧП-РК, ДРР, cpo.
+    Считает метрики колонками pandas по отсортированному списку артикулов
+    (по умолчанию - все артикулы из данных). Возвращает DataFrame с индексом-артикулом.
+    '''
+    # маржа из UNIT
+    margin_by_article = load_unit_margin()
+
+    fun_df = pd.DataFrame.from_dict(fun_data, orient='index', columns=fun_headers)
+    fun_df.index = fun_df.index.astype(int)
+    adv = pd.Series(adv_spend, dtype=float)
 
-    # сумма заказов
-    orders_sum_ind = fun_headers.index('orders_sum_rub') # берём индекс
-    orders_sum_dct = {int(article): values[orders_sum_ind] for article, values in fun_data.items()} # собираем заказы в отд словарь
-    # считаем прибыль
-    profit_data = {article : orders_sum_dct.get(article, 0) * margin_by_article.get(article, 1) for article in set(orders_sum_dct)|set(margin_by_article)}
+    if articles_sorted is None:
+        articles_sorted = sorted(set(fun_df.index) | set(adv.index) | set(margin_by_article.index))
+    index = pd.Index(articles_sorted)
 
-    # кол-во заказов
-    orders_count_ind = fun_headers.index('orders_count')
-    orders_count_dct = {int(article): values[orders_count_ind] for article, values in fun_data.items()}
+    # в каких источниках есть артикул: метрика пустая (NaN), если артикула нет ни в одном из её источников
+    in_fun, in_adv, in_margin = index.isin(fun_df.index), index.isin(adv.index), index.isin(margin_by_article.index)
 
-    # чп-рк
-    net_profit = {article : profit_data.get(article, 0) - adv_spend.get(article, 0) for article in set(profit_data)|set(adv_spend)}
+    # сумма и кол-во заказов (NaN - артикула нет в воронке)
+    orders_sum = fun_df['orders_sum_rub'].astype(float).reindex(index)
+    orders_count = fun_df['orders_count'].astype(float).reindex(index)
+    adv = adv.reindex(index, fill_value=0)
 
-    # дрр aka доля рекламных расходов
-    adv_part = {}
-    for article in set(adv_spend) | set(orders_sum_dct):
-        numerator = adv_spend.get(article, 0)
-        denominator = orders_sum_dct.get(article, numerator)
-        adv_part[article] = numerator / denominator if denominator != 0 else 1.0
+    # прибыль и чп-рк
+    profit = (orders_sum.fillna(0) * margin_by_article.reindex(index).fillna(1)).where(in_fun | in_margin)
+    net_profit = (profit.fillna(0) - adv).where(in_fun | in_margin | in_adv)
 
-    # cpo
-    cpo = {}
-    for article in set(adv_spend) | set(orders_count_dct):
-        numerator = adv_spend.get(article, 0)
-        denominator = orders_count_dct.get(article, numerator)
-        cpo[article] = numerator / denominator if denominator != 0 else 1.0
+    # дрр aka доля рекламных расходов и cpo: без артикула в воронке знаменатель - сами расходы,
+    # нулевой знаменатель - 1.0
+    def share(orders):
+        denominator = orders.fillna(adv).to_numpy()
+        values = np.divide(adv.to_numpy(), denominator, out=np.ones(len(index)), where=denominator != 0)
+        return pd.Series(values, index=index).where(in_adv | in_fun)
 
-    return profit_data, net_profit, adv_part, cpo
+    return pd.DataFrame({
+        'profit_by_cond_orders': profit.to_numpy(),
+        'ЧП-РК': net_profit.to_numpy(),
+        'ДРР': share(orders_sum).to_numpy(),
+        'cpo': share(orders_count).to_numpy(),
+    }, index=index)
 
 
+@my_metrics.span()
 def process_adv_stat_new():
     '''
     Получает рекламную статистику по всем кабинетам с помощью асинхронной функции.
     Берёт только общие просмотры, клики и затраты, агрегирует данные по артикулам.
     Дополнительно считает ctr, cpc, cpm
 
-    Возвращает лист словарей
+    Возвращает DataFrame с индексом article_id
     '''
     logging.info('Processing adv_stat new...')
     
     raw_data = asyncio.run(get_all_adv_data())
-    data = processed_adv_data(raw_data)
-
-    agg = defaultdict(lambda: {'clicks': 0, 'views': 0, 'adv_spend': 0})
-    for i in data:
-        aid = i['article_id']
-        agg[aid]['clicks'] += i['clicks']
-        agg[aid]['views'] += i['views']
-        agg[aid]['adv_spend'] += i['sum']
-    
-    clean_data = []
-    for article_id, metrics in agg.items():
-        clicks = metrics['clicks']
-        views = metrics['views']
-        spend = metrics['adv_spend']
-
-        ctr = clicks / views if views > 0 else 0
-        cpc = spend / clicks if clicks > 0 else 0
-        cpm = (spend / views) * 1000 if views > 0 else 0
-
-        clean_data.append({
-            'article_id': article_id,
-            'clicks': clicks,
-            'views': views,
-            'adv_spend': spend,
-            'ctr': round(ctr, 2),
-            'cpc': round(cpc, 2),
-            'cpm': round(cpm, 2)
-        })
-
-    return clean_data
+    return aggregate_adv_by_article(adv_data_to_frame(raw_data))
 
 
+@my_metrics.span()
 def push_data(sh, dct, metric_names, gsheet_headers, matched_metrics, articles_sorted, col_num, values_first_row, sh_len):
     '''
     Функция для загрузки значений словарей в гугл таблицу.
@@ -561,6 +563,10 @@ def push_data(sh, dct, metric_names, gsheet_headers, matched_metrics, articles_s
     if isinstance(metric_names, str):
         metric_names = [metric_names]
 
+    # заголовки текущих метрик во 2-й строке; читаются один раз и берутся из кэша
+    if not gsheet_headers:
+        gsheet_headers = my_gspread.get_headers(sh, 2)
+
     # сортирует данные, как в гугл таблице, добавляет [None]*len_dct_values, если данных нет
     ordered_dict = my_pandas.order_dict_by_list(dct, articles_sorted)
 
@@ -569,58 +575,47 @@ def push_data(sh, dct, metric_names, gsheet_headers, matched_metrics, articles_s
         metric_ru = METRIC_RU[metric_names[i]]
         metric_range = my_gspread.define_range(metric_ru, gsheet_headers, col_num, values_first_row, sh_len, all_col=False)
 
-        retry_count = 0
-        max_retries = 3
-        
-        while retry_count < max_retries:
-            try:
-                my_gspread.add_data_to_range(sh, metric_data, metric_range, clean_range=False)
-                logging.info(f'Данные по {metric_ru} за сегодня были успешно добавлены.')
-                break
-                
-            except APIError as e:
-                if e.response.status_code == 429:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        logging.warning(f'Ошибка: превышен лимит запросов для {metric_ru}. Прекращаем попытки.')
-                        break
-                    wait_time = random.uniform(1, 5) * retry_count
-                    logging.warning(f'Лимит запросов. Повторная попытка {retry_count}/{max_retries} через {wait_time:.1f} сек...')
-                    time.sleep(wait_time)
-                else:
-                    logging.warning(f'Ошибка API при загрузке {metric_ru}: {e}')
-                    break
-                    
-            except Exception as e:
-                logging.error(f'Ошибка при загрузке {metric_ru} в гугл таблицу: {e}')
-                break
+        try:
+            my_gspread.add_data_to_range(sh, metric_data, metric_range, clean_range=False)
+            logging.info(f'Данные по {metric_ru} за сегодня были успешно добавлены.')
 
+        except APIError as e:
+            logging.error(f'Ошибка API при загрузке {metric_ru} (повторы исчерпаны): {e}')
 
+        except Exception as e:
+            logging.error(f'Ошибка при загрузке {metric_ru} в гугл таблицу: {e}')
 
+
+
+@my_metrics.span()
 def push_data_static_range(sh, dct, metric_names, gsheet_headers, matched_metrics, articles_sorted, col_num, values_first_row, sh_len):
     '''
-    Pushes dictionary data to Google Sheets using STATIC column ranges.
-    Supports {article: value}, {article: [value]}, {article: [v1, v2, ...]}.
+    Pushes data to Google Sheets using STATIC column ranges.
+    Supports dicts {article: value}, {article: [value]}, {article: [v1, v2, ...]},
+    pandas Series/DataFrame indexed by article and numpy arrays already aligned with articles_sorted.
     Uses pre-defined column letters from METRIC_TO_COL.
     '''
 
-    # Convert scalar values to lists for uniform processing
-    if isinstance(next(iter(dct.values())), (float, int)):
-        dct = {k: [v] for k, v in dct.items()}
-
     if isinstance(metric_names, str):
         metric_names = [metric_names]
 
-    # Sort data according to article list
-    ordered_dict = my_pandas.order_dict_by_list(dct, articles_sorted)
-
-    for i in range(len(next(iter(dct.values())))):
-        # metric_data = [[0 if value is None else value] for values in ordered_dict.values() for value in [values[i]]]
-
-        metric_data = []
-        for article in articles_sorted:
-            values = ordered_dict.get(article, [0]*len(metric_names))
-            metric_data.append([values[i]])
+    # Build a 2D array: one row per article (in sheet order), one column per metric
+    if isinstance(dct, (pd.Series, pd.DataFrame)):
+        frame = dct.to_frame() if isinstance(dct, pd.Series) else dct
+        values = frame.reindex(articles_sorted).astype(object)
+        values = values.where(values.notna(), None).to_numpy()
+    elif isinstance(dct, np.ndarray):
+        values = dct.reshape(len(articles_sorted), -1)
+    else:
+        # Convert scalar values to lists for uniform processing
+        if isinstance(next(iter(dct.values())), (float, int)):
+            dct = {k: [v] for k, v in dct.items()}
+        ordered_dict = my_pandas.order_dict_by_list(dct, articles_sorted)
+        values = [ordered_dict.get(article, [0]*len(metric_names)) for article in articles_sorted]
+        values = np.array(values, dtype=object).reshape(len(articles_sorted), -1)
+
+    for i in range(values.shape[1]):
+        metric_data = values[:, i:i + 1].tolist()
 
         metric_ru = METRIC_RU[metric_names[i]]
 
@@ -635,36 +630,22 @@ def push_data_static_range(sh, dct, metric_names, gsheet_headers, matched_metric
 
         # === END STATIC RANGE ===
 
-        retry_count = 0
-        max_retries = 3
-        while retry_count < max_retries:
-            try:
-                my_gspread.add_data_to_range(sh, metric_data, metric_range, clean_range=False)
-                logging.info(f'Данные по {metric_ru} за сегодня были успешно добавлены в диапазон {metric_range}.')
-                break
-
-            except APIError as e:
-                if e.response.status_code == 429:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        logging.warning(f'Ошибка: превышен лимит запросов для {metric_ru}. Прекращаем попытки.')
-                        break
-                    wait_time = random.uniform(1, 5) * retry_count
-                    logging.warning(f'Лимит запросов. Повторная попытка {retry_count}/{max_retries} через {wait_time:.1f} сек...')
-                    time.sleep(wait_time)
-                else:
-                    logging.warning(f'Ошибка API при загрузке {metric_ru}: {e}')
-                    break
+        try:
+            my_gspread.add_data_to_range(sh, metric_data, metric_range, clean_range=False)
+            logging.info(f'Данные по {metric_ru} за сегодня были успешно добавлены в диапазон {metric_range}.')
 
-            except Exception as e:
-                logging.error(f'Ошибка при загрузке {metric_ru} в гугл таблицу: {e}')
-                break
+        except APIError as e:
+            logging.error(f'Ошибка API при загрузке {metric_ru} (повторы исчерпаны): {e}')
+
+        except Exception as e:
+            logging.error(f'Ошибка при загрузке {metric_ru} в гугл таблицу: {e}')
 
 
+@my_metrics.span()
 def load_unit_remains(unit_sh = None):
 
     if unit_sh is None:
-        unit_sh = my_gspread.connect_to_remote_sheet(os.getenv("UNIT_TABLE"), os.getenv("UNIT_MAIN_SHEET"))
+        unit_sh = my_gspread.unit_sheet()
 
     # 1. take remains data from unit
     skus = unit_sh.col_values(1)
@@ -693,6 +674,7 @@ def load_unit_remains(unit_sh = None):
     return unit_remains
 
 
+@my_metrics.span()
 def insert_spp_data_to_db(connection, wb_data):
 
     '''
@@ -750,6 +732,7 @@ def insert_spp_data_to_db(connection, wb_data):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     pilot_table_name = os.getenv('AUTOPILOT_TABLE_NAME')
     pilot_sheet_name = os.getenv('AUTOPILOT_SHEET_NAME')
@@ -784,8 +767,7 @@ if __name__ == "__main__":
 
         # ----- выгрузка остатков из юнитки -----
         try:
-            unit_sh = my_gspread.connect_to_remote_sheet(os.getenv("UNIT_TABLE"), os.getenv("UNIT_MAIN_SHEET"))
-            unit_remains = load_unit_remains(unit_sh = unit_sh)
+            unit_remains = load_unit_remains()
             pilot_remains = {sku:unit_remains.get(sku, None) for sku in articles_sorted}
             output_data = [[value] for key, value in pilot_remains.items()]
 
@@ -861,23 +843,18 @@ if __name__ == "__main__":
 
 
         # ----- calculations -----
-        profit_data, net_profit, adv_part, cpo = get_calc_data(adv_spend, fun_data, fun_headers)
-        calc_headers = ['profit_by_cond_orders', 'ЧП-РК', 'ДРР', 'cpo']
-        
-        for header, calc_data in zip(calc_headers, [profit_data, net_profit, adv_part, cpo]):
-            push_data_static_range(sh = sh, dct = calc_data, metric_names = header, gsheet_headers = сurr_headers, matched_metrics = METRIC_RU,
-                    articles_sorted = articles_sorted, col_num = col_num, values_first_row = values_first_row, sh_len=sh_len)
+        calc_data = get_calc_data(adv_spend, fun_data, fun_headers, articles_sorted)
+        push_data_static_range(sh = sh, dct = calc_data, metric_names = list(calc_data.columns), gsheet_headers = сurr_headers, matched_metrics = METRIC_RU,
+                articles_sorted = articles_sorted, col_num = col_num, values_first_row = values_first_row, sh_len=sh_len)
             
         
         # ----- клики, ctr, cpc, cpm -----
         adv_data = process_adv_stat_new()
-        adv_by_sku = {item['article_id']: {k: v for k, v in item.items() if k != 'article_id'}
-                      for item in adv_data
-                      }
-        adv_ordered = [adv_by_sku[id] for id in articles_sorted if id in adv_by_sku] 
+        # строки в порядке артикулов в таблице, для артикулов без рекламы - нули
+        adv_ordered = adv_data.reindex(articles_sorted, fill_value=0)
         for metric_en, metric_ru in [['clicks', 'Клики'],['views', 'Показы'],
                                      ['cpm', 'cpm'], ['cpc', 'cpc'], ['ctr', 'ctr']]:
-            metric_data = [[i[metric_en]] for i in adv_ordered]
+            metric_data = adv_ordered[[metric_en]].values.tolist()
             range_start = METRIC_TO_COL[metric_ru]
             range_end = my_gspread.calculate_range_end(range_start, col_num)
             metric_range = f'{range_end}{values_first_row}:{range_end}{sh_len}'
@@ -900,7 +877,7 @@ if __name__ == "__main__":
             for nm_id, values in fun_data.items()
         }
 
-        clicks_dict = {item['article_id']: item['clicks'] for item in adv_data}
+        clicks_dict = adv_data['clicks'].to_dict()
 
         organic_list = []
         for nm_id in articles_sorted:
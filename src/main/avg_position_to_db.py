@@ -16,8 +16,9 @@ from datetime import datetime, timedelta
 # my packages
 from utils.env_loader import *
 from utils.utils import load_api_tokens
-from utils.my_general import aggregate_dct_data
+from utils.my_general import aggregate_dct_data, wb_url
 from utils.my_db_functions import create_connection_w_env, load_articles_clients_data, insert_dct_data_to_db
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -53,7 +54,7 @@ async def get_pagination_data(api_token, start_date, end_date, nmIds = None, ord
 
     # если в артикулах есть артикул не от того продавца, выгружаются данные только по подходящим артикулам (апи не ломается)
 
-    url = 'https://seller-analytics-api.wildberries.ru/api/v2/search-report/table/details'
+    url = wb_url('https://seller-analytics-api.wildberries.ru/api/v2/search-report/table/details')
     headers = {'Authorization': api_token, 'Content-Type': 'application/json'}
     json_data = {
         'currentPeriod': {
@@ -313,5 +314,6 @@ async def get_and_upload_data_to_db(start_date, end_date):
         conn.close()
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     start_date = end_date = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d') # yesterday
     asyncio.run(get_and_upload_data_to_db(start_date, end_date))
\ No newline at end of file
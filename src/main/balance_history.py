@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from utils.logger import setup_logger
 from utils.my_db_functions import create_connection_w_env
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -38,4 +39,5 @@ def transfer_current_balances_to_history():
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     transfer_current_balances_to_history()
\ No newline at end of file
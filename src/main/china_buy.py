@@ -15,8 +15,9 @@ import os
 # my packages
 from utils.env_loader import *
 from utils.my_db_functions import create_connection_w_env, fetch_db_data_into_dict, list_to_sql_select
-from utils.my_gspread import column_number_to_letter, add_data_to_range, clean_number, connect_to_local_sheet
+from utils.my_gspread import column_number_to_letter, add_data_to_range, clean_number, connect_to_local_sheet, connect_to_remote_sheet, open_spreadsheet, get_worksheet, get_headers
 from utils.my_general import open_json
+from utils import my_metrics
 
 
 # ---- SET UP ----
@@ -182,13 +183,11 @@ def load_unique_wilds_from_orders(orders_sh = None, table = None, client = None)
             sheet = client.open(CHINA_COUNT)
             orders_sh = sheet.worksheet(CHINA_ORDERS)
         else:
-            client = gspread.service_account(filename=CREDS_PATH)
-            sheet = client.open(CHINA_COUNT)
-            orders_sh = sheet.worksheet(CHINA_ORDERS)
+            orders_sh = connect_to_remote_sheet(CHINA_COUNT, CHINA_ORDERS, creds_file=CREDS_PATH)
 
     first_col_values = orders_sh.col_values(1)
     header_row_num = first_col_values.index('Фото') + 1
-    headers = orders_sh.row_values(header_row_num)
+    headers = get_headers(orders_sh, header_row_num)
     wilds = sorted(list(set(orders_sh.col_values(headers.index('wild') + 1)))[header_row_num:])
     return wilds
 
@@ -222,9 +221,10 @@ def load_sopost_wilds(client = None, wilds = None):
         {wild1 : name, wild2 : ...}
     '''
     if client is None:
-        client = gspread.service_account(filename=CREDS_PATH)
-    sopost = client.open(UNIT_TABLE).worksheet('Сопост')
-    sopost_headers = sopost.row_values(1)
+        sopost = connect_to_remote_sheet(UNIT_TABLE, 'Сопост', creds_file=CREDS_PATH)
+    else:
+        sopost = client.open(UNIT_TABLE).worksheet('Сопост')
+    sopost_headers = get_headers(sopost)
     sopost_wilds = sopost.col_values(sopost_headers.index('wild') + 1)[1:]
     sopost_names = sopost.col_values(sopost_headers.index('Наименование') + 1)[1:]
     sopost_dct = {w : n for w, n in zip(sopost_wilds, sopost_names)}
@@ -239,7 +239,7 @@ def load_unique_wilds_from_china(sh):
         a list of dicts with unique wilds and their names if they have flag 'K' or 'KK' in the column 'Страна' in the given sheet 
     '''
     headers_num = sh.col_values(1).index('Фото') + 1
-    headers = sh.row_values(headers_num)
+    headers = get_headers(sh, headers_num)
     wilds = sh.col_values(headers.index('wild') + 1)[headers_num:]
     names = sh.col_values(headers.index('Модель') + 1)[headers_num:]
     country = sh.col_values(headers.index('Страна') + 1)[headers_num:]
@@ -311,7 +311,7 @@ def load_last_purch_price(wilds = None):
 
 def update_purchase_price_in_gs(orders_sh):
     header_row_num = list(orders_sh.col_values(1)).index('Фото') + 1
-    headers = orders_sh.row_values(header_row_num)
+    headers = get_headers(orders_sh, header_row_num)
 
     wilds_raw = orders_sh.col_values(headers.index('wild') + 1)[header_row_num:]
     names_raw = orders_sh.col_values(headers.index('Модель') + 1)[header_row_num:]
@@ -351,11 +351,11 @@ def load_db_categories():
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     
     # 1. connect to client
     try:
-        client = gspread.service_account(filename=CREDS_PATH)
-        table = client.open(CHINA_TABLE) # prod
+        table = open_spreadsheet(CHINA_TABLE, creds_file=CREDS_PATH) # prod
 
         logging.info(f"Connected to the table {CHINA_TABLE}")
     except Exception as e:
@@ -382,16 +382,15 @@ if __name__ == "__main__":
         sh = table.worksheet(CHINA_COUNT) # prod
         first_col_values = sh.col_values(1)
         header_row_num = first_col_values.index('Фото') + 1
-        headers = sh.row_values(header_row_num) # нужны только для расчёта range
+        headers = get_headers(sh, header_row_num) # нужны только для расчёта range
 
 
         # ---- new part: get wilds from three tables ----
 
         # Добавляем данные из Расчёта закупки
-        pro_client = gspread.service_account(filename=PRO_CREDS_PATH)
-        purch_table = pro_client.open(PURCHASE_TABLE)
-        market_res = load_unique_wilds_from_china(purch_table.worksheet('Рынок_сервис'))
-        xiamoi_res = load_unique_wilds_from_china(purch_table.worksheet('Ксиоми_сервис'))
+        purch_table = open_spreadsheet(PURCHASE_TABLE, creds_file=PRO_CREDS_PATH)
+        market_res = load_unique_wilds_from_china(get_worksheet(purch_table, 'Рынок_сервис'))
+        xiamoi_res = load_unique_wilds_from_china(get_worksheet(purch_table, 'Ксиоми_сервис'))
         logging.info('Retrieved wilds from three gs tables')
         
 
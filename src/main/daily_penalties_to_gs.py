@@ -11,8 +11,10 @@ from datetime import datetime, timedelta
 
 # my packages
 from utils.env_loader import *
+from utils.my_gspread import init_client
 from utils.my_db_functions import create_connection_w_env
 from utils.utils import get_db_table, update_df_in_google
+from utils import my_metrics
 
 
 # ---- SET UP ----
@@ -114,18 +116,19 @@ def process_data(df):
     return df_for_gs
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     df = load_db_data()
     clean_df = process_data(df)
 
     # в ПУ выгружаем только последние две недели
     df_for_pilot = clean_df[clean_df['Дата отчета'] >= (datetime.today() - timedelta(weeks=14)).strftime('%Y-%m-%d')]
 
-    gc = gspread.service_account(filename=PRO_CREDS_PATH)
+    gc = init_client(PRO_CREDS_PATH)
     wks = gc.open(MAIN_TABLE)
     orders_sheet = wks.worksheet('Штрафы')
     update_df_in_google(clean_df, orders_sheet)
 
-    gc = gspread.service_account(filename=CREDS_PATH)
+    gc = init_client(CREDS_PATH)
     wks = gc.open(AUTOPILOT_TABLE_NAME)
     orders_sheet = wks.worksheet('Штрафы')
     update_df_in_google(df_for_pilot, orders_sheet)
\ No newline at end of file
@@ -12,6 +12,7 @@ from utils.my_gspread import init_client, clean_extra_rows
 from utils.logger import setup_logger
 from utils.my_pandas import format_datetime
 from utils.env_loader import *
+from utils import my_metrics
 
 logger = setup_logger("db_data_to_purch_gs.log")
 
@@ -323,6 +324,7 @@ def update_orders_by_regions(client, logger = logger):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     
     try:
         months = None
@@ -9,11 +9,12 @@ from time import sleep
 from typing import Literal, Optional
 from datetime import datetime, timedelta, time
 
-from utils.my_general import to_iso_z, clean_datetime_from_timezone, save_json
+from utils.my_general import to_iso_z, clean_datetime_from_timezone, save_json, wb_url
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
 from psycopg2.extras import execute_values
 from utils.my_db_functions import create_connection_w_env
+from utils import my_metrics
 
 logger = setup_logger("deductions_to_db.log")
 
@@ -37,7 +38,7 @@ def get_wb_measurements(token,
     if tab not in ("penalty", "measurement"):
         raise ValueError(f"Параметр tab должен быть одним из двух - 'penalty' или 'measurement', передано {tab}")
     
-    url = "https://seller-analytics-api.wildberries.ru/api/v1/analytics/warehouse-measurements"
+    url = wb_url("https://seller-analytics-api.wildberries.ru/api/v1/analytics/warehouse-measurements")
     headers = {"Authorization": token}
     params = {
         "dateFrom": to_iso(date_from),
@@ -196,7 +197,7 @@ async def get_deductions_replacements(api_key, date_from, date_to, limit=1000):
     offset = 0
     all_reports = []
 
-    url = "https://seller-analytics-api.wildberries.ru/api/analytics/v1/deductions"
+    url = wb_url("https://seller-analytics-api.wildberries.ru/api/analytics/v1/deductions")
 
     date_from = to_iso_z(date_from, t = time(0, 0, 0))
     date_to = to_iso_z(date_to, t = time(23, 59, 59))
@@ -366,4 +367,5 @@ async def main():
     await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     asyncio.run(main())
\ No newline at end of file
@@ -5,6 +5,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils.env_loader import *
 from utils.logger import setup_logger
 from utils.my_gspread import connect_to_remote_sheet, delete_rows_based_on_values
+from utils import my_metrics
 
 logger = setup_logger("add_new_items.log")
 
@@ -23,6 +24,7 @@ TABLES_LIST = [{"table": UNIT_TABLE, "spreadsheet": UNIT_MAIN_SHEET},
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     # загрузка товаров для удаления из таблицы Новый товар
     new_items_sh = connect_to_remote_sheet('Новый товар', 'На удаление')
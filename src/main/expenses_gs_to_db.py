@@ -9,6 +9,7 @@ from utils.logger import setup_logger
 from utils.my_general import open_json
 from utils.my_gspread import connect_to_remote_sheet, clean_float_number
 from utils.my_db_functions import create_connection_w_env
+from utils import my_metrics
 
 # ---- LOGS ----
 logger = setup_logger("expenses_gs_to_db.log")
@@ -156,6 +157,7 @@ def refresh_table(df):
         raise e
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     try:
         data = new_load_gs_data()
     except Exception as e:
@@ -2,14 +2,18 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-import requests
 import time
+import asyncio
+import aiohttp
 import logging
 import json
 from psycopg2.extras import execute_values
 
 from utils.utils import load_api_tokens
 from utils.my_db_functions import create_connection_w_env
+from utils.my_async_api import OffsetCursor, paginate, collect_pages, get_limiter
+from utils.my_general import wb_url
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -26,102 +30,30 @@ logging.basicConfig(
     ]
 )
 
-def get_wb_feedbacks(api_token: str, nm_id: int | None = None, is_answered: bool = True, date_from: int = 0, date_to: int = 0) -> dict:
+FEEDBACKS_URL = wb_url("https://feedbacks-api.wildberries.ru/api/v1/feedbacks")
+
+
+def iter_wb_feedbacks(session, api_token: str, nm_id: int | None = None, is_answered: bool = True,
+                      date_from: int = 0, date_to: int = 0, take: int = 5000, prefetch: int = 3):
     """
-    Получает все отзывы с Wildberries, автоматически обрабатывая постраничную загрузку.
+    Асинхронный генератор отзывов с Wildberries постранично (skip/take).
+    Страницы запрашиваются по prefetch штук параллельно в пределах лимита API.
 
     Аргументы:
+        session (aiohttp.ClientSession): сессия для запросов.
         api_token (str): API-ключ Wildberries.
         nm_id (int | None): Артикул WB (если None — выгружаются все отзывы).
         is_answered (bool): Фильтр по обработанным отзывам (по умолчанию True).
         date_from (int): Дата начала периода в формате Unix timestamp (по умолчанию 0 — без фильтрации).
         date_to (int): Дата конца периода в формате Unix timestamp (по умолчанию 0 — без фильтрации).
+        take (int): Сколько отзывов забирать за один запрос (по умолчанию 5000).
+        prefetch (int): Сколько страниц запрашивать параллельно.
 
     Возвращает:
-        dict: Объединённый JSON с ключом "data" и всеми отзывами.
-    """
-
-    url = "https://feedbacks-api.wildberries.ru/api/v1/feedbacks"
-    headers = {"Authorization": api_token}
-    take = 5000
-    skip = 0
-
-    all_feedbacks = []
-
-    while True:
-        params = {
-            "isAnswered": is_answered,
-            "take": take,
-            "skip": skip,
-            "order": "dateAsc"
-        }
-        if nm_id:
-            params["nmId"] = nm_id
-        if date_from > 0:
-            params["dateFrom"] = date_from
-        if date_to > 0:
-            params["dateTo"] = date_to
-
-        res = requests.get(url=url, headers=headers, params=params)
-        if res.status_code != 200:
-            logging.error(f"Ошибка {res.status_code}: {res.text}")
-            break
-
-        js = res.json()
-        feedbacks = js.get("data", {}).get("feedbacks", [])
-        if not feedbacks:
-            break
-
-        if skip == 0:
-            logging.info(f"Найдена информация о {js['data']['countArchive']} отзывах")
-
-        all_feedbacks.extend(feedbacks)
-        skip += take
-
-        # Прекращаем цикл, если данных меньше лимита (всё выгружено)
-        if len(feedbacks) < take:
-            break
-
-        logging.info(f"Получена информация о {len(feedbacks)} отзывах. Продолжаем...")
-
-        # Ограничение API — не более 3 запросов в секунду
-        time.sleep(0.35)
-
-    return all_feedbacks
-
-
-def get_wb_feedbacks_batch(
-    api_token: str,
-    nm_id: int | None = None,
-    is_answered: bool = True,
-    date_from: int = 0,
-    date_to: int = 0,
-    take: int = 5000,
-    skip: int = 0
-) -> list:
-    """
-    Получает один "батч" отзывов с Wildberries (с контролем skip и take).
-
-    Аргументы:
-        api_token (str): API-ключ Wildberries.
-        nm_id (int | None): Артикул WB (если None — выгружаются все отзывы).
-        is_answered (bool): Фильтр по обработанным отзывам.
-        date_from (int): Дата начала периода в Unix timestamp.
-        date_to (int): Дата конца периода в Unix timestamp.
-        take (int): Сколько отзывов забрать за один вызов (по умолчанию 5000).
-        skip (int): Сколько отзывов пропустить перед выборкой.
-
-    Возвращает:
-        list: Список отзывов (максимум `take`).
+        Асинхронный генератор списков отзывов (максимум `take` в каждом).
     """
-
-    url = "https://feedbacks-api.wildberries.ru/api/v1/feedbacks"
-    headers = {"Authorization": api_token}
-    
     params = {
-        "isAnswered": is_answered,
-        "take": take,
-        "skip": skip,
+        "isAnswered": str(is_answered).lower(),
         "order": "dateAsc"
     }
     if nm_id:
@@ -131,21 +63,24 @@ def get_wb_feedbacks_batch(
     if date_to > 0:
         params["dateTo"] = date_to
 
-    res = requests.get(url=url, headers=headers, params=params)
-    if res.status_code != 200:
-        logging.error(f"Ошибка {res.status_code}: {res.text}")
-        return []
+    # Ограничение API — не более 3 запросов в секунду
+    limiter = get_limiter(('feedbacks', api_token), rate=3, period=1, burst=3)
 
-    js = res.json()
-    feedbacks = js.get("data", {}).get("feedbacks", [])
+    return paginate(session, FEEDBACKS_URL, OffsetCursor(take, limit_key="take", offset_key="skip"),
+                    params=params, headers={"Authorization": api_token},
+                    extract=lambda js: js.get("data", {}).get("feedbacks"),
+                    limiter=limiter, prefetch=prefetch)
 
-    if skip == 0 and 'data' in js and 'countArchive' in js['data']:
-        logging.info(f"Всего отзывов для этой выборки: {js['data']['countArchive']}")
 
-    # Ограничение API — не более 3 запросов в секунду
-    time.sleep(0.35)
+def get_wb_feedbacks(api_token: str, nm_id: int | None = None, is_answered: bool = True, date_from: int = 0, date_to: int = 0) -> list:
+    """
+    Получает все отзывы с Wildberries одним списком (см. iter_wb_feedbacks).
+    """
+    async def load():
+        async with aiohttp.ClientSession() as session:
+            return await collect_pages(iter_wb_feedbacks(session, api_token, nm_id, is_answered, date_from, date_to))
 
-    return feedbacks
+    return asyncio.run(load())
 
 
 def insert_feedbacks_into_db(connection, feedbacks: list):
@@ -154,7 +89,7 @@ def insert_feedbacks_into_db(connection, feedbacks: list):
 
     Аргументы:
         connection: psycopg2 connection.
-        feedbacks (list): Список отзывов из get_wb_feedbacks_batch.
+        feedbacks (list): Список отзывов из iter_wb_feedbacks.
     """
     if not feedbacks:
         return
@@ -216,95 +151,66 @@ def insert_feedbacks_into_db(connection, feedbacks: list):
         logging.error(f"Ошибка при вставке в базу: {e}")
         connection.rollback()
 
-def upload_all_data():
+async def upload_all_data():
     tokens = load_api_tokens()
     conn = create_connection_w_env()
-    take = 5000  # batch size
-
-    for client, token in tokens.items():
-        logging.info(f"Начинаем обработку отзывов для клиента: {client}")
-        skip = 0
-
-        try:
-            while True:
-                batch = get_wb_feedbacks_batch(api_token=token, skip=skip, take=take, is_answered=False)
-                logging.info(f"Клиент {client}: получено {len(batch)} отзывов с offset {skip}")
 
-                if not batch:
-                    logging.warning(f"Клиент {client}: нет новых отзывов для обработки, пропуск {skip}")
-                    break
+    async with aiohttp.ClientSession() as session:
+        for client, token in tokens.items():
+            logging.info(f"Начинаем обработку отзывов для клиента: {client}")
+            total = 0
 
-                insert_feedbacks_into_db(conn, batch)
-                logging.info(f"Клиент {client}: вставлено {len(batch)} отзывов в базу данных")
+            try:
+                async for batch in iter_wb_feedbacks(session, token, is_answered=False):
+                    insert_feedbacks_into_db(conn, batch)
+                    total += len(batch)
+                    logging.info(f"Клиент {client}: вставлено {len(batch)} отзывов в базу данных, всего {total}")
 
-                batch_size = len(batch)
-                skip += batch_size
+                if not total:
+                    logging.warning(f"Клиент {client}: нет новых отзывов для обработки")
 
-                if batch_size < take:
-                    logging.info(f"Клиент {client}: достигнут конец отзывов (последний batch размером {batch_size})")
-                    break
+            except Exception as e:
+                logging.error(f"Ошибка при обработке клиента {client} на offset {total}: {e}")
 
-        except Exception as e:
-            logging.error(f"Ошибка при обработке клиента {client} на offset {skip}: {e}")
 
-
-def update_weekly_feedbacks():
+async def update_weekly_feedbacks():
     """
     Загружает все отзывы за последнюю неделю (и отвеченные, и неотвеченные),
     обновляет существующие строки в базе (если изменились данные) и вставляет новые.
 
     Логика:
         1. Берёт диапазон дат: последние 7 дней.
-        2. Получает все отзывы (is_answered=True и is_answered=False).
-        3. Для каждого клиента обновляет базу через UPSERT (ON CONFLICT ... DO UPDATE).
+        2. Постранично получает отзывы (is_answered=True и is_answered=False).
+        3. Каждую страницу сразу записывает в базу через UPSERT (ON CONFLICT ... DO UPDATE).
     """
 
     from datetime import datetime, timedelta
 
     tokens = load_api_tokens()
     conn = create_connection_w_env()
-    take = 5000
 
     # Дата начала и конца (последние 7 дней)
     date_to = int(time.time())
     date_from = int((datetime.utcnow() - timedelta(days=7)).timestamp())
 
-    for client, token in tokens.items():
-        logging.info(f"Начинаем обновление отзывов за неделю для клиента: {client}")
-        skip = 0
-
-        all_feedbacks = []
-
-        try:
-            # Получаем обе категории — отвеченные и неотвеченные
-            for answered_status in [True, False]:
-                skip = 0
-                while True:
-                    batch = get_wb_feedbacks_batch(
-                        api_token=token,
-                        skip=skip,
-                        take=take,
-                        is_answered=answered_status,
-                        date_from=date_from,
-                        date_to=date_to
-                    )
-
-                    if not batch:
-                        break
-
-                    all_feedbacks.extend(batch)
-                    skip += len(batch)
-                    if len(batch) < take:
-                        break
+    async with aiohttp.ClientSession() as session:
+        for client, token in tokens.items():
+            logging.info(f"Начинаем обновление отзывов за неделю для клиента: {client}")
+            total = 0
 
-            logging.info(f"Клиент {client}: получено {len(all_feedbacks)} отзывов")
+            try:
+                # Получаем обе категории — отвеченные и неотвеченные
+                for answered_status in [True, False]:
+                    pages = iter_wb_feedbacks(session, token, is_answered=answered_status,
+                                              date_from=date_from, date_to=date_to)
+                    async for batch in pages:
+                        upsert_feedbacks_into_db(conn, batch)
+                        total += len(batch)
 
-            if all_feedbacks:
-                upsert_feedbacks_into_db(conn, all_feedbacks)
-                logging.info(f"Клиент {client}: обновлено/вставлено {len(all_feedbacks)} отзывов")
+                logging.info(f"Клиент {client}: обновлено/вставлено {total} отзывов")
 
-        except Exception as e:
-            logging.error(f"Ошибка при обновлении отзывов клиента {client}: {e}")
+            except Exception as e:
+                logging.error(f"Ошибка при обновлении отзывов клиента {client}: {e}")
 
 
 def upsert_feedbacks_into_db(connection, feedbacks: list):
@@ -396,10 +302,11 @@ def upsert_feedbacks_into_db(connection, feedbacks: list):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     logging.info("=== Запуск обновления отзывов Wildberries ===")
 
     try:
-        update_weekly_feedbacks()
+        asyncio.run(update_weekly_feedbacks())
         logging.info("=== Успешно завершено ===")
     except Exception as e:
         logging.error(f"Критическая ошибка при обновлении отзывов: {e}")
\ No newline at end of file
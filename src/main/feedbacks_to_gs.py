@@ -8,6 +8,7 @@ from datetime import datetime
 from utils.my_gspread import connect_to_remote_sheet
 from utils.my_db_functions import get_df_from_db
 from utils.env_loader import *
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -55,6 +56,7 @@ def load_db_data():
     return get_df_from_db(query)
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     PRO_CREDS_PATH = os.getenv("PRO_CREDS_PATH")
 
     purch_sh = connect_to_remote_sheet('Расчет закупки NEW', 'Рейтинг_товаров', creds_file=PRO_CREDS_PATH)
@@ -9,10 +9,12 @@ from datetime import datetime, date, timedelta
 from utils.my_db_functions import get_df_from_db, list_to_sql_select
 from utils.logger import setup_logger
 from utils.env_loader import *
+from utils.my_gspread import init_client
+from utils import my_metrics
 
 logger = setup_logger("make_wb_pay_daily.log")
 
-CLIENT = gspread.service_account(filename=os.getenv('PRO_CREDS_PATH'))
+CLIENT = init_client(os.getenv('PRO_CREDS_PATH'))
 TABLE = CLIENT.open(os.getenv('MAIN_TABLE'))
 
 COL_MATCH = {
@@ -145,6 +147,7 @@ def process_daily_report(target_date):
 # PERIODS = load_periods()
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     # for yesterday
     yesterday = (datetime.now() - timedelta(days=1)).date()
     process_daily_report(yesterday)
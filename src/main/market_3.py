@@ -14,13 +14,16 @@ from utils.utils import load_api_tokens
 from utils.utils import update_df_in_google
 from utils.logger import setup_logger
 from utils.env_loader import *
+from utils.my_gspread import init_client
+from utils.my_general import wb_url
+from utils import my_metrics
 
 logger = setup_logger("market_3.log")
 
 CREDS_PATH = os.getenv("PRO_CREDS_PATH")
 
 def supply_info(account, api_token, begin, end):
-    url = 'https://marketplace-api.wildberries.ru/api/v3/orders'
+    url = wb_url('https://marketplace-api.wildberries.ru/api/v3/orders')
     next_value = 0
     limit = 1000
     full_data = []
@@ -61,7 +64,7 @@ def supply_info(account, api_token, begin, end):
 
 
 async def supply_info(account, api_token, begin, end):
-    url = 'https://marketplace-api.wildberries.ru/api/v3/orders'
+    url = wb_url('https://marketplace-api.wildberries.ru/api/v3/orders')
     next_value = 0
     limit = 1000
     full_data = []
@@ -118,6 +121,7 @@ async def get_all_clients_supply_info(begin, end):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try:
 
@@ -164,7 +168,7 @@ if __name__ == "__main__":
 
     try:
         # Доступ к гугл таблице
-        gc = gspread.service_account(filename=CREDS_PATH)
+        gc = init_client(CREDS_PATH)
         table = gc.open('Для расчетов БД')
         task_sheet = table.worksheet('БД 2 ( ТЕСТ )')
 
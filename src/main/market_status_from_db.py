@@ -9,6 +9,8 @@ from utils.utils import execute_read_query, update_df_in_google
 from utils.my_db_functions import create_connection_w_env
 from utils.logger import setup_logger
 from utils.env_loader import *
+from utils.my_gspread import init_client
+from utils import my_metrics
 
 logger = setup_logger("market_status_from_db.log")
 
@@ -29,6 +31,7 @@ def get_db_table(db_query: str, connection):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try:
 
@@ -41,7 +44,7 @@ if __name__ == "__main__":
         connection.close()
 
         # Дает права на взаимодействие с гугл-таблицами
-        gc = gspread.service_account(filename=CREDS_PATH)
+        gc = init_client(CREDS_PATH)
         table_tasks = gc.open('Для расчетов БД')
         sheet_tasks = table_tasks.worksheet('БД 2 ( ТЕСТ )').get_all_values()
 
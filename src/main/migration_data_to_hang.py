@@ -8,23 +8,23 @@ import gspread
 from utils.utils import update_df_in_google
 from utils.logger import setup_logger
 from utils.env_loader import *
+from utils.my_gspread import open_spreadsheet
+from utils import my_metrics
 
 logger = setup_logger("migration_data_to_hang.log")
 
 CREDS_PATH = os.getenv("PRO_CREDS_PATH")
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try: 
 
-        # Дает права на взаимодействие с гугл-таблицами
-        gc = gspread.service_account(filename=CREDS_PATH)
-
         # Таблица из которой берем данные
-        table_from = gc.open("Для расчетов БД")
+        table_from = open_spreadsheet("Для расчетов БД", creds_file=CREDS_PATH)
 
         #  Таблица в которую закидываем данные
-        table_to = gc.open("ВИСЯЧИЕ + ДОСТАВКА")
+        table_to = open_spreadsheet("ВИСЯЧИЕ + ДОСТАВКА", creds_file=CREDS_PATH)
 
         # Добавляем данные о заданиях в статусах Новые и В сборке
         sheet_from_tasks = table_from.worksheet('Сборочные задания 2').get_all_values()
@@ -9,6 +9,7 @@ import numpy as np
 from utils.my_db_functions import create_db_table, insert_new_rows, get_df_from_db, get_purchase_price_from_db
 from utils.my_gspread import connect_to_remote_sheet
 from utils.logger import setup_logger
+from utils import my_metrics
 
 
 logger = setup_logger("net_profit_from_orders.log")
@@ -269,6 +270,7 @@ def load_yesterday_orders():
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     df = get_data() # выгружаем данные за вчера
     df = df[['date', 'warehouse_type', 'article_id', 'supplier_article', 'subject',
        'order_count', 'total_sales', 'commission', 'purchase_price', 'tax']]
@@ -1,82 +1,120 @@
+import os
+import time
 import requests
 import json
+import numpy as np
 import pandas as pd
 from datetime import date
 import itertools
 import asyncio
-import aiohttp
 import logging
 
-from utils.utils import batchify, load_api_tokens
+from utils.utils import batchify, load_api_tokens, calculate_hash
+from utils.my_async_api import get_limiter, request_json
+from utils.my_general import wb_url
+from utils import my_metrics
+from utils.my_lazy import lazy_import
 
+# aiohttp нужен только для выгрузки статистики; autopilot_hourly импортирует отсюда и другие функции
+aiohttp = lazy_import('aiohttp')
 
-async def adv_stat_async(campaign_ids: list, date_from: str, date_to: str, api_token: str, account: str):
+
+FULLSTATS_URL = wb_url("https://advert-api.wildberries.ru/adv/v3/fullstats")
+
+# статусы активных кампаний: 9 - идут показы, 11 - на паузе
+ACTIVE_CAMPAIGN_STATUSES = (9, 11)
+
+# ограничения adv/v3/fullstats: до 50 кампаний в запросе, 3 запроса в минуту на аккаунт
+FULLSTATS_MAX_IDS = 50
+FULLSTATS_RATE = 3
+
+# ответы fullstats кэшируются на диске по (набор кампаний, период)
+ADV_STATS_CACHE_PATH = os.getenv("ADV_STATS_CACHE_PATH", "./data/adv_stats_cache")
+ADV_STATS_CACHE_TTL = 3600
+
+
+def _stats_cache_file(batch: list, date_from: str, date_to: str):
+    key = calculate_hash({"ids": sorted(batch), "date_from": date_from, "date_to": date_to}, method="blake2b")
+    return os.path.join(ADV_STATS_CACHE_PATH, f"{key}.json")
+
+
+def load_cached_stats(batch: list, date_from: str, date_to: str, ttl: int = ADV_STATS_CACHE_TTL):
+    """Возвращает закэшированный ответ fullstats для батча или None, если кэша нет или он старше ttl сек."""
+    path = _stats_cache_file(batch, date_from, date_to)
+    if not ttl or not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cached_stats(batch: list, date_from: str, date_to: str, batch_data: list):
+    os.makedirs(ADV_STATS_CACHE_PATH, exist_ok=True)
+    path = _stats_cache_file(batch, date_from, date_to)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(batch_data, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+async def fetch_fullstats_batch(session, batch: list, date_from: str, date_to: str, limiter, account: str, cache_ttl: int):
+    """Получает статистику по одному батчу кампаний (из кэша или из API)."""
+    cached = load_cached_stats(batch, date_from, date_to, cache_ttl)
+    if cached is not None:
+        logging.info(f"{account}: статистика по {len(batch)} кампаниям взята из кэша")
+        return cached
+
+    params = {"ids": ",".join(str(c) for c in batch), "beginDate": date_from, "endDate": date_to}
+    try:
+        batch_data = await request_json(session, "GET", FULLSTATS_URL, limiter=limiter, params=params) or []
+    except aiohttp.ClientResponseError as e:
+        # 400 и прочие ошибки запроса повторять бессмысленно
+        logging.error(f"Ошибка {e.status} {account}: {e.message}")
+        return []
+    except RuntimeError as e:
+        logging.error(f"{account}: {e}")
+        return []
+
+    if cache_ttl:
+        save_cached_stats(batch, date_from, date_to, batch_data)
+    return batch_data
+
+
+async def adv_stat_async(campaign_ids: list, date_from: str, date_to: str, api_token: str, account: str,
+                         cache_ttl: int = ADV_STATS_CACHE_TTL):
     """
     Получение статистики по списку ID кампаний за указанный период.
+    Батчи отправляются параллельно, частоту запросов ограничивает общий лимитер токена.
 
     :param campaign_ids: список ID кампаний
     :param date_from: дата начала периода в формате YYYY-MM-DD
     :param date_to: дата окончания периода в формате YYYY-MM-DD
     :param api_token: токен для API WB
     :param account: название аккаунта
+    :param cache_ttl: сколько секунд можно использовать закэшированный ответ (0 - без кэша)
     """
-    semaphore = asyncio.Semaphore(10)
-    url = "https://advert-api.wildberries.ru/adv/v3/fullstats"
     headers = {"Authorization": api_token}
-    batches = list(batchify(campaign_ids, 50))
+    limiter = get_limiter(("adv_fullstats", api_token), rate=FULLSTATS_RATE, period=60)
+    # сортируем, чтобы состав батчей (и ключи кэша) не менялся от запуска к запуску
+    batches = list(batchify(sorted(campaign_ids), FULLSTATS_MAX_IDS))
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        results = await asyncio.gather(
+            *(fetch_fullstats_batch(session, batch, date_from, date_to, limiter, account, cache_ttl) for batch in batches)
+        )
+
     data = []
-    async with semaphore:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            for batch in batches:
-                ids_str = ",".join(str(c) for c in batch)
-                params = {"ids": ids_str, "beginDate": date_from, "endDate": date_to}
-
-                # print(f"Запрос для {account}: {params}")
-
-                retry_count = 0
-                while retry_count < 5:
-                    try:
-                        async with session.get(url, params=params) as response:
-                            logging.info(f"HTTP статус: {response.status}")
-
-                            if response.status == 400:
-                                err = await response.json()
-                                logging.error(f"Ошибка 400 {account}: {err.get('message') or err}")
-                                # retry_count += 1
-                                # await asyncio.sleep(60)
-                                continue
-
-                            if response.status == 429:
-                                logging.error("429 Too Many Requests — ждём минуту")
-                                retry_count += 1
-                                await asyncio.sleep(60)
-                                continue
-
-                            response.raise_for_status()
-                            batch_data = await response.json()
-
-                            # добавляем поле account в каждый элемент
-                            for item in batch_data or []:
-                                item["account"] = account
-                                item["date"] = date_from
-                            data.extend(batch_data or [])
-                            break
-
-                    except aiohttp.ClientError as e:
-                        logging.error(f"Сетевая ошибка для {account}: {e}")
-                        retry_count += 1
-                        await asyncio.sleep(30)
-
-                # WB ограничивает 1 запрос/мин → ждём после каждого батча
-                await asyncio.sleep(60)
-
-        return data
+    for batch_data in results:
+        # добавляем поле account в каждый элемент
+        for item in batch_data:
+            item["account"] = account
+            item["date"] = date_from
+        data.extend(batch_data)
+    return data
     
 
 def camp_list(api_token: str, account: str):
-    url = 'https://advert-api.wildberries.ru/adv/v1/promotion/adverts'
+    url = wb_url('https://advert-api.wildberries.ru/adv/v1/promotion/adverts')
     camps = []
-    campaign_statuses = [9, 11]
+    campaign_statuses = ACTIVE_CAMPAIGN_STATUSES
     headers = {'Authorization': api_token}
     for status_id in campaign_statuses:
         params = {
@@ -101,9 +139,9 @@ def camp_list(api_token: str, account: str):
 
 
 def camp_list_manual(api_token: str, account: str):
-    url = 'https://advert-api.wildberries.ru/adv/v0/auction/adverts'
+    url = wb_url('https://advert-api.wildberries.ru/adv/v0/auction/adverts')
     camps = []
-    campaign_statuses = [9, 11]
+    campaign_statuses = ACTIVE_CAMPAIGN_STATUSES
     headers = {'Authorization': api_token}
     for status_id in campaign_statuses:
         params = {
@@ -124,96 +162,184 @@ def camp_list_manual(api_token: str, account: str):
                 camps.append(data['adverts'])
     return camps
 
+def load_active_campaign_ids_full(api_token: str, account: str):
+    """Полный список ID активных кампаний через camp_list и camp_list_manual (4 запроса)."""
+    camps_list = camp_list(api_token, account)
+    campaigns = list(itertools.chain(*camps_list))
+    campaign_ids = [c['advertId'] for c in campaigns]
+    camps_list_2 = camp_list_manual(api_token, account)
+    campaigns_2 = list(itertools.chain(*camps_list_2))
+    campaign_ids_2 = [c['id'] for c in campaigns_2 if c['status'] in ACTIVE_CAMPAIGN_STATUSES]
+    campaign_ids.extend(campaign_ids_2)
+    return sorted(set(campaign_ids))
+
+
+# -------------------------------- КЭШ СПИСКА КАМПАНИЙ --------------------------------
+
+CAMPAIGNS_COUNT_URL = wb_url("https://advert-api.wildberries.ru/adv/v1/promotion/count")
+
+CAMPAIGNS_CACHE_PATH = os.getenv("CAMPAIGNS_CACHE_PATH", "./data/campaigns_cache")
+CAMPAIGNS_CACHE_TTL = 600
+
+
+def load_campaigns_cache(account: str):
+    path = os.path.join(CAMPAIGNS_CACHE_PATH, f"{account.lower()}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_campaigns_cache(account: str, cache: dict):
+    os.makedirs(CAMPAIGNS_CACHE_PATH, exist_ok=True)
+    path = os.path.join(CAMPAIGNS_CACHE_PATH, f"{account.lower()}.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+async def fetch_campaign_statuses(session, api_token: str):
+    """
+    Одним запросом получает все кампании аккаунта с типом, статусом и временем последнего изменения.
+    Возвращает {advertId (str): {'type': ..., 'status': ..., 'changeTime': ...}}.
+    """
+    limiter = get_limiter(("adv_count", api_token), rate=5, period=1, burst=5)
+    data = await request_json(session, "GET", CAMPAIGNS_COUNT_URL, limiter=limiter,
+                              headers={"Authorization": api_token}) or {}
+    statuses = {}
+    for group in data.get("adverts") or []:
+        for advert in group.get("advert_list") or []:
+            statuses[str(advert["advertId"])] = {
+                "type": group.get("type"),
+                "status": group.get("status"),
+                "changeTime": advert.get("changeTime"),
+            }
+    return statuses
+
+
+async def get_active_campaign_ids(session, account: str, api_token: str, ttl: int = CAMPAIGNS_CACHE_TTL):
+    """
+    Возвращает ID активных кампаний аккаунта.
+    Пока кэш моложе ttl сек. - берёт их из кэша без запросов. Иначе получает статусы всех кампаний
+    одним запросом promotion/count (вместо четырёх запросов camp_list/camp_list_manual).
+    Если promotion/count недоступен, использует старый кэш или полный список из camp_list/camp_list_manual.
+    """
+    cache = load_campaigns_cache(account)
+    if cache and time.time() - cache["fetched_at"] < ttl:
+        return cache["active_ids"]
+
+    try:
+        statuses = await fetch_campaign_statuses(session, api_token)
+    except Exception as e:
+        logging.warning(f"{account}: не удалось получить статусы кампаний ({e})")
+        if cache:
+            return cache["active_ids"]
+        return await asyncio.to_thread(load_active_campaign_ids_full, api_token, account)
+
+    active_ids = sorted(int(advert_id) for advert_id, info in statuses.items()
+                        if info["status"] in ACTIVE_CAMPAIGN_STATUSES)
+    save_campaigns_cache(account, {"fetched_at": time.time(), "active_ids": active_ids})
+    return active_ids
+
+
+async def get_account_adv_data(session, account: str, api_token: str, date_from: str, date_to: str):
+    campaign_ids = await get_active_campaign_ids(session, account, api_token)
+    logging.info(f"Получаем данные за {date_from} по ЛК {account}: {len(campaign_ids)} кампаний")
+    return await adv_stat_async(campaign_ids, date_from, date_to, api_token, account)
+
+
 async def get_all_adv_data():
     all_adv_data = []
-    tasks = []
-    for account, api_token in load_api_tokens().items():
-        camps_list = camp_list(api_token, account)
-        campaigns = list(itertools.chain(*camps_list))
-        campaign_ids = [c['advertId'] for c in campaigns]
-        camps_list_2 = camp_list_manual(api_token, account)
-        campaigns_2 = list(itertools.chain(*camps_list_2))
-        campaign_ids_2 = [c['id'] for c in campaigns_2 if c['status'] in (9, 11)]
-        campaign_ids.extend(campaign_ids_2)
-        campaign_ids = list(set(campaign_ids))
-
-        date_from = date_to = date.today().strftime("%Y-%m-%d")
-        logging.info(f"Получаем данные за {date_from} по ЛК {account}")
-        tasks.append(adv_stat_async(campaign_ids, date_from, date_to, api_token, account))
-    stats = await asyncio.gather(*tasks)
+    date_from = date_to = date.today().strftime("%Y-%m-%d")
+    async with aiohttp.ClientSession() as session:
+        stats = await asyncio.gather(
+            *(get_account_adv_data(session, account, api_token, date_from, date_to)
+              for account, api_token in load_api_tokens().items())
+        )
     for stat in stats:
         all_adv_data.extend(stat)
     return all_adv_data
 
+# appType площадок и метрики, которые берём по каждой площадке
+PLATFORMS = {1: 'pc', 32: 'android', 64: 'ios'}
+PLATFORM_METRICS = ['atbs', 'canceled', 'clicks', 'cpc', 'cr', 'ctr', 'orders', 'shks', 'sum_price', 'views']
+
+
+def adv_data_to_frame(adv_data):
+    """
+    Разворачивает ответ fullstats в DataFrame за один проход: колонки собираются списками,
+    метрики площадок (ПК, android, ios) - в колонки вида clicks_pc, views_android, ...
+    Для АРК средняя позиция берётся из boosterStats, article_id - из nms площадки.
+    """
+    n = len(adv_data)
+    columns = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = [None] * n
+        return columns[name]
+
+    for i, camp in enumerate(adv_data):
+        for key, value in camp.items():
+            if key not in ('boosterStats', 'days'):
+                column(key)[i] = value
+
+        booster_stats = camp.get('boosterStats') or []
+        column('avg_position')[i] = booster_stats[0].get('avg_position') if booster_stats else None
+
+        days = camp.get('days') or []
+        for platform in days[0].get('apps', []) if days else []:
+            suffix = PLATFORMS.get(platform.get('appType'))
+            if suffix is None:
+                continue
+            for metric in PLATFORM_METRICS:
+                column(f'{metric}_{suffix}')[i] = platform.get(metric)
+            nms = platform.get('nms') or []
+            if nms:
+                column('article_id')[i] = nms[0]['nmId']
+
+    column('article_id')
+    return pd.DataFrame(columns)
+
+
 def processed_adv_data(adv_data):
-    processed_data = []
-    for camp in adv_data:
-        # print(camp)
-        # Для АРК берем среднюю позицию из boosterStats
-        try:
-            camp['avg_position'] = camp['boosterStats'][0]['avg_position']
-        except (KeyError, IndexError):
-            camp['avg_position'] = None
-        # Получаем данные по всем платформам ios, PC, android
-        try:
-            platforms = camp['days'][0]['apps']
-            # print(platforms)
-            for platform in platforms:
-                # print(platform)
-                # Если appType = 1, то это ПК
-                if platform['appType'] == 1:
-                    camp['atbs_pc'] = platform['atbs']
-                    camp['canceled_pc'] = platform['canceled']
-                    camp['clicks_pc'] = platform['clicks']
-                    camp['cpc'] = platform['cpc']
-                    camp['cr_pc'] = platform['cr']
-                    camp['ctr_pc'] = platform['ctr']
-                    camp['orders_pc'] = platform['orders']
-                    camp['shks_pc'] = platform['shks']
-                    camp['sum_price_pc'] = platform['sum_price']
-                    camp['views_pc'] = platform['views']
-                    camp['article_id'] = platform['nms'][0]['nmId']
-                # Если appType = 32, то это андроид
-                elif platform['appType'] == 32: 
-                    camp['atbs_android'] = platform['atbs']
-                    camp['canceled_android'] = platform['canceled']
-                    camp['clicks_android'] = platform['clicks']
-                    camp['cr_android'] = platform['cr']
-                    camp['ctr_android'] = platform['ctr']
-                    camp['orders_android'] = platform['orders']
-                    camp['shks_android'] = platform['shks']
-                    camp['sum_price_android'] = platform['sum_price']
-                    camp['views_android'] = platform['views']
-                    camp['article_id'] = platform['nms'][0]['nmId']
-                elif platform['appType'] == 64:  # Если appType = 4, то это ios
-                    camp['atbs_ios'] = platform['atbs']
-                    camp['canceled_ios'] = platform['canceled']
-                    camp['clicks_ios'] = platform['clicks']
-                    camp['cr_ios'] = platform['cr']
-                    camp['ctr_ios'] = platform['ctr']
-                    camp['orders_ios'] = platform['orders']
-                    camp['shks_ios'] = platform['shks']
-                    camp['sum_price_ios'] = platform['sum_price']
-                    camp['views_ios'] = platform['views']
-                    camp['article_id'] = platform['nms'][0]['nmId']
-        except KeyError:
-            print('no days key')
-        
-        # Удаляем ненужные ключи, перед созданием датафрейма
-        try:
-            del camp['boosterStats']
-        except KeyError:
-            print("Нет ключа boosterStats")
-        # 
-        try:
-            del camp['days']
-        except KeyError:
-            print("Нет ключа boosterStats")
-        # print(camp)
-        processed_data.append(camp)
-    return processed_data
+    """
+    Плоские записи по кампаниям (список словарей), см. adv_data_to_frame.
+    """
+    df = adv_data_to_frame(adv_data)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def aggregate_adv_by_article(adv_df):
+    """
+    Агрегирует статистику кампаний по артикулам одним groupby: клики, показы, затраты,
+    а также ctr, cpc, cpm. Возвращает DataFrame с индексом article_id.
+    """
+    metrics = ['clicks', 'views', 'sum']
+    if adv_df.empty or not set(metrics) <= set(adv_df.columns):
+        empty_index = pd.Index([], dtype='int64', name='article_id')
+        return pd.DataFrame(columns=['clicks', 'views', 'adv_spend', 'ctr', 'cpc', 'cpm'], index=empty_index)
+
+    df = adv_df.dropna(subset=['article_id'])
+    agg = (
+        df.assign(article_id=df['article_id'].astype('int64'))
+          .groupby('article_id')[metrics]
+          .sum()
+          .rename(columns={'sum': 'adv_spend'})
+    )
+
+    clicks = agg['clicks'].to_numpy(dtype=float)
+    views = agg['views'].to_numpy(dtype=float)
+    spend = agg['adv_spend'].to_numpy(dtype=float)
+
+    agg['ctr'] = np.round(np.divide(clicks, views, out=np.zeros_like(clicks), where=views > 0), 2)
+    agg['cpc'] = np.round(np.divide(spend, clicks, out=np.zeros_like(spend), where=clicks > 0), 2)
+    agg['cpm'] = np.round(np.divide(spend * 1000, views, out=np.zeros_like(spend), where=views > 0), 2)
+    return agg
+
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     data = asyncio.run(get_all_adv_data())
     ready_data = processed_adv_data(data)
     with open('final_adv_data_example.json', "w", encoding="utf-8") as f:
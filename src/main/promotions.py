@@ -13,8 +13,9 @@ from datetime import time, datetime, timedelta
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
 from utils.my_db_functions import create_connection_w_env
-from utils.my_general import to_iso_z, save_json, date_from_now
+from utils.my_general import to_iso_z, save_json, date_from_now, wb_url
 from utils.logger import *
+from utils import my_metrics
 
 # AI
 from azure.ai.inference import ChatCompletionsClient
@@ -101,7 +102,7 @@ def get_promotions(api_key, start_dt, end_dt, all_promo=False, limit=1000, offse
     start_dt = to_iso_z(start_dt, time(0, 0, 0))
     end_dt = to_iso_z(end_dt, time(23, 59, 59))
 
-    url = "https://dp-calendar-api.wildberries.ru/api/v1/calendar/promotions"
+    url = wb_url("https://dp-calendar-api.wildberries.ru/api/v1/calendar/promotions")
     headers = {"Authorization": api_key}
     params = {
         "startDateTime": start_dt,
@@ -141,7 +142,7 @@ def get_promotion_details(api_key, promotion_ids):
         api_key (str): API ключ
         promotion_ids (list[int]): Список ID акций
     """
-    url = "https://dp-calendar-api.wildberries.ru/api/v1/calendar/promotions/details"
+    url = wb_url("https://dp-calendar-api.wildberries.ru/api/v1/calendar/promotions/details")
     headers = {"Authorization": api_key}
     params = [("promotionIDs", str(pid)) for pid in promotion_ids]
     response = requests.get(url, headers=headers, params=params)
@@ -323,4 +324,5 @@ def main(folder = None):
     logger.info('data is save to an excel file')
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     main()
\ No newline at end of file
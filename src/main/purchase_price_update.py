@@ -9,6 +9,7 @@ import utils.my_gspread as gs
 from utils.my_pandas import process_decimal
 from utils.my_db_functions import get_df_from_db
 from utils.logger import setup_logger
+from utils import my_metrics
 
 logger = setup_logger("purchase_price_update.log")
 
@@ -94,7 +95,7 @@ def load_wilds_with_unchangeable_price(sh = None):
     '''
 
     if not sh:
-        sh = gs.connect_to_remote_sheet('UNIT 2.0 (tested)', 'Сопост')
+        sh = gs.unit_sheet(gs.UNIT_SOPOST_SHEET)
 
     # загружаем цены, которые нельзя изменять
     never_change_col = gs.col_values_by_name(col_name='Неизменяемая цена', sh = sh) # проблема с этой функцией - берёт данные предыдущей колонки, приходится использовать offset
@@ -115,14 +116,11 @@ def process_data(sh, round_price=False):
     db_data = load_data_from_db(round_price)
 
     # wild with price we can't change
-    wilds_with_unchangeable_price = load_wilds_with_unchangeable_price(sh)
+    # Сопост читается из снимка UNIT (один запрос за запуск), sh нужен только для записи
+    sopost = gs.unit_sheet(gs.UNIT_SOPOST_SHEET)
+    wilds_with_unchangeable_price = load_wilds_with_unchangeable_price(sopost)
 
-    article_cost_range = gs.define_range(target_header_name = 'wild',
-                                                all_headers = list(sh.row_values(1)),
-                                                number_of_columns = 2,
-                                                values_first_row = 2,
-                                                sh_len = sh.row_count)
-    unit_values = sh.get_values(article_cost_range)
+    unit_values = sopost.rows('wild', number_of_columns = 2)
 
     # dict {article : purchase_price} from unit 
     unit_prices = {row[0]: gs.clean_number(row[1]) for row in unit_values}
@@ -186,7 +184,7 @@ def update_purchase_price_sopost(sh, data):
     new_purchase_price_per_item = data.set_index('local_vendor_code')['price_per_item'].to_dict()
     old_purchase_price_per_item = data.set_index('local_vendor_code')['unit_price'].to_dict()
 
-    headers = sh.row_values(1)
+    headers = gs.get_headers(sh)
     sku_col_letter = gs.column_number_to_letter(gs.find_gscol_num_by_name(col_name = 'wild', sh = sh, headers=headers) - 1)
     purchase_price_col_letter = gs.column_number_to_letter(gs.find_gscol_num_by_name(col_name = 'Стоимость в закупке (руб.)', sh = sh, headers=headers) - 1)
 
@@ -247,6 +245,7 @@ def send_report(data):
         raise
     
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try:
         sh = gs.connect_to_remote_sheet('UNIT 2.0 (tested)', 'Сопост')
@@ -15,6 +15,7 @@ from datetime import datetime
 from utils.env_loader import *
 from utils.my_gspread import connect_to_local_sheet
 from utils.my_db_functions import fetch_db_data_into_dict
+from utils import my_metrics
 
 
 # ---- LOGS ----
@@ -82,6 +83,7 @@ def load_ror_by_day(date_start = '2025-07-16'):
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try: 
         # load data
@@ -6,13 +6,14 @@ import os
 import asyncio
 import requests
 import pandas as pd
-from itertools import zip_longest
 from datetime import datetime, timedelta
 
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
 from utils.my_db_functions import fetch_db_data_into_dict
-from utils.my_gspread import connect_to_local_sheet, connect_to_remote_sheet, clean_number, column_number_to_letter
+from utils.my_gspread import connect_to_local_sheet, connect_to_remote_sheet, clean_number, column_number_to_letter, unit_sheet, UNIT_SOPOST_SHEET
+from utils.my_general import wb_url
+from utils import my_metrics, my_api_cache
 
 logger = setup_logger("remains_report_update.log")
 
@@ -23,7 +24,7 @@ def get_wb_remains(api_token, date):
     Result:
         Full json from WB API method supplier/stocks
     '''
-    url = 'https://statistics-api.wildberries.ru/api/v1/supplier/stocks'
+    url = wb_url('https://statistics-api.wildberries.ru/api/v1/supplier/stocks')
     headers = {'Authorization': api_token}
     params = {'dateFrom': date}
     response = requests.get(url, params=params, headers=headers)
@@ -34,24 +35,12 @@ def get_wb_remains(api_token, date):
 
 
 def load_data_from_sopost():
-    sopost_sh = connect_to_remote_sheet('UNIT 2.0 (tested)', 'Сопост')
-    unit_headers = sopost_sh.row_values(1)
-
-    wild_col = sopost_sh.col_values(unit_headers.index('wild') + 1)[1:]
-    name_col = sopost_sh.col_values(unit_headers.index('Наименование') + 1)[1:]
-    cat_col = sopost_sh.col_values(unit_headers.index('предмет') + 1)[1:]
-    purch_price_col = sopost_sh.col_values(unit_headers.index('Стоимость в закупке (руб.)') + 1)[1:]
-
-    data = []
-    for w, n, c, p in zip_longest(wild_col, name_col, cat_col, purch_price_col):
-        data.append({
-            'item': w,
-            'name': n,
-            'category': c,
-            'purchase_price': float(clean_number(p)) if p else 0.0
-        })
-
-    df = pd.DataFrame(data)
+    sopost = unit_sheet(UNIT_SOPOST_SHEET)
+    df = sopost.to_frame({'wild': 'item',
+                          'Наименование': 'name',
+                          'предмет': 'category',
+                          'Стоимость в закупке (руб.)': 'purchase_price'},
+                         converters={'purchase_price': lambda p: float(clean_number(p)) if p else 0.0})
     df_clean = df.drop_duplicates()
     return df_clean
 
@@ -74,7 +63,8 @@ async def fetch_client(client_name: str, api_token: str, date: str) -> list:
     Adds 'client' field to each item.
     """
     logger.info(f'Processing {client_name}')
-    client_data = await asyncio.to_thread(get_wb_remains, api_token, date)
+    client_data = await asyncio.to_thread(my_api_cache.fetch, 'supplier_stocks', client_name, {'dateFrom': date},
+                                          lambda: get_wb_remains(api_token, date))
     for item in client_data:
         item['client'] = client_name
     return client_data
@@ -108,6 +98,7 @@ async def get_wb_remains_for_clients(tokens: dict, date: str) -> list:
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
 
     try:
 
@@ -0,0 +1,21 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.logger import setup_logger
+from utils.my_cards import sync_all_cards
+from utils import my_metrics
+
+logger = setup_logger("sync_cards.log")
+
+# Держит локальный каталог карточек (my_cards, CARDS_CACHE_PATH) свежим:
+# инкрементальная синхронизация по всем кабинетам, --full - перечитать каталоги целиком.
+if __name__ == "__main__":
+    my_metrics.start_job()
+
+    result = sync_all_cards(full='--full' in sys.argv)
+    failed = [account for account, received in result.items() if received is None]
+    logger.info(f"Карточки обновлены: {result}")
+    if failed:
+        logger.error(f"Не удалось обновить карточки кабинетов: {failed}")
+        sys.exit(1)
@@ -4,10 +4,12 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from utils.logger import setup_logger
 from utils.my_db_functions import create_connection_w_env
+from utils import my_metrics
 
 logger = setup_logger("temp_refresh.log")
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     conn = None
     cur = None
 
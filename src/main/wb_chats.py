@@ -6,55 +6,18 @@ import json
 import aiohttp
 import asyncio
 from datetime import datetime
-from typing import Dict, Any
 
 from utils.utils import load_api_tokens
 from utils.logger import setup_logger
 from utils.my_db_functions import create_connection_w_env
+from utils.my_async_api import KeyCursor, paginate
+from utils.my_general import wb_url
+from utils import my_metrics
 
 logger = setup_logger('wb_chats.log')
 
-SEM = asyncio.Semaphore(3)
-
-async def fetch_events_page(
-    session: aiohttp.ClientSession,
-    token: str,
-    next_timestamp: int
-) -> Dict[str, Any]:
-    """Выполняет один запрос к API Wildberries и возвращает события."""
-    url = f"https://buyer-chat-api.wildberries.ru/api/v1/seller/events?next={next_timestamp}"
-    headers = {"Authorization": token, "Content-Type": "application/json"}
-
-    try:
-        async with session.get(url, headers=headers) as response:
-            response.raise_for_status()
-            data = await response.json()
-    except aiohttp.ClientError as e:
-        print(f"Ошибка HTTP-запроса (next={next_timestamp}): {e}")
-        return {"events": [], "next_ts": None, "total": 0}
-
-    result = data.get("result", {})
-    events = result.get("events", [])
-    next_ts = result.get("next")
-    total = result.get("totalEvents", 0)
-
-    oldest_time = result.get("oldestEventTime")
-
-    if oldest_time:
-        try:
-            oldest_date = datetime.fromisoformat(oldest_time).date()
-        except ValueError:
-            oldest_date = None
-    else:
-        oldest_date = None
-
-    print(f"Получено событий: {total}, next={next_ts}, oldest date: {oldest_date}")
-    return {
-        "events": events,
-        "next_ts": next_ts,
-        "total": total
-    }
-
+# не больше 3 кабинетов одновременно
+CONCURRENT_CLIENTS = 3
 
 def insert_events(conn, events, client):
     """Insert a list of events into the wb_chats table with client info."""
@@ -91,22 +54,29 @@ def insert_events(conn, events, client):
     logger.info(f"Inserted {len(events)} events into wb_chats for client: {client}")
 
 
-async def fetch_all_for_client(session, conn, acc_name, token):
-    async with SEM:
-        logger.info(f"Starting fetch for client: {acc_name}")
-        next_timestamp = 0
-
-        while next_timestamp is not None:
-            data = await fetch_events_page(session, token, next_timestamp)
+def iter_events(session: aiohttp.ClientSession, token: str, next_timestamp: int = 0):
+    """Асинхронный генератор страниц событий чатов, пагинация по курсору next из ответа."""
+    url = wb_url("https://buyer-chat-api.wildberries.ru/api/v1/seller/events")
+    pagination = KeyCursor(
+        next_cursor=lambda response, events: response.get("result", {}).get("next"),
+        apply_cursor=lambda request, ts: request["params"].update({"next": ts}),
+        initial=next_timestamp,
+    )
+    return paginate(session, url, pagination,
+                    headers={"Authorization": token, "Content-Type": "application/json"},
+                    extract=lambda response: response.get("result", {}).get("events"),
+                    delay=1)  # per-client rate limit
 
-            if data["total"] == 0:
-                logger.info(f"No events for client {acc_name}. Stopping.")
-                break
 
-            insert_events(conn, data["events"], acc_name)
-            next_timestamp = data["next_ts"]
+async def fetch_all_for_client(session, sem, conn, acc_name, token):
+    async with sem:
+        logger.info(f"Starting fetch for client: {acc_name}")
 
-            await asyncio.sleep(1)  # per-client rate limit
+        try:
+            async for events in iter_events(session, token):
+                insert_events(conn, events, acc_name)
+        except Exception as e:
+            logger.error(f"{acc_name}: ошибка при загрузке событий: {e}")
 
         logger.info(f"{acc_name}: finished fetching")
 
@@ -118,26 +88,30 @@ async def test_call_one_client():
     print(f"Testing fetch for client: {acc_name}")
 
     async with aiohttp.ClientSession() as session:
-        next_timestamp = 0  # start from beginning
-        data = await fetch_events_page(session, token, next_timestamp)
+        events = []
+        async for events in iter_events(session, token):
+            break  # first page only, from the beginning
 
     print(f"Data for {acc_name}:")
-    print(data)
+    print(events)
 
 
 async def upload_all_data():
     tokens = load_api_tokens()
     conn = create_connection_w_env()
+    # семафор привязан к циклу событий, а планировщик повторно запускает __main__ в уже импортированном модуле
+    sem = asyncio.Semaphore(CONCURRENT_CLIENTS)
 
     async with aiohttp.ClientSession() as session:
         tasks = [
-            fetch_all_for_client(session, conn, acc_name, token)
+            fetch_all_for_client(session, sem, conn, acc_name, token)
             for acc_name, token in tokens.items()
         ]
         await asyncio.gather(*tasks)
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     try:
         asyncio.run(upload_all_data())
     except KeyboardInterrupt:
@@ -14,6 +14,7 @@ import asyncio
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
 from utils.my_db_functions import create_connection_w_env, fetch_db_data_into_list
+from utils import my_metrics
 from wb_supplies_to_db import process_missing_data_all_clients, process_missing_data
 
 # ---- LOGS ----
@@ -21,6 +22,7 @@ logger = setup_logger("wb_missing_supplies_goods_to_db.log")
 
 
 if __name__ == "__main__":
+    my_metrics.start_job()
     asyncio.run(process_missing_data_all_clients(logger))
 
 
@@ -1,60 +1,43 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-import requests
+import asyncio
+import aiohttp
 from psycopg2 import extras
-import time
 
 from utils.env_loader import *
 from utils.logger import setup_logger
 from utils.utils import load_api_tokens
 from utils.my_db_functions import create_connection_w_env
+from utils.my_async_api import KeyCursor, paginate
+from utils.my_general import wb_url
+from utils import my_metrics
 
 logger = setup_logger("wb_stocks.log")
 
-def get_wb_stocks(api_token: str, date_from: str = "2019-06-20T00:00:00") -> list:
+def iter_wb_stocks(session, api_token: str, date_from: str = "2019-06-20T00:00:00"):
     """
-    Получает все остатки товаров со складов Wildberries, автоматически обрабатывая случаи,
-    когда данных больше 60 000 строк (постраничная загрузка).
+    Асинхронный генератор остатков товаров со складов Wildberries постранично
+    (до 60 000 строк на страницу, следующая страница - от lastChangeDate последней записи).
 
     Аргументы:
+        session (aiohttp.ClientSession): сессия для запросов.
         api_token (str): API-ключ Wildberries.
         date_from (str): Дата в формате RFC3339 (по умолчанию ранняя дата для полной выборки).
 
     Возвращает:
-        list: Список всех записей остатков.
+        Асинхронный генератор списков записей остатков.
     """
 
-    url = "https://statistics-api.wildberries.ru/api/v1/supplier/stocks"
-    headers = {"Authorization": api_token}
-    all_stocks = []
-    current_date = date_from
-
-    while True:
-        params = {"dateFrom": current_date}
-        response = requests.get(url, headers=headers, params=params)
-
-        if response.status_code != 200:
-            logger.error(f"Ошибка {response.status_code}: {response.text}")
-            break
-
-        data = response.json()
-        if not data:
-            logger.warning("Получен пустой ответ")
-            break
-
-        all_stocks.extend(data)
-        current_date = data[-1]["lastChangeDate"]
-
-        # logger.info(f"Получено {len(data)} записей, всего: {len(all_stocks)}")
-
-        # Прекращаем цикл, если данных меньше лимита (т.е. всё выгружено)
-        if len(data) < 60000:
-            break
-
-        time.sleep(61)
-
-    return all_stocks
+    url = wb_url("https://statistics-api.wildberries.ru/api/v1/supplier/stocks")
+    pagination = KeyCursor(
+        next_cursor=lambda response, data: data[-1]["lastChangeDate"],
+        apply_cursor=lambda request, current_date: request["params"].update({"dateFrom": current_date}),
+        initial=date_from,
+        page_size=60000,
+    )
+    # лимит API - 1 запрос в минуту
+    return paginate(session, url, pagination, headers={"Authorization": api_token}, delay=61)
 
 
 def insert_wb_stocks(conn, stocks: list):
@@ -110,24 +93,33 @@ def insert_wb_stocks(conn, stocks: list):
     conn.commit()
 
 
+async def upload_all_stocks(tokens, conn):
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for client, token in tokens.items():
+            try:
+                total = 0
+                async for stocks in iter_wb_stocks(session, token):
+                    insert_wb_stocks(conn, stocks)
+                    total += len(stocks)
+                    logger.info(f"{client}: внесено {len(stocks)} записей, всего {total}")
+
+                if not total:
+                    logger.info(f"Нет данных для клиента {client}, пропускаем.")
+                    continue
+                logger.info(f"Данные по кабинету {client} внесены в БД")
+
+            except Exception as e:
+                logger.error(f"Ошибка обработки клиента {client}: {e}")
+                continue
+
+
 if __name__ == "__main__":
+    my_metrics.start_job()
     
     tokens = load_api_tokens()
     conn = create_connection_w_env()
 
-    for client, token in tokens.items():
-        try:
-            stocks = get_wb_stocks(token)
-            if not stocks:
-                logger.info(f"Нет данных для клиента {client}, пропускаем.")
-                continue
-            
-            logger.info(f"Получено {len(stocks)} записей")
-            insert_wb_stocks(conn, stocks)
-            logger.info(f"Данные по кабинету {client} внесены в БД")
-
-        except Exception as e:
-            logger.error(f"Ошибка обработки клиента {client}: {e}")
-            continue
+    asyncio.run(upload_all_stocks(tokens, conn))
 
     conn.close()
\ No newline at end of file
@@ -0,0 +1,204 @@
+'''
+Задачи планировщика: скрипты src/main, их зависимости и расписание в формате cron.
+
+Расписание берётся из SCHEDULE_PATH (json), чтобы перенести его из crontab без правки кода:
+    {"autopilot_hourly": "5 * * * *", "autopilot_daily": {"schedule": "30 6 * * *", "depends_on": ["avg_position_to_db"]}}
+Файл можно собрать из текущего crontab: python -m scheduler.runner --import-crontab crontab.txt
+Задачи без расписания запускаются только вручную (--run).
+'''
+import os
+import re
+import ast
+import json
+import importlib
+from datetime import timedelta
+
+SCHEDULE_PATH = os.getenv('SCHEDULE_PATH', './data/schedule.json')
+
+# зависимости по данным: задача ждёт, пока зависимость в очереди или выполняется,
+# и пропускается, если последний запуск зависимости упал
+DEPENDS_ON = {
+    'autopilot_daily': ['avg_position_to_db'],          # avg_position
+    'feedbacks_to_gs': ['feedbacks_to_db'],             # wb_feedbacks
+    'db_data_to_purch_gs': ['wb_supplies_to_db'],       # wb_supplies_goods
+    'wb_missing_supplies_goods_to_db': ['wb_supplies_to_db'],
+}
+
+SCRIPTS = [
+    'add_new_items', 'adv_spend', 'autopilot_daily', 'autopilot_hourly', 'avg_position_to_db', 'balance_history',
+    'china_buy', 'daily_penalties_to_gs', 'db_data_to_purch_gs', 'deductions_to_db', 'delete_items',
+    'expenses_gs_to_db', 'feedbacks_to_db', 'feedbacks_to_gs', 'make_wb_pay_daily', 'market_3',
+    'market_status_from_db', 'migration_data_to_hang', 'net_profit_from_orders', 'new_adv', 'promotions',
+    'purchase_price_update', 'rate_of_return', 'remains_report_update', 'sync_cards', 'temp_refresh', 'wb_chats',
+    'wb_missing_supplies_goods_to_db', 'wb_stocks', 'wb_supplies_to_db',
+]
+
+# расписание по умолчанию, если задачи нет в SCHEDULE_PATH:
+# каталог карточек (my_cards) должен быть свежим, иначе add_new_items ищет карточки запросами по одной
+DEFAULT_SCHEDULE = {
+    'sync_cards': '*/30 * * * *',
+}
+
+
+# -------------------------------- РАСПИСАНИЕ CRON --------------------------------
+
+
+CRON_MACROS = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+# минуты, часы, день месяца, месяц, день недели (0 и 7 - воскресенье)
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        value, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if value == '*':
+            start, end = low, high
+        elif '-' in value:
+            start, end = map(int, value.split('-', 1))
+        else:
+            start = int(value)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f'Неверное поле cron: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    '''
+    Расписание cron из 5 полей (или @hourly/@daily/...): matches(dt) - должна ли задача стартовать в эту минуту.
+    Как в cron, если ограничены и день месяца, и день недели, достаточно совпадения любого из них.
+    '''
+
+    def __init__(self, expr):
+        self.expr = expr
+        fields = CRON_MACROS.get(expr.strip(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f'Ожидается 5 полей cron: {expr}')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches(self, dt):
+        if dt.minute not in self.minutes or dt.hour not in self.hours or dt.month not in self.months:
+            return False
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def __repr__(self):
+        return f'CronSchedule({self.expr!r})'
+
+
+
+
+# -------------------------------- ЗАДАЧИ --------------------------------
+
+
+class Job:
+    '''
+    Скрипт src/main как задача: модуль импортируется один раз (импорты, клиенты и кэши модуля
+    остаются тёплыми между запусками), запуск - выполнение блока if __name__ == "__main__"
+    в пространстве имён модуля, как при запуске из cron.
+    '''
+
+    def __init__(self, name, schedule=None, depends_on=()):
+        self.name = name
+        self.schedule = CronSchedule(schedule) if schedule else None
+        self.depends_on = list(depends_on)
+        self.module = None
+        self.code = None
+
+    def load(self):
+        if self.module is None:
+            module = importlib.import_module(self.name)
+            with open(module.__file__, encoding='utf-8') as f:
+                tree = ast.parse(f.read(), module.__file__)
+            blocks = [node.body for node in tree.body
+                      if isinstance(node, ast.If) and '__main__' in ast.unparse(node.test)]
+            if not blocks:
+                raise ValueError(f'{module.__file__}: нет блока if __name__ == "__main__"')
+            self.code = compile(ast.Module(body=blocks[0], type_ignores=[]), module.__file__, 'exec')
+            self.module = module
+        return self.module, self.code
+
+    def is_due(self, dt):
+        return self.schedule is not None and self.schedule.matches(dt)
+
+    def __repr__(self):
+        return f'Job({self.name!r}, schedule={self.schedule.expr if self.schedule else None!r}, depends_on={self.depends_on})'
+
+
+def load_schedule(path=SCHEDULE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_jobs(path=SCHEDULE_PATH):
+    '''
+    Реестр задач: все скрипты SCRIPTS с зависимостями DEPENDS_ON и расписанием из SCHEDULE_PATH
+    (или DEFAULT_SCHEDULE).
+    '''
+    schedule = load_schedule(path)
+    unknown = set(schedule) - set(SCRIPTS)
+    if unknown:
+        raise ValueError(f'{path}: неизвестные задачи {sorted(unknown)}')
+
+    jobs = {}
+    for name in SCRIPTS:
+        entry = schedule.get(name) or DEFAULT_SCHEDULE.get(name) or {}
+        if isinstance(entry, str):
+            entry = {'schedule': entry}
+        jobs[name] = Job(name, entry.get('schedule'), entry.get('depends_on', DEPENDS_ON.get(name, ())))
+    for job in jobs.values():
+        for dep in job.depends_on:
+            if dep not in jobs:
+                raise ValueError(f'{job.name}: неизвестная зависимость {dep}')
+    return jobs
+
+
+def import_crontab(text):
+    '''
+    Расписание из текста crontab: {скрипт: выражение cron} для строк, запускающих main/<скрипт>.py.
+    '''
+    schedule = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = re.search(r'main/(\w+)\.py', line)
+        if not match or match.group(1) not in SCRIPTS:
+            continue
+        fields = line.split()
+        expr = fields[0] if fields[0].startswith('@') else ' '.join(fields[:5])
+        CronSchedule(expr)
+        schedule[match.group(1)] = expr
+    return schedule
+
+
+def next_run(job, after, limit_days=366):
+    '''Ближайшая минута после after, в которую задача стартует по расписанию (для --list).'''
+    if job.schedule is None:
+        return None
+    dt = after.replace(second=0, microsecond=0)
+    for _ in range(limit_days * 24 * 60):
+        dt += timedelta(minutes=1)
+        if job.schedule.matches(dt):
+            return dt
+    return None
@@ -0,0 +1,282 @@
+'''
+Долгоживущий планировщик вместо отдельных записей crontab для каждого скрипта src/main.
+
+    python -m scheduler.runner                       - работать по расписанию SCHEDULE_PATH
+    python -m scheduler.runner --run autopilot_daily - выполнить задачи сейчас и выйти
+    python -m scheduler.runner --list                - задачи, зависимости и ближайший запуск
+    python -m scheduler.runner --import-crontab FILE - собрать SCHEDULE_PATH из crontab
+
+Запуск из каталога src. Интерпретатор, pandas/gspread/psycopg2 и модули скриптов загружаются один раз;
+между задачами общие только клиент Google Sheets, пул соединений Postgres (create_connection),
+сессии requests (keep-alive) и кэш файла токенов (перечитывается при изменении). Кэши данных utils
+(таблицы, листы, снимки UNIT, заголовки, каталог карточек) сбрасываются перед каждой задачей.
+Каждая задача выполняется в своём потоке, разные задачи - параллельно (долгая выгрузка не задерживает
+остальные); по расписанию задача не ставится в очередь, только если она сама уже в очереди или выполняется.
+Задача с зависимостями ждёт их завершения. Каждый запуск - отдельный учёт и итог my_metrics (job_runs).
+'''
+import os
+import sys
+import json
+import signal
+import logging
+import argparse
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime, timedelta
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(SRC_PATH, 'main')
+# скрипты импортируют друг друга по имени файла (from autopilot_hourly import ...), как при запуске из cron
+for path in (SRC_PATH, MAIN_PATH):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from utils import my_metrics, my_gspread
+from utils.utils import enable_connection_pool
+from scheduler.jobs import SCHEDULE_PATH, load_jobs, import_crontab, next_run
+
+logger = logging.getLogger('scheduler')
+
+# задача текущего потока (и её задач asyncio / asyncio.to_thread) - для логов
+_current_job = contextvars.ContextVar('scheduler_job', default='scheduler')
+
+
+# -------------------------------- ОБЩИЕ РЕСУРСЫ --------------------------------
+
+
+def share_http_sessions():
+    '''
+    requests.get/post/... без сессии открывают новое соединение на каждый запрос;
+    в планировщике они идут через одну сессию на поток, соединения с API переиспользуются.
+    '''
+    import requests
+    import requests.api
+
+    local = threading.local()
+
+    def request(method, url, **kwargs):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        return session.request(method=method, url=url, **kwargs)
+
+    requests.api.request = request
+    requests.request = request
+
+
+def reset_job_caches():
+    '''
+    Кэши данных utils живут в модулях и в одном процессе пережили бы задачу; перед каждой задачей
+    они сбрасываются, чтобы задача видела таблицы и карточки такими же, как при запуске из cron.
+    '''
+    my_gspread.reset_caches()
+    my_cards = sys.modules.get('utils.my_cards')
+    if my_cards is not None:    # ни одна задача ещё не загрузила модуль - сбрасывать нечего
+        my_cards.reset_catalog()
+
+
+class _JobFilter(logging.Filter):
+    '''Добавляет в записи лога имя задачи, в потоке которой сделана запись (%(job)s).'''
+
+    def filter(self, record):
+        record.job = _current_job.get()
+        return True
+
+
+def setup_logging():
+    '''
+    Скрипты настраивают корневой логгер через logging.basicConfig при импорте; в одном процессе
+    сработал бы только первый вызов, поэтому корневой логгер настраивается здесь, до импорта скриптов:
+    общий файл LOGS_PATH/scheduler.log с именем задачи в каждой строке.
+    Логгеры setup_logger() по-прежнему пишут в свои файлы.
+    '''
+    path = os.getenv("LOGS_PATH", "./logs")
+    os.makedirs(path, exist_ok=True)
+    job_filter = _JobFilter()
+    handlers = [logging.FileHandler(f"{path}/scheduler.log", encoding="utf-8"), logging.StreamHandler()]
+    for handler in handlers:
+        handler.addFilter(job_filter)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(job)s - %(levelname)s - %(message)s",
+        handlers=handlers,
+    )
+
+
+
+
+# -------------------------------- ПЛАНИРОВЩИК --------------------------------
+
+
+class Scheduler:
+    '''
+    Поток-таймер раз в минуту ставит в очередь задачи, чьё расписание совпало с текущей минутой;
+    основной поток запускает готовые задачи из очереди, каждую в своём потоке. Задача с зависимостями ждёт,
+    пока зависимости в очереди или выполняются, и пропускается, если последний запуск зависимости упал.
+    '''
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.queue = deque()
+        self.running = {}       # имя задачи -> её поток
+        self.last_status = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+
+    def submit(self, name, reason='расписание'):
+        with self._lock:
+            if name in self.running or name in self.queue:
+                logger.warning(f"{name}: пропуск запуска ({reason}) - предыдущий запуск ещё в очереди или выполняется")
+                return False
+            self.queue.append(name)
+            logger.info(f"{name}: в очереди ({reason})")
+            self._wakeup.notify()
+            return True
+
+    def _next_ready(self):
+        # под self._lock: первая задача очереди, у которой нет зависимостей в очереди или в работе
+        for name in list(self.queue):
+            job = self.jobs[name]
+            if any(dep in self.queue or dep in self.running for dep in job.depends_on):
+                continue
+            self.queue.remove(name)
+            failed = [dep for dep in job.depends_on if self.last_status.get(dep) == 'failed']
+            if failed:
+                logger.error(f"{name}: пропуск - последний запуск зависимостей {failed} завершился ошибкой")
+                self.last_status[name] = 'skipped'
+                continue
+            return name
+        return None
+
+    def run_job(self, name):
+        '''
+        Выполняет блок __main__ скрипта в пространстве имён его модуля, возвращает статус запуска.
+        Вызывается в потоке задачи: учёт my_metrics у потока свой.
+        '''
+        job = self.jobs[name]
+        _current_job.set(name)
+        my_metrics.isolate_run()
+        reset_job_caches()
+        my_metrics.start_job(name)
+        status, error = None, None
+        try:
+            module, code = job.load()
+            exec(code, module.__dict__)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                status, error = 'failed', f'SystemExit: {e.code}'
+        except Exception as e:
+            logger.exception(f"{name}: ошибка выполнения")
+            status, error = 'failed', f'{type(e).__name__}: {e}'[:1000]
+        summary = my_metrics.finish_job(status, error)
+        logger.info(f"{name}: {summary['status']} за {summary['duration_seconds']:.1f} сек.")
+        return summary['status']
+
+    def _tick(self):
+        minute = datetime.now().replace(second=0, microsecond=0)
+        while not self._stop.is_set():
+            for job in self.jobs.values():
+                if job.is_due(minute):
+                    self.submit(job.name)
+            minute += timedelta(minutes=1)
+            self._stop.wait(max(0, (minute - datetime.now()).total_seconds()))
+
+    def _run_thread(self, name):
+        status = 'failed'
+        try:
+            status = self.run_job(name)
+        finally:
+            with self._lock:
+                del self.running[name]
+                self.last_status[name] = status
+                self._wakeup.notify_all()
+
+    def work(self, until_empty=False):
+        '''
+        Запускает готовые задачи из очереди, каждую в своём потоке. Выходит по stop()
+        (или, при until_empty, когда очередь пуста и задачи завершены), дождавшись запущенных задач.
+        '''
+        with self._lock:
+            while True:
+                name = None if self._stop.is_set() else self._next_ready()
+                while name is not None:
+                    thread = threading.Thread(target=self._run_thread, args=(name,), name=f'job-{name}')
+                    self.running[name] = thread
+                    thread.start()
+                    name = self._next_ready()
+                if self._stop.is_set() or (until_empty and not self.queue and not self.running):
+                    break
+                self._wakeup.wait(timeout=1)
+            running = list(self.running.values())
+        for thread in running:
+            thread.join()
+
+    def serve(self):
+        ticker = threading.Thread(target=self._tick, name='scheduler-tick', daemon=True)
+        ticker.start()
+        scheduled = [job.name for job in self.jobs.values() if job.schedule]
+        logger.info(f"Планировщик запущен, задач по расписанию: {len(scheduled)}")
+        self.work()
+        logger.info("Планировщик остановлен")
+
+    def stop(self, *args):
+        # обработчик сигнала: запущенные задачи доработают, новые не начнутся;
+        # без захвата self._lock - сигнал может прийти, пока основной поток его держит (work ждёт не дольше секунды)
+        logger.info("Остановка планировщика после запущенных задач")
+        self._stop.set()
+
+
+
+
+# -------------------------------- ЗАПУСК --------------------------------
+
+
+def print_jobs(jobs):
+    now = datetime.now()
+    for job in jobs.values():
+        schedule = job.schedule.expr if job.schedule else '-'
+        nearest = next_run(job, now)
+        deps = f" после {', '.join(job.depends_on)}" if job.depends_on else ''
+        print(f"{job.name:35} {schedule:20} {nearest.strftime('%d.%m %H:%M') if nearest else 'вручную':12}{deps}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Планировщик скриптов src/main')
+    parser.add_argument('--run', nargs='+', metavar='JOB', help='выполнить задачи сейчас (с учётом зависимостей в очереди) и выйти')
+    parser.add_argument('--list', action='store_true', help='показать задачи и расписание')
+    parser.add_argument('--import-crontab', metavar='FILE', help=f'записать расписание из crontab в {SCHEDULE_PATH}')
+    args = parser.parse_args()
+
+    if args.import_crontab:
+        with open(args.import_crontab, encoding='utf-8') as f:
+            schedule = import_crontab(f.read())
+        os.makedirs(os.path.dirname(SCHEDULE_PATH) or '.', exist_ok=True)
+        with open(SCHEDULE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(schedule, f, ensure_ascii=False, indent=2)
+        print(f"{SCHEDULE_PATH}: задач по расписанию {len(schedule)}")
+        sys.exit(0)
+
+    jobs = load_jobs()
+    if args.list:
+        print_jobs(jobs)
+        sys.exit(0)
+
+    scheduler = Scheduler(jobs)
+    setup_logging()
+    enable_connection_pool()
+    share_http_sessions()
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+
+    if args.run:
+        unknown = [name for name in args.run if name not in jobs]
+        if unknown:
+            parser.error(f"неизвестные задачи: {', '.join(unknown)}")
+        for name in args.run:
+            scheduler.submit(name, reason='вручную')
+        scheduler.work(until_empty=True)
+        sys.exit(0 if all(scheduler.last_status.get(name) in ('ok', 'errors') for name in args.run) else 1)
+
+    scheduler.serve()
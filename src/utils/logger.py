@@ -1,5 +1,6 @@
 import logging, os
 from .env_loader import *
+from .my_metrics import log_counter
 
 LOGS_PATH = os.getenv("LOGS_PATH")
 
@@ -32,5 +33,6 @@ def setup_logger(filename="app.log"):
         sh.setFormatter(fmt)
         logger.addHandler(fh)
         logger.addHandler(sh)
+        logger.addHandler(log_counter)
 
     return logger
@@ -1,75 +1,81 @@
 import os
+import copy
 import json
 import time
-import requests
-from requests.exceptions import RequestException
+import asyncio
 import logging
+from datetime import datetime, timedelta, timezone
+
+# my packages
+from .my_async_api import KeyCursor, paginate, collect_pages, get_limiter
+from .my_general import wb_url
+from .my_lazy import lazy_import
+
+aiohttp = lazy_import('aiohttp')
+requests = lazy_import('requests')
 
 
 # -------------------------------- Product Cards --------------------------------
 
 
-def get_all_product_cards(api_token):
-    """
-    Получает все карточки товаров с учетом пагинации через API Wildberries
+CARDS_LIST_URL = wb_url('https://content-api.wildberries.ru/content/v2/get/cards/list')
+
+
+def content_limiter(api_token):
+    """Общий лимитер content API для токена: 100 запросов в минуту, всплеск до 5."""
+    return get_limiter(('content', api_token), rate=100, period=60, burst=5)
+
+
+def iter_product_cards(session, api_token, cursor=None, ascending=None, limit=100):
     """
+    Асинхронный генератор страниц карточек товаров (content/v2/get/cards/list)
+    с пагинацией по курсору updatedAt/nmID.
 
-    url = 'https://content-api.wildberries.ru/content/v2/get/cards/list'
-    headers = {'Authorization': api_token}
-    
-    # Initial payload
+    Args:
+        session (aiohttp.ClientSession): сессия для запросов.
+        api_token (str): API токен продавца.
+        cursor (dict): {'updatedAt': ..., 'nmID': ...} - с какой карточки продолжать (None - с начала).
+        ascending (bool): сортировка по updatedAt (None - порядок API по умолчанию).
+        limit (int): размер страницы (максимум 100).
+
+    Yields:
+        list: карточки одной страницы.
+    """
     payload = {
         "settings": {
             "filter": {
                 "withPhoto": -1
             },
             "cursor": {
-                "limit": 100
+                "limit": limit
             }
         }
     }
-    
-    all_cards = []
-    
-    while True:
-        # Make the request
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code != 200:
-            print(f"Error: {response.status_code}")
-            print(response.text)
-            break
-            
-        data = response.json()
-        
-        # Add cards to our collection
-        if 'cards' in data:
-            all_cards.extend(data['cards'])
-            print(f"Retrieved {len(data['cards'])} cards. Total: {len(all_cards)}")
-        
-        # Check if we have reached the end
-        if 'cursor' in data and 'total' in data['cursor']:
-            total = data['cursor']['total']
-            limit = payload['settings']['cursor']['limit']
-            
-            # If total is less than limit, we've got all cards
-            if total < limit:
-                print("All cards retrieved!")
-                break
-            else:
-                # Set up pagination for next request
-                if 'updatedAt' in data['cursor'] and 'nmID' in data['cursor']:
-                    payload['settings']['cursor']['updatedAt'] = data['cursor']['updatedAt']
-                    payload['settings']['cursor']['nmID'] = data['cursor']['nmID']
-                else:
-                    print("Pagination information not found in response")
-                    break
-        else:
-            print("Cursor information not found in response")
-            break
-        
-        time.sleep(0.1)
-    
+    if ascending is not None:
+        payload['settings']['sort'] = {"ascending": ascending}
+
+    pagination = KeyCursor(
+        next_cursor=lambda response, cards: {'updatedAt': response['cursor']['updatedAt'],
+                                             'nmID': response['cursor']['nmID']},
+        apply_cursor=lambda request, c: request['json']['settings']['cursor'].update(c),
+        initial=cursor,
+        page_size=limit,
+    )
+    return paginate(session, CARDS_LIST_URL, pagination, method='POST', json=payload,
+                    headers={'Authorization': api_token}, extract=lambda r: r.get('cards'),
+                    limiter=content_limiter(api_token))
+
+
+def get_all_product_cards(api_token):
+    """
+    Получает все карточки товаров с учетом пагинации через API Wildberries
+    """
+    async def load():
+        async with aiohttp.ClientSession() as session:
+            return await collect_pages(iter_product_cards(session, api_token))
+
+    all_cards = asyncio.run(load())
+    print(f"All cards retrieved! Total: {len(all_cards)}")
     return all_cards
 
 
@@ -78,7 +84,6 @@ def get_product_by_nmid(api_token, nmid):
     Получает карточку товара по nmid.
     В качестве nmid можно передать и артикул, и вилд
     """
-    url = 'https://content-api.wildberries.ru/content/v2/get/cards/list'
     headers = {'Authorization': api_token}
     
     payload = {
@@ -93,7 +98,7 @@ def get_product_by_nmid(api_token, nmid):
         }
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    response = requests.post(CARDS_LIST_URL, headers=headers, json=payload)
     
     if response.status_code == 200:
         data = response.json()
@@ -152,8 +157,18 @@ def clean_product_data_for_api(product_data):
     
     
 def get_clean_product_card(api_token, article):
-    # get single product card from api and clean it <-- we'll insert changed data here
-    raw_product_card = get_product_by_nmid(api_token, article)
+    # product card from the local catalog (my_cards) and clean it <-- we'll insert changed data here
+    # the card is posted back after editing, so the catalog is synced incrementally first
+    # (as in edit_product_cards): changes made in WB since the last sync_cards run are not overwritten
+    # the card is requested separately only if the token is not in the tokens file
+    from .my_cards import get_cached_card, account_by_token, sync_account_cards
+
+    account = account_by_token(api_token)
+    if account is not None:
+        sync_account_cards(account, api_token)
+        raw_product_card = copy.deepcopy(get_cached_card(article, account, api_token))
+    else:
+        raw_product_card = get_product_by_nmid(api_token, article)
 
     try:
         # clean data to load it back to WB API
@@ -195,7 +210,7 @@ def update_wb_product_card(api_token, product_card_data):
         raise ValueError("product_card_data должен быть словарем (dict) или списком (list)")
     
     # URL и заголовки для запроса
-    url = 'https://content-api.wildberries.ru/content/v2/cards/update'
+    url = wb_url('https://content-api.wildberries.ru/content/v2/cards/update')
     headers = {
         'Authorization': api_token,
         'Content-Type': 'application/json'
@@ -235,8 +250,116 @@ def update_wb_product_card(api_token, product_card_data):
         }
     
 
+# ограничения content/v2/cards/update: не больше 3000 карточек и 10 Мб в одном запросе
+CARDS_UPDATE_MAX_CARDS = 3000
+CARDS_UPDATE_MAX_BYTES = 10 * 1024 * 1024
+# пауза между запросами на изменение карточек (лимит 10 запросов в минуту)
+CARDS_UPDATE_DELAY = 6
+# cards/error/list заполняется асинхронно: опрос CARDS_ERRORS_POLLS раз с паузой CARDS_ERRORS_DELAY сек.
+CARDS_ERRORS_DELAY = 10
+CARDS_ERRORS_POLLS = 3
+# запас на расхождение часов с WB при отборе ошибок, появившихся после отправки пачки
+CARDS_ERRORS_CLOCK_SKEW = timedelta(seconds=30)
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+
+def chunk_cards_for_update(cards, max_cards=CARDS_UPDATE_MAX_CARDS, max_bytes=CARDS_UPDATE_MAX_BYTES):
+    """
+    Делит карточки на пачки, каждая из которых укладывается в лимиты cards/update
+    по количеству карточек и по размеру тела запроса.
+    """
+    chunk, chunk_size = [], 2  # 2 байта на скобки массива
+    for card in cards:
+        card_size = len(json.dumps(card, ensure_ascii=False).encode('utf-8')) + 1
+        if chunk and (len(chunk) >= max_cards or chunk_size + card_size > max_bytes):
+            yield chunk
+            chunk, chunk_size = [], 2
+        chunk.append(card)
+        chunk_size += card_size
+    if chunk:
+        yield chunk
+
+
+def update_wb_product_cards_bulk(api_token, cards, max_cards=CARDS_UPDATE_MAX_CARDS, delay=CARDS_UPDATE_DELAY):
+    """
+    Обновляет много карточек товаров: делит их на пачки по лимитам API,
+    отправляет пачки с паузой delay и собирает результат по каждой карточке.
+
+    Args:
+        api_token (str): API токен продавца.
+        cards (list): очищенные карточки (см. clean_product_data_for_api).
+        max_cards (int): максимум карточек в одном запросе.
+        delay (float): пауза между запросами, сек.
+
+    Returns:
+        dict: {vendorCode: {'nmID': ..., 'ok': bool, 'errors': [...]}}.
+              Ошибки берутся из ответа на запрос пачки и из cards/error/list
+              (только записи по отправленным vendorCode, появившиеся после отправки их пачки).
+    """
+    results = {}
+    submitted_at = {}   # vendorCode -> время отправки пачки
+    chunks = list(chunk_cards_for_update(cards, max_cards=max_cards))
+
+    for i, chunk in enumerate(chunks, start=1):
+        sent = datetime.now(timezone.utc)
+        response = update_wb_product_card(api_token, chunk)
+        data = response.get('data')
+
+        if response.get('error'):
+            errors = [response['message']]
+        elif response.get('status_code') != 200 or (isinstance(data, dict) and data.get('error')):
+            error_text = data.get('errorText') if isinstance(data, dict) else data
+            errors = [error_text or f"HTTP {response.get('status_code')}"]
+        else:
+            errors = []
+
+        for card in chunk:
+            results[card.get('vendorCode')] = {'nmID': card.get('nmID'), 'ok': not errors, 'errors': list(errors)}
+            if not errors:
+                submitted_at[card.get('vendorCode')] = sent
+        logging.info(f"Отправлена пачка {i}/{len(chunks)}: {len(chunk)} карточек, ошибки: {errors or 'нет'}")
+
+        if i < len(chunks):
+            time.sleep(delay)
+
+    # ошибки валидации приходят асинхронно в список несозданных/неизменённых карточек,
+    # где лежат и старые записи: берём только записи по отправленным карточкам, появившиеся после отправки
+    seen = set()
+    for _ in range(CARDS_ERRORS_POLLS if submitted_at else 0):
+        time.sleep(CARDS_ERRORS_DELAY)
+        try:
+            card_errors = get_product_cards_errors(api_token) or []
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logging.warning(f"Не удалось получить cards/error/list: {e}")
+            continue
+
+        for item in card_errors:
+            vendor_code = item.get('vendorCode')
+            updated_at = _parse_wb_time(item.get('updatedAt') or item.get('updateAt'))
+            key = (vendor_code, updated_at)
+            if (vendor_code not in submitted_at or key in seen or updated_at is None
+                    or updated_at < submitted_at[vendor_code] - CARDS_ERRORS_CLOCK_SKEW):
+                continue
+            seen.add(key)
+            results[vendor_code]['ok'] = False
+            results[vendor_code]['errors'].extend(item.get('errors', []))
+
+    return results
+
+
+def _parse_wb_time(value):
+    # время WB без часового пояса - московское
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=MOSCOW_TZ)
+    
+
 def get_product_cards_errors(api_token):
-    return get_json('https://content-api.wildberries.ru/content/v2/cards/error/list', headers = {'Authorization': api_token})['data']
+    return get_json(wb_url('https://content-api.wildberries.ru/content/v2/cards/error/list'), headers = {'Authorization': api_token})['data']
 
 
 def get_json(url, headers=None, params=None):
@@ -244,9 +367,9 @@ def get_json(url, headers=None, params=None):
         response = requests.get(url, headers=headers, params=params)
         response.raise_for_status()
         return response.json()
-    except RequestException as e:
+    except requests.exceptions.RequestException as e:
         # ошибки подключения
-        raise RequestException(f"Request failed: {str(e)}")
+        raise requests.exceptions.RequestException(f"Request failed: {str(e)}")
     except ValueError as e:
         # если ответ есть, но не читается как json
         raise ValueError(f"Failed to decode JSON response: {str(e)}")
@@ -263,14 +386,36 @@ def post_json(url, headers=None, data=None, json=None, params=None):
         )
         response.raise_for_status()
         return response.json()
-    except RequestException as e:
+    except requests.exceptions.RequestException as e:
         # ошибки подключения
-        raise RequestException(f"POST request failed: {str(e)}")
+        raise requests.exceptions.RequestException(f"POST request failed: {str(e)}")
     except ValueError as e:
         # если ответ есть, но не читается как json
         raise ValueError(f"Failed to decode JSON response: {str(e)}")
     
 
+def iter_trashed_cards(session, api_token: str, locale: str = 'ru', with_photo: int = -1):
+    """
+    Асинхронный генератор страниц карточек из корзины (content/v2/get/cards/trash)
+    с пагинацией по курсору trashedAt/nmID последней карточки страницы.
+    """
+    url = wb_url('https://content-api.wildberries.ru/content/v2/get/cards/trash')
+    payload = {
+        "settings": {
+            "cursor": {"limit": 100},
+            "filter": {"withPhoto": with_photo}
+        }
+    }
+    pagination = KeyCursor(
+        next_cursor=lambda response, cards: {'trashedAt': cards[-1]['trashedAt'], 'nmID': cards[-1]['nmID']},
+        apply_cursor=lambda request, c: request['json']['settings']['cursor'].update(c),
+        page_size=100,
+    )
+    return paginate(session, url, pagination, method='POST', params={'locale': locale}, json=payload,
+                    headers={'Authorization': api_token}, extract=lambda r: r.get('cards'),
+                    limiter=content_limiter(api_token))
+
+
 def get_all_trashed_cards(api_token: str, locale: str = 'ru', with_photo: int = -1):
     """
     Fetches all trashed product cards from Wildberries Content API with pagination.
@@ -283,42 +428,11 @@ def get_all_trashed_cards(api_token: str, locale: str = 'ru', with_photo: int =
     Returns:
         List[Dict]: A list of all trashed cards (each card is a dict).
     """
-    url = 'https://content-api.wildberries.ru/content/v2/get/cards/trash'
-    headers = {'Authorization': api_token}
-    params = {'locale': locale}
-    
-    all_cards = []
-    cursor = {"limit": 100}  # initial cursor without trashedAt/nmID
-
-    while True:
-        payload = {
-            "settings": {
-                "cursor": cursor,
-                "filter": {"withPhoto": with_photo}
-            }
-        }
-
-        response = requests.post(url, headers=headers, params=params, json=payload)
-        response.raise_for_status()
-        data = response.json()
-
-        cards = data.get('cards', [])
-        all_cards.extend(cards)
+    async def load():
+        async with aiohttp.ClientSession() as session:
+            return await collect_pages(iter_trashed_cards(session, api_token, locale, with_photo))
 
-        # Check if we've fetched all items
-        total = data.get('total', 0)
-        if len(cards) == 0 or len(all_cards) >= total:
-            break
-
-        # Prepare cursor for next page using the LAST card in current response
-        last_card = cards[-1]
-        cursor = {
-            "limit": 100,
-            "trashedAt": last_card['trashedAt'],
-            "nmID": last_card['nmID']
-        }
-
-    return all_cards
+    return asyncio.run(load())
 
 
 
@@ -331,7 +445,7 @@ def get_docs_list(api_token, beginTime, endTime, **kwargs):
     Дату принимает в формате "2025-07-15".
     В kwargs можно передать category
     '''
-    url = 'https://documents-api.wildberries.ru/api/v1/documents/list'
+    url = wb_url('https://documents-api.wildberries.ru/api/v1/documents/list')
     headers = {"Authorization": api_token}
     params = {
         "beginTime": beginTime,
@@ -346,7 +460,7 @@ def get_docs_list(api_token, beginTime, endTime, **kwargs):
 # -------------------------------- Orders --------------------------------
 
 def get_orders(api_token, dateFrom, flag = 0):
-    url = 'https://statistics-api.wildberries.ru/api/v1/supplier/orders'
+    url = wb_url('https://statistics-api.wildberries.ru/api/v1/supplier/orders')
     headers = {"Authorization": api_token}
     params = {
         "dateFrom": dateFrom,
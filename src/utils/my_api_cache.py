@@ -0,0 +1,182 @@
+'''
+Кэш ответов API на диске в формате Parquet (pyarrow): задачи, запущенные в одном окне времени,
+используют одну выгрузку вместо повторных запросов к WB.
+
+    data = my_api_cache.fetch('prices', account, {}, lambda: get_data_offset(...), ttl=1800)
+
+    @my_api_cache.cached('sales_funnel', key=lambda account, api_token, nmIDs: (account, {'nmIds': nmIDs}))
+    def get_fun(account, api_token, nmIDs): ...
+
+Снимок - файл API_CACHE_PATH/<эндпоинт>/<аккаунт>/<окно>_<хэш параметров>.parquet, где окно - начало
+интервала длиной ttl сек. (время выровнено по эпохе, поэтому окна в час и меньше совпадают с началом часа).
+Хранятся DataFrame (колонками Arrow) и списки словарей - json-ответы, по JSON-строке на запись в одной колонке,
+поэтому записи с разным набором полей и вложенные объекты не зависят от схемы первой записи. Читаются через memory map.
+Перед записью снимок проверяется обратным преобразованием: если прочитанное не совпадает с ответом
+(типы колонок, не-json значения), снимок не сохраняется. Пустые ответы тоже не кэшируются.
+Файлы старше API_CACHE_KEEP_HOURS удаляются при записи в тот же эндпоинт.
+
+Повтор неудачного запуска на тех же данных, без запросов к WB:
+    API_CACHE_REPLAY='2026-10-19 06:30' python main/autopilot_hourly.py
+берутся снимки окна, в которое попадает это время; если снимка нет - FileNotFoundError.
+Какой снимок прочитан, пишется в лог. Кэш включается API_CACHE=1, нужен pyarrow
+(без него - предупреждение в лог и запросы к WB как обычно).
+'''
+import os
+import json
+import time
+import hashlib
+import logging
+import functools
+from datetime import datetime
+
+# my packages
+from . import my_metrics
+from .env_loader import *
+
+API_CACHE_ENABLED = os.getenv('API_CACHE', '0') == '1'
+API_CACHE_PATH = os.getenv('API_CACHE_PATH', './data/api_cache')
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 1800))
+API_CACHE_KEEP_HOURS = float(os.getenv('API_CACHE_KEEP_HOURS', 48))
+API_CACHE_REPLAY = os.getenv('API_CACHE_REPLAY')
+
+_KIND_KEY = b'api_cache_kind'
+_RECORD_COLUMN = 'record'
+
+_warned = False
+
+
+# -------------------------------- КЛЮЧИ И ФАЙЛЫ --------------------------------
+
+
+def _replay_time():
+    return datetime.strptime(API_CACHE_REPLAY, '%Y-%m-%d %H:%M').timestamp()
+
+
+def snapshot_path(endpoint, account, params, ttl=API_CACHE_TTL, at=None):
+    '''
+    Путь к снимку для (эндпоинт, аккаунт, параметры, окно времени).
+    at - момент времени (timestamp), по умолчанию сейчас или API_CACHE_REPLAY.
+    '''
+    if at is None:
+        at = _replay_time() if API_CACHE_REPLAY else time.time()
+    window = datetime.fromtimestamp(at // ttl * ttl).strftime('%Y%m%d_%H%M')
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return os.path.join(API_CACHE_PATH, endpoint, str(account), f"{window}_{digest}.parquet")
+
+
+def _pyarrow():
+    '''pyarrow или None (кэш отключается с предупреждением в лог).'''
+    global _warned
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        if not _warned:
+            logging.warning("pyarrow не установлен - кэш ответов API отключён")
+            _warned = True
+        return None
+
+
+def _from_table(table):
+    if (table.schema.metadata or {}).get(_KIND_KEY) == b'frame':
+        return table.to_pandas()
+    return [json.loads(line) for line in table.column(_RECORD_COLUMN).to_pylist()]
+
+
+def _read(pa, path):
+    return _from_table(pa.parquet.read_table(path, memory_map=True))
+
+
+def _same(data, restored):
+    if isinstance(data, list):
+        return restored == data
+    # индекс не сохраняется (preserve_index=False)
+    return restored.equals(data.reset_index(drop=True)) and list(restored.columns) == list(data.columns)
+
+
+def _write(pa, path, data):
+    '''
+    Записывает снимок атомарно (через временный файл, который перед заменой читается и сравнивается с data).
+    False - данные не ложатся в Arrow или не восстанавливаются из снимка без изменений.
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        if isinstance(data, list):
+            lines = [json.dumps(record, ensure_ascii=False) for record in data]
+            table, kind = pa.table({_RECORD_COLUMN: pa.array(lines, pa.string())}), b'records'
+        else:
+            table, kind = pa.Table.from_pandas(data, preserve_index=False), b'frame'
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), _KIND_KEY: kind})
+        pa.parquet.write_table(table, tmp)
+        if not _same(data, _read(pa, tmp)):
+            raise ValueError('после чтения снимка данные отличаются')
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        logging.warning(f"Ответ не сохранён в кэш {path}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def evict(endpoint=None, keep_hours=API_CACHE_KEEP_HOURS):
+    '''Удаляет снимки (эндпоинта или все) старше keep_hours часов. Возвращает число удалённых файлов.'''
+    root = os.path.join(API_CACHE_PATH, endpoint) if endpoint else API_CACHE_PATH
+    deadline = time.time() - keep_hours * 3600
+    removed = 0
+    for folder, _, files in os.walk(root):
+        for file in files:
+            path = os.path.join(folder, file)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass    # удалил параллельный запуск
+    return removed
+
+
+
+
+# -------------------------------- КЭШ --------------------------------
+
+
+def fetch(endpoint, account, params, loader, ttl=API_CACHE_TTL):
+    '''
+    Данные из снимка текущего окна, если он есть, иначе loader() с сохранением результата.
+    loader должен возвращать DataFrame или список словарей.
+    params - всё, от чего зависит ответ, кроме токена (токен в ключ не попадает).
+    '''
+    pa = _pyarrow() if API_CACHE_ENABLED or API_CACHE_REPLAY else None
+    if pa is None:
+        return loader()
+
+    path = snapshot_path(endpoint, account, params, ttl)
+    if os.path.exists(path):
+        my_metrics.count('api_cache', endpoint=endpoint, result='replay' if API_CACHE_REPLAY else 'hit')
+        logging.info(f"{endpoint} {account}: данные из снимка {path}")
+        return _read(pa, path)
+    if API_CACHE_REPLAY:
+        raise FileNotFoundError(f"Нет снимка {endpoint} {account} для {API_CACHE_REPLAY}: {path}")
+
+    my_metrics.count('api_cache', endpoint=endpoint, result='miss')
+    data = loader()
+    if data is not None and len(data) and _write(pa, path, data):
+        logging.info(f"{endpoint} {account}: снимок сохранён в {path}")
+        evict(endpoint)
+    return data
+
+
+def cached(endpoint, key, ttl=API_CACHE_TTL):
+    '''
+    Декоратор для функций-загрузчиков: key(*args, **kwargs) -> (аккаунт, параметры) для ключа снимка.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            account, params = key(*args, **kwargs)
+            return fetch(endpoint, account, params, lambda: func(*args, **kwargs), ttl)
+        return wrapper
+    return decorator
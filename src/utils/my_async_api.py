@@ -0,0 +1,228 @@
+import copy
+import time
+import asyncio
+import logging
+import weakref
+import threading
+
+# my packages
+from .my_lazy import lazy_import
+from .my_metrics import count, host_of
+
+aiohttp = lazy_import('aiohttp')
+
+
+# -------------------------------- ЛИМИТЫ ЗАПРОСОВ --------------------------------
+
+
+class RateLimiter:
+    '''
+    Token bucket: не больше rate запросов за period секунд, допускается всплеск до burst запросов.
+    '''
+
+    def __init__(self, rate, period=60.0, burst=None):
+        self.rate = rate
+        self.period = period
+        self.capacity = burst or 1
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._mutex = threading.Lock()
+        self._locks = weakref.WeakKeyDictionary()   # цикл событий -> asyncio.Lock
+
+    async def acquire(self):
+        # лимитер живёт весь процесс: asyncio.run() каждый раз создаёт новый цикл событий, а задачи планировщика
+        # идут параллельно в своих потоках со своими циклами - очередь ожидания своя на цикл, токены общие
+        loop = asyncio.get_running_loop()
+        with self._mutex:
+            lock = self._locks.get(loop)
+            if lock is None:
+                lock = self._locks[loop] = asyncio.Lock()
+        async with lock:
+            while True:
+                with self._mutex:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate / self.period)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) * self.period / self.rate
+                count('rate_limit_wait_seconds', wait)
+                await asyncio.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key, rate, period=60.0, burst=None):
+    '''
+    Возвращает общий для процесса лимитер по ключу (например, (api, токен)),
+    чтобы все запросы с одним токеном делили один лимит.
+    '''
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(rate, period, burst)
+        return _limiters[key]
+
+
+
+
+# -------------------------------- ЗАПРОСЫ --------------------------------
+
+
+def _retry_after(response):
+    for header in ('X-Ratelimit-Retry', 'Retry-After'):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return None
+
+
+async def request_json(session, method, url, limiter=None, retries=5, base_delay=1, max_delay=60, **kwargs):
+    '''
+    Выполняет запрос и возвращает json ответа.
+    На 429 и 5xx и сетевых ошибках повторяет запрос с экспоненциальной задержкой
+    (или с задержкой из заголовка X-Ratelimit-Retry / Retry-After), остальные ошибки пробрасывает.
+    '''
+    for attempt in range(retries + 1):
+        if limiter:
+            await limiter.acquire()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                if response.status == 429 or response.status >= 500:
+                    delay = _retry_after(response) or min(base_delay * 2 ** attempt, max_delay)
+                    count('http_retries', host=host_of(url), status=response.status)
+                    logging.warning(f"{url}: HTTP {response.status}, попытка {attempt + 1}/{retries + 1}, повтор через {delay:.1f} сек.")
+                else:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+        except aiohttp.ClientResponseError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            delay = min(base_delay * 2 ** attempt, max_delay)
+            count('http_retries', host=host_of(url), status='network')
+            logging.warning(f"{url}: сетевая ошибка {e!r}, попытка {attempt + 1}/{retries + 1}, повтор через {delay:.1f} сек.")
+
+        if attempt < retries:
+            await asyncio.sleep(delay)
+
+    raise RuntimeError(f"Не удалось получить ответ {url} после {retries + 1} попыток")
+
+
+
+
+# -------------------------------- ПАГИНАЦИЯ --------------------------------
+
+
+class OffsetCursor:
+    '''
+    Пагинация limit/offset (или take/skip). Позиции следующих страниц известны заранее,
+    поэтому страницы можно запрашивать параллельно (prefetch).
+    '''
+    prefetchable = True
+
+    def __init__(self, limit, limit_key='limit', offset_key='offset', start=0, in_json=False):
+        self.limit = limit
+        self.limit_key = limit_key
+        self.offset_key = offset_key
+        self.initial = start
+        self.in_json = in_json
+
+    def apply(self, request, offset):
+        target = request.setdefault('json' if self.in_json else 'params', {})
+        target[self.limit_key] = self.limit
+        target[self.offset_key] = offset
+
+    def advance(self, offset):
+        return offset + self.limit
+
+    def next(self, offset, response, items):
+        return None if len(items) < self.limit else self.advance(offset)
+
+
+class KeyCursor:
+    '''
+    Пагинация по курсору из ответа (updatedAt/nmID, lastChangeDate, next и т.п.).
+
+    next_cursor(response, items) - значение курсора для следующей страницы (None - конец),
+    apply_cursor(request, cursor) - кладёт курсор в запрос ({'params': ..., 'json': ...}),
+    page_size - если страница короче, она последняя.
+    '''
+    prefetchable = False
+
+    def __init__(self, next_cursor, apply_cursor, initial=None, page_size=None):
+        self.next_cursor = next_cursor
+        self.apply_cursor = apply_cursor
+        self.initial = initial
+        self.page_size = page_size
+
+    def apply(self, request, cursor):
+        if cursor is not None:
+            self.apply_cursor(request, cursor)
+
+    def next(self, cursor, response, items):
+        if not items or (self.page_size and len(items) < self.page_size):
+            return None
+        next_cursor = self.next_cursor(response, items)
+        return None if next_cursor == cursor else next_cursor
+
+
+async def paginate(session, url, cursor, method='GET', extract=None, params=None, json=None, headers=None,
+                   limiter=None, prefetch=1, retries=5, delay=0):
+    '''
+    Асинхронный генератор страниц: отдаёт списки элементов по мере получения, не собирая всё в память.
+
+    cursor - стратегия пагинации (OffsetCursor, KeyCursor),
+    extract - функция для получения списка элементов из json ответа (по умолчанию сам ответ),
+    limiter - RateLimiter для запросов, delay - доп. пауза между страницами,
+    prefetch - сколько страниц запрашивать параллельно (только для стратегий с prefetchable).
+    '''
+    extract = extract or (lambda r: r)
+    base_request = {'params': params or {}, 'json': json}
+
+    async def fetch(position):
+        request = copy.deepcopy(base_request)
+        cursor.apply(request, position)
+        response = await request_json(session, method, url, limiter=limiter, retries=retries, headers=headers,
+                                      params=request['params'], json=request['json'])
+        return response, extract(response) or []
+
+    position = cursor.initial
+
+    if cursor.prefetchable and prefetch > 1:
+        while True:
+            positions = [position]
+            for _ in range(prefetch - 1):
+                positions.append(cursor.advance(positions[-1]))
+            pages = await asyncio.gather(*(fetch(p) for p in positions))
+            for p, (response, items) in zip(positions, pages):
+                if items:
+                    yield items
+                position = cursor.next(p, response, items)
+                if position is None:
+                    return
+            if delay:
+                await asyncio.sleep(delay)
+
+    # первая страница запрашивается всегда: у KeyCursor начальный курсор None - «с начала»
+    first = True
+    while first or position is not None:
+        first = False
+        response, items = await fetch(position)
+        if items:
+            yield items
+        position = cursor.next(position, response, items)
+        if position is not None and delay:
+            await asyncio.sleep(delay)
+
+
+async def collect_pages(pages):
+    '''
+    Собирает все элементы асинхронного генератора страниц в один список
+    (для мест, где действительно нужен полный список).
+    '''
+    return [item async for page in pages for item in page]
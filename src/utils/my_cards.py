@@ -0,0 +1,248 @@
+import os
+import copy
+import json
+import logging
+import asyncio
+import threading
+
+# my packages
+from .env_loader import *
+from .my_lazy import lazy_import
+from .my_api import iter_product_cards, get_product_by_nmid, clean_product_data_for_api, update_wb_product_cards_bulk
+from .my_general import clean_vendor_code
+from .utils import load_api_tokens
+
+aiohttp = lazy_import('aiohttp')
+
+CARDS_CACHE_PATH = os.getenv("CARDS_CACHE_PATH", "./data/cards_cache")
+
+# кэш в памяти процесса: {account: {'cursor': {...}, 'cards': {nmID: card}, 'vendor_codes': {vendorCode: nmID}}}
+_catalog = {}
+_catalog_lock = threading.Lock()
+
+
+# -------------------------------- ЛОКАЛЬНЫЙ КЭШ --------------------------------
+
+
+def _cache_file(account):
+    return os.path.join(CARDS_CACHE_PATH, f"{account.lower()}.json")
+
+
+def load_account_cards(account):
+    '''
+    Возвращает кэш карточек аккаунта (из памяти, если уже загружен, иначе с диска).
+    '''
+    with _catalog_lock:
+        if account in _catalog:
+            return _catalog[account]
+
+    cache = {'cursor': None, 'cards': {}}
+    path = _cache_file(account)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        cache['cursor'] = stored.get('cursor')
+        cache['cards'] = {int(nm_id): card for nm_id, card in stored.get('cards', {}).items()}
+    cache['vendor_codes'] = {card.get('vendorCode'): nm_id for nm_id, card in cache['cards'].items()}
+
+    with _catalog_lock:
+        return _catalog.setdefault(account, cache)
+
+
+def reset_catalog():
+    '''
+    Сбрасывает кэш карточек в памяти: следующий load_account_cards перечитает файл.
+    Вызывается планировщиком перед каждой задачей (файлы мог обновить другой процесс).
+    '''
+    with _catalog_lock:
+        _catalog.clear()
+
+
+def save_account_cards(account, cache):
+    '''
+    Сохраняет кэш карточек аккаунта на диск (через временный файл, чтобы не оставить битый json).
+    '''
+    os.makedirs(CARDS_CACHE_PATH, exist_ok=True)
+    path = _cache_file(account)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'cursor': cache['cursor'], 'cards': cache['cards']}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+
+
+# -------------------------------- СИНХРОНИЗАЦИЯ --------------------------------
+
+
+async def sync_account_cards_async(session, account, api_token, full=False):
+    '''
+    Обновляет кэш карточек одного аккаунта.
+    По умолчанию инкрементально: запрашивает только карточки с updatedAt после сохранённого курсора.
+    При full=True перечитывает каталог целиком.
+    Возвращает количество полученных (новых или изменённых) карточек.
+    '''
+    cache = load_account_cards(account)
+    cursor = None if full else cache['cursor']
+    cards = {} if full else dict(cache['cards'])
+
+    received = 0
+    async for page in iter_product_cards(session, api_token, cursor=cursor, ascending=True):
+        for card in page:
+            cards[card['nmID']] = card
+        cursor = {'updatedAt': page[-1]['updatedAt'], 'nmID': page[-1]['nmID']}
+        received += len(page)
+
+    with _catalog_lock:
+        cache['cards'] = cards
+        cache['cursor'] = cursor
+        cache['vendor_codes'] = {card.get('vendorCode'): nm_id for nm_id, card in cards.items()}
+
+    if received or full:
+        save_account_cards(account, cache)
+    logging.info(f"{account}: получено {received} карточек, в кэше {len(cards)}")
+    return received
+
+
+def sync_account_cards(account, api_token, full=False):
+    '''
+    Синхронная обёртка над sync_account_cards_async.
+    '''
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await sync_account_cards_async(session, account, api_token, full)
+
+    return asyncio.run(run())
+
+
+def sync_all_cards(tokens=None, full=False):
+    '''
+    Параллельно обновляет кэш карточек по всем аккаунтам.
+    Возвращает {account: кол-во полученных карточек}; для аккаунтов с ошибкой - None.
+    '''
+    if tokens is None:
+        tokens = load_api_tokens()
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(
+                *(sync_account_cards_async(session, account, api_token, full) for account, api_token in tokens.items()),
+                return_exceptions=True
+            )
+
+    result = {}
+    for account, res in zip(tokens, asyncio.run(run())):
+        if isinstance(res, Exception):
+            logging.error(f"Не удалось обновить карточки {account}: {res}")
+            res = None
+        result[account] = res
+    return result
+
+
+
+
+# -------------------------------- ПОЛУЧЕНИЕ КАРТОЧЕК --------------------------------
+
+
+def _find_in_cache(cache, sku):
+    if isinstance(sku, int) or str(sku).isdigit():
+        return cache['cards'].get(int(sku))
+
+    nm_id = cache['vendor_codes'].get(sku)
+    if nm_id is None:
+        # вилд может быть с суффиксом 'd' + номер (wild1335d1)
+        nm_id = next((n for vc, n in cache['vendor_codes'].items() if vc and clean_vendor_code(vc) == sku), None)
+    return cache['cards'].get(nm_id) if nm_id is not None else None
+
+
+def get_cached_card(sku, account, api_token=None):
+    '''
+    Возвращает карточку товара из локального кэша по артикулу (nmID) или вилду (vendorCode).
+    Если карточки нет и передан api_token - сначала инкрементально обновляет кэш аккаунта,
+    в крайнем случае запрашивает карточку напрямую из API.
+    '''
+    cache = load_account_cards(account)
+    card = _find_in_cache(cache, sku)
+    if card is not None or api_token is None:
+        return card
+
+    sync_account_cards(account, api_token)
+    card = _find_in_cache(cache, sku)
+    if card is not None:
+        return card
+
+    logging.warning(f"Карточка {sku} не найдена в кэше {account}, запрос в API")
+    cards = get_product_by_nmid(api_token, sku)
+    return cards[0] if cards else None
+
+
+def account_by_token(api_token):
+    '''
+    Кабинет, которому принадлежит токен (по файлу токенов), или None.
+    '''
+    return next((account for account, token in load_api_tokens().items() if token == api_token), None)
+
+
+def get_cached_cards(account):
+    '''
+    Возвращает список всех карточек аккаунта из кэша.
+    '''
+    return list(load_account_cards(account)['cards'].values())
+
+
+
+
+# -------------------------------- МАССОВОЕ ИЗМЕНЕНИЕ --------------------------------
+
+
+def apply_card_edit(card, edit):
+    '''
+    Применяет правку к очищенной карточке.
+    edit - функция card -> card или словарь полей; характеристики можно передать
+    как {'characteristics': {id: value}} - тогда они заменяются/добавляются по id.
+    '''
+    if callable(edit):
+        return edit(card)
+
+    for key, value in edit.items():
+        if key == 'characteristics' and isinstance(value, dict):
+            chars = {char['id']: char for char in card.get('characteristics', [])}
+            for char_id, char_value in value.items():
+                chars[int(char_id)] = {'id': int(char_id), 'value': char_value}
+            card['characteristics'] = list(chars.values())
+        else:
+            card[key] = value
+    return card
+
+
+def edit_product_cards(account, api_token, edits):
+    '''
+    Массово изменяет карточки одного аккаунта.
+    edits - {nmID: правка} (см. apply_card_edit).
+    Карточки берутся из кэша после инкрементальной синхронизации (без запроса на каждую карточку),
+    изменения отправляются пачками через update_wb_product_cards_bulk.
+    Возвращает {nmID: {'ok': bool, 'errors': [...]}}.
+    '''
+    sync_account_cards(account, api_token)
+    cache = load_account_cards(account)
+
+    cards_to_update = []
+    results = {}
+    for nm_id, edit in edits.items():
+        card = cache['cards'].get(int(nm_id))
+        if card is None:
+            results[int(nm_id)] = {'ok': False, 'errors': ['Карточка не найдена']}
+            continue
+        clean_card = clean_product_data_for_api(copy.deepcopy(card))
+        cards_to_update.append(apply_card_edit(clean_card, edit))
+
+    if cards_to_update:
+        bulk_results = update_wb_product_cards_bulk(api_token, cards_to_update)
+        for res in bulk_results.values():
+            results[res['nmID']] = {'ok': res['ok'], 'errors': res['errors']}
+
+    failed = [nm_id for nm_id, res in results.items() if not res['ok']]
+    logging.info(f"{account}: изменено {len(results) - len(failed)} из {len(results)} карточек")
+    if failed:
+        logging.warning(f"{account}: не удалось изменить карточки {failed}")
+    return results
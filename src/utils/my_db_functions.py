@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 from decimal import Decimal
 from datetime import datetime
 from psycopg2.extras import execute_batch
@@ -11,7 +10,9 @@ from .env_loader import *
 from .my_pandas import process_decimal
 from .my_general import process_decimal_in_dict
 from .utils import create_connection, read_sql_to_df
-from .clickhouse_utils import ClickHouseConnector
+from .my_lazy import lazy_import
+
+pd = lazy_import('pandas')
 
 
 # -------------------------------- CONNECTION, BASIC INFO --------------------------------
@@ -41,6 +42,7 @@ def create_clickhouse_connector():
     Установление соединения с БД Clickhouse
     '''
     # load_dotenv()
+    from .clickhouse_utils import ClickHouseConnector
     connector = ClickHouseConnector(
         host=os.getenv('CLICKHOUSE_HOST'),
         port=os.getenv('CLICKHOUSE_PORT'),
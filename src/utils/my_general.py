@@ -1,3 +1,5 @@
+import os
+import re
 import json
 from decimal import Decimal
 from collections import defaultdict
@@ -202,4 +204,20 @@ def clean_datetime_from_timezone(val):
 
 def date_from_now(days: int, fmt = '%Y-%m-%d'):
     dt = datetime.now().date() + timedelta(days=days)
-    return dt.strftime(fmt) if fmt else dt
\ No newline at end of file
+    return dt.strftime(fmt) if fmt else dt
+
+_WB_HOST_RE = re.compile(r'^https://([a-z0-9-]+)\.(?:wildberries|wb)\.ru')
+
+def wb_url(url):
+    """
+    URL метода WB API с учётом переменных окружения (для локальной заглушки API и бенчмарков):
+    WB_API_BASE_<СЕРВИС> (например, WB_API_BASE_STATISTICS для statistics-api, WB_API_BASE_CARD для card.wb.ru)
+    или общий WB_API_BASE заменяют https://<сервис>.wildberries.ru (.wb.ru), путь и параметры остаются прежними.
+    Без переменных возвращает url как есть.
+    """
+    match = _WB_HOST_RE.match(url)
+    if not match:
+        return url
+    service = match.group(1).replace('-api', '').replace('-', '_').upper()
+    base = os.getenv(f'WB_API_BASE_{service}') or os.getenv('WB_API_BASE')
+    return base.rstrip('/') + url[match.end():] if base else url
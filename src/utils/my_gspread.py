@@ -1,61 +1,256 @@
 import re
 import os
+import json
 import time
+import random
 import logging
-import gspread
-import requests
-import pandas as pd
+import asyncio
 from datetime import datetime
 
 # my packages
 from . import my_pandas
 from .my_general import find_duplicates
+from .my_async_api import OffsetCursor, paginate, collect_pages
+from .my_lazy import lazy_import
 from .env_loader import *
 
+aiohttp = lazy_import('aiohttp')
+gspread = lazy_import('gspread')
+pd = lazy_import('pandas')
+
 CREDS_PATH = os.getenv('CREDS_PATH')
+SPREADSHEET_IDS_PATH = os.getenv('SPREADSHEET_IDS_PATH', './data/spreadsheet_ids.json')
+
+# кэш на время процесса (в планировщике листы и таблицы - на время задачи, см. reset_caches):
+# клиенты по файлу ключа, таблицы по (ключ, название/ссылка), листы по (id таблицы, лист)
+_clients = {}
+_spreadsheets = {}
+_worksheets = {}
+_spreadsheet_ids = None
 
 # -------------------------------- ПОДКЛЮЧЕНИЕ К ТАБЛИЦАМ --------------------------------
 
 def init_client(creds_file_name = CREDS_PATH):
-    '''Инициализирует аккаунт для работы с Google Sheets'''
-    return gspread.service_account(filename=creds_file_name)
+    '''
+    Инициализирует аккаунт для работы с Google Sheets (один клиент на файл ключа за процесс).
+    Все запросы клиента идут через QuotaHTTPClient: общий для кронов бюджет квоты и повторы на 429/5xx.
+    '''
+    if creds_file_name not in _clients:
+        from .my_sheets_quota import QuotaHTTPClient
+        _clients[creds_file_name] = gspread.service_account(filename=creds_file_name, http_client=QuotaHTTPClient)
+    return _clients[creds_file_name]
 
-def get_table_by_url(table_url):
+def get_table_by_url(table_url, creds_file = CREDS_PATH):
     '''Получение таблицы из Google Sheets по ссылке'''
-    client = init_client()
-    return client.open_by_url(table_url)
+    key = (creds_file, table_url)
+    table = _spreadsheets.get(key)
+    if table is None:
+        table = _spreadsheets[key] = init_client(creds_file).open_by_url(table_url)
+    return table
 
 def get_table_by_id(client, table_url):
     '''Получение таблицы из Google Sheets по id'''
     return client.open_by_key(table_url)
 
+def _load_spreadsheet_ids():
+    global _spreadsheet_ids
+    if _spreadsheet_ids is None:
+        _spreadsheet_ids = {}
+        if os.path.exists(SPREADSHEET_IDS_PATH):
+            with open(SPREADSHEET_IDS_PATH, 'r', encoding='utf-8') as f:
+                _spreadsheet_ids = json.load(f)
+    return _spreadsheet_ids
+
+def _save_spreadsheet_id(title, spreadsheet_id):
+    ids = _load_spreadsheet_ids()
+    ids[title] = spreadsheet_id
+    os.makedirs(os.path.dirname(SPREADSHEET_IDS_PATH) or '.', exist_ok=True)
+    tmp_path = f"{SPREADSHEET_IDS_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(ids, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, SPREADSHEET_IDS_PATH)
+
+def open_spreadsheet(title, creds_file = CREDS_PATH):
+    '''
+    Открывает таблицу по названию.
+    Таблица кэшируется на время процесса, а её id сохраняется в SPREADSHEET_IDS_PATH,
+    чтобы следующие запуски открывали её через open_by_key без поиска по Drive.
+    '''
+    key = (creds_file, title)
+    table = _spreadsheets.get(key)
+    if table is not None:
+        return table
+
+    client = init_client(creds_file)
+    table = None
+    spreadsheet_id = _load_spreadsheet_ids().get(title)
+    if spreadsheet_id:
+        try:
+            table = client.open_by_key(spreadsheet_id)
+            if table.title != title:    # таблицу переименовали - ищем заново
+                table = None
+        except gspread.exceptions.SpreadsheetNotFound:
+            table = None
+
+    if table is None:
+        table = client.open(title)
+        _save_spreadsheet_id(title, table.id)
+
+    _spreadsheets[key] = table
+    return table
+
+def get_worksheet(table, sheet_name):
+    '''Лист таблицы (кэшируется на время процесса)'''
+    key = (table.id, sheet_name)
+    sheet = _worksheets.get(key)
+    if sheet is None:
+        sheet = _worksheets[key] = table.worksheet(sheet_name)
+    return sheet
+
 def connect_to_local_sheet(table_url = None, sheet_name = None, table = None):
     if not table:
         table = get_table_by_url(table_url)
-    sh = table.worksheet(sheet_name)
-    return sh
+    return get_worksheet(table, sheet_name)
 
 def connect_to_remote_sheet(table_name, sheet_name, creds_file = CREDS_PATH):
     '''Подключение к таблице и листу'''    
     table = safe_open_spreadsheet(table_name, creds_file = creds_file)
-    return table.worksheet(sheet_name)
+    return get_worksheet(table, sheet_name)
 
 def safe_open_spreadsheet(title, retries=5, delay=5, creds_file = CREDS_PATH):
     """
-    Пытается открыть таблицу с повторными попытками при APIError 503.
+    Открывает таблицу. Повторы при 429/5xx выполняет QuotaHTTPClient клиента,
+    retries и delay оставлены для совместимости со старыми вызовами.
     """
-    gc = gspread.service_account(filename = creds_file)
-    for attempt in range(1, retries + 1):
-        # print(f"Попытка {attempt} открыть доступ к таблице")
-        try:
-            return gc.open(title)
-        except gspread.exceptions.APIError as e:
-            if "503" in str(e):
-                print(f"[Попытка {attempt}/{retries}] APIError 503 — повтор через {delay} сек.")
-                time.sleep(delay)
-            else:
-                raise  # если ошибка не 503 — пробрасываем дальше
-    raise RuntimeError(f"Не удалось открыть таблицу '{title}' после {retries} попыток.")
+    return open_spreadsheet(title, creds_file = creds_file)
+
+def reset_caches():
+    '''
+    Сбрасывает кэши таблиц, листов, снимков UNIT и заголовков; клиенты остаются.
+    Вызывается планировщиком перед каждой задачей: данные и структура таблиц между задачами могли измениться.
+    '''
+    global _spreadsheet_ids, _formula_free_ranges
+    _spreadsheets.clear()
+    _worksheets.clear()
+    _snapshots.clear()
+    _header_indexes.clear()
+    _spreadsheet_ids = None
+    _formula_free_ranges = None
+
+
+
+
+
+
+# -------------------------------- СНИМОК UNIT --------------------------------
+
+
+UNIT_TABLE = os.getenv('UNIT_TABLE', 'UNIT 2.0 (tested)')
+UNIT_MAIN_SHEET = os.getenv('UNIT_MAIN_SHEET', 'MAIN (tested)')
+UNIT_SOPOST_SHEET = 'Сопост'
+
+# {(таблица, листы): {лист: SheetSnapshot}} - живёт весь процесс
+_snapshots = {}
+
+
+class SheetSnapshot:
+    '''
+    Значения листа, загруженные одним запросом и хранящиеся в памяти (DataFrame строк,
+    колонки пронумерованы как в таблице, с 1).
+    Повторяет методы чтения worksheet (row_values, col_values, row_count), поэтому
+    его можно передавать в функции, которые ждут лист, плюс даёт доступ к колонкам по заголовку.
+    '''
+
+    def __init__(self, title, values, header_row=1):
+        width = max((len(row) for row in values), default=0)
+        self.title = title
+        self.header_row = header_row
+        self.frame = pd.DataFrame([row + [''] * (width - len(row)) for row in values],
+                                  columns=range(1, width + 1), dtype=str)
+        self.row_count = len(self.frame)
+        self.headers = self.row_values(header_row)
+
+    @staticmethod
+    def _trim(values):
+        # как и API, не возвращаем пустые ячейки в конце
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def row_values(self, row, **kwargs):
+        if row > self.row_count:
+            return []
+        return self._trim(self.frame.iloc[row - 1].tolist())
+
+    def col_values(self, col, **kwargs):
+        if col not in self.frame.columns:
+            return []
+        return self._trim(self.frame[col].tolist())
+
+    def col_num(self, name, offset=0):
+        '''Номер колонки (с 1) по названию заголовка'''
+        if name not in self.headers:
+            raise KeyError(f"Колонка '{name}' не найдена на листе '{self.title}'")
+        return self.headers.index(name) + 1 + offset
+
+    def column(self, name, offset=0):
+        '''Значения колонки под заголовком (как col_values_by_name(...)[header_row:])'''
+        return self.col_values(self.col_num(name, offset))[self.header_row:]
+
+    def rows(self, name, number_of_columns=1):
+        '''
+        Строки под заголовком из number_of_columns колонок, начиная с колонки name
+        (аналог get_values(define_range(...))), без пустых строк в конце.
+        '''
+        start = self.col_num(name)
+        block = self.frame.loc[self.header_row:, start:start + number_of_columns - 1]
+        block = block.reindex(columns=range(start, start + number_of_columns), fill_value='')
+        rows = block.values.tolist()
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def to_frame(self, columns, converters=None):
+        '''
+        DataFrame из колонок с заголовками columns (строки под заголовком, без пустых строк в конце).
+        columns - список названий или {название в таблице: новое название},
+        converters - {новое название: функция} для приведения типов.
+        '''
+        if not isinstance(columns, dict):
+            columns = {name: name for name in columns}
+        nums = [self.col_num(name) for name in columns]
+        df = self.frame.loc[self.header_row:, nums]
+        filled = (df != '').any(axis=1)
+        df = df.loc[:filled[filled].index.max()] if filled.any() else df.iloc[0:0]
+        df = df.reset_index(drop=True)
+        df.columns = list(columns.values())
+        for name, func in (converters or {}).items():
+            df[name] = df[name].map(func)
+        return df
+
+
+def load_unit_snapshot(sheets=(UNIT_MAIN_SHEET, UNIT_SOPOST_SHEET), table_name=UNIT_TABLE, refresh=False):
+    '''
+    Загружает листы таблицы UNIT одним запросом values_batch_get и кэширует их на время процесса.
+    Возвращает {название листа: SheetSnapshot}.
+    refresh=True - перечитать таблицу (например, после записи в неё).
+    '''
+    key = (table_name, tuple(sheets))
+    snapshot = None if refresh else _snapshots.get(key)
+    if snapshot is None:
+        table = safe_open_spreadsheet(table_name)
+        response = table.values_batch_get([f"'{sheet}'" for sheet in sheets])
+        value_ranges = response.get('valueRanges', [])
+        snapshot = _snapshots[key] = {sheet: SheetSnapshot(sheet, vr.get('values', [])) for sheet, vr in zip(sheets, value_ranges)}
+        logging.info(f"Загружен снимок {table_name}: " + ', '.join(f"{s.title} ({s.row_count} строк)" for s in snapshot.values()))
+    return snapshot
+
+
+def unit_sheet(sheet_name=UNIT_MAIN_SHEET):
+    '''
+    Снимок листа UNIT (MAIN или Сопост) из кэша процесса.
+    '''
+    return load_unit_snapshot()[sheet_name]
 
 
 
@@ -73,7 +268,7 @@ def get_articles_and_clients_df(wild = False):
 
     # в перспективе можно поставить цикл, чтобы парсил любые колонки
     try: 
-        sh = connect_to_remote_sheet('UNIT 2.0 (tested)', 'MAIN (tested)')
+        sh = unit_sheet(UNIT_MAIN_SHEET)
             
         if wild:
             df = pd.DataFrame({'Артикул':[int(x) for x in sh.col_values(1)[1:]], 'ЛК':[x.capitalize() for x in sh.col_values(2)[1:]], 'wild':sh.col_values(3)[1:]})
@@ -98,7 +293,7 @@ def get_articles_and_clients_dict(filter_articles=None, sh = None):
     '''
     try:
         if not sh:
-            sh = connect_to_remote_sheet('UNIT 2.0 (tested)', 'MAIN (tested)')
+            sh = unit_sheet(UNIT_MAIN_SHEET)
         articles = [int(x) for x in sh.col_values(1)[1:]] 
         clients = sh.col_values(2)[1:]
         clients = [client.capitalize() for client in clients]                   
@@ -142,32 +337,30 @@ def get_articles_autopilot(sh = None, remote = False):
 
 
 
-def get_data_offset(url, headers, extract_callback=lambda x: x, limit = 1000, return_keys = None, other_params=None):
+def get_data_offset(url, headers, extract_callback=lambda x: x, limit = 1000, return_keys = None, other_params=None, prefetch = 1, limiter = None):
     '''
     Функция, позволяющая получать все данные по одному клиенту, если стоит лимит на кол-во получаемых записей.
     
     Параметры:
     extract_callback - lambda-функция для получения чистого ответа при вложенности json.
     return_key - если указан, возвращает только значения этого ключа из каждого элемента
+    prefetch - сколько страниц запрашивать параллельно (если API позволяет)
+    limiter - my_async_api.RateLimiter для запросов
     '''
 
-    all_data = []
-    offset = 0
+    # как и раньше, limit/offset из other_params важнее аргументов функции
+    params = dict(other_params or {})
+    limit = int(params.pop('limit', limit))
+    start = int(params.pop('offset', 0))
 
-    while True:
-        params = {
-            'limit': limit,
-            'offset': offset}
-        if other_params:
-            params.update(other_params)
+    async def load():
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            pages = paginate(session, url, OffsetCursor(limit, start=start), params=params, headers=headers,
+                             extract=extract_callback, prefetch=prefetch, limiter=limiter)
+            return await collect_pages(pages)
 
-        response = requests.get(url, params=params, headers=headers, timeout=30).json()
-        batch = extract_callback(response)
-        all_data.extend(batch)
-
-        if len(batch) < limit:
-            break
-        offset += limit
+    all_data = asyncio.run(load())
 
     if return_keys:
         if isinstance(return_keys, str):
@@ -183,9 +376,10 @@ def get_purchase_price(sh = None):
     Возвращает словарь с ценами закупки в формате {wild : цена закупки}
     '''
     if not sh:
-        sh = connect_to_remote_sheet('UNIT 2.0 (tested)', 'Сопост')
+        rows = unit_sheet(UNIT_SOPOST_SHEET).rows('wild', number_of_columns = 2)
+        return {row[0]: clean_number(row[1]) for row in rows}
     article_cost_range = define_range(target_header_name = 'wild',
-                                      all_headers = list(sh.row_values(1)),
+                                      all_headers = get_headers(sh),
                                       number_of_columns = 2,
                                       values_first_row = 2,
                                       sh_len = sh.row_count)
@@ -198,7 +392,7 @@ def get_skus_unit(unit_sh = None):
     Возвращает отсортированный и отформатированный список артикулов из UNIT
     '''
     if not unit_sh:
-        unit_sh = connect_to_remote_sheet('UNIT 2.0 (tested)', 'MAIN (tested)')
+        unit_sh = unit_sheet(UNIT_MAIN_SHEET)
     
     unit_skus = unit_sh.col_values(1)[1:]
     unit_skus = [int(i) for i in unit_skus]
@@ -218,10 +412,9 @@ def find_duplicates_gs(sh, col_num=None, col_name=None, col_letter=None, col_val
             if col_letter:
                 col_num = col_letter_to_num(col_letter)
             else:
-                header = sh.row_values(header_row_num)
-                if col_name not in header:
+                col_num = header_col_num(sh, col_name, header_row_num)
+                if col_num is None:
                     raise ValueError(f"Столбец '{col_name}' не найден в строке {header_row_num}")
-                col_num = header.index(col_name) + 1
         col_values = sh.col_values(col_num)
 
     return find_duplicates(col_values, start_row=start_row, return_all=return_all)
@@ -238,7 +431,7 @@ def get_col_index(sh, col_name, header_row=1, zero_based=False, header=None):
     :raises ValueError: если столбец не найден
     """
     if not header:
-        header = sh.row_values(header_row)
+        header = get_headers(sh, header_row)
     try:
         index = header.index(col_name)
         return index if zero_based else index + 1
@@ -252,16 +445,131 @@ def get_col_index(sh, col_name, header_row=1, zero_based=False, header=None):
 # -------------------------------- ДОБАВЛЕНИЕ ДАННЫХ  --------------------------------
 
 
-def add_data_to_range(sheet, data, sh_range, clean_range = True, headers = False):
+FORMULA_FREE_RANGES_PATH = os.getenv('FORMULA_FREE_RANGES_PATH', './data/formula_free_ranges.json')
+# через сколько часов колонки без формул проверяются снова (в них могли добавить формулы)
+FORMULA_FREE_RECHECK_HOURS = float(os.getenv('FORMULA_FREE_RECHECK_HOURS', 24))
+_formula_free_ranges = None     # {ключ колонок: время проверки, timestamp}
+
+
+def _columns(sh_range):
+    # 'A2:F1500' -> 'A:F': номера строк (длина данных) меняются от запуска к запуску
+    return re.sub(r'[0-9]+', '', sh_range)
+
+
+def _range_key(sheet, sh_range):
+    return f"{sheet.spreadsheet_id}/{sheet.id}/{_columns(sh_range)}"
+
+
+def _load_formula_free_ranges():
+    global _formula_free_ranges
+    if _formula_free_ranges is None:
+        _formula_free_ranges = {}
+        if os.path.exists(FORMULA_FREE_RANGES_PATH):
+            with open(FORMULA_FREE_RANGES_PATH, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            # старый формат - список ключей с номерами строк: колонки без времени проверки, проверяются снова
+            if isinstance(stored, list):
+                stored = {key: 0 for key in stored}
+            for key, checked_at in stored.items():
+                sheet_key, sh_range = key.rsplit('/', 1)
+                _formula_free_ranges[f"{sheet_key}/{_columns(sh_range)}"] = checked_at
+    return _formula_free_ranges
+
+
+def is_formula_free(sheet, sh_range):
+    '''Колонки диапазона проверялись не раньше FORMULA_FREE_RECHECK_HOURS назад, и формул в них не было'''
+    checked_at = _load_formula_free_ranges().get(_range_key(sheet, sh_range))
+    return checked_at is not None and time.time() - checked_at < FORMULA_FREE_RECHECK_HOURS * 3600
+
+
+def mark_formula_free(sheet, sh_range, formula_free = True):
+    '''Запоминает (на диске), что в колонках диапазона нет формул - бэкап перед записью им не нужен'''
+    ranges = _load_formula_free_ranges()
+    key = _range_key(sheet, sh_range)
+    if formula_free:
+        ranges[key] = int(time.time())
+    else:
+        ranges.pop(key, None)
+    os.makedirs(os.path.dirname(FORMULA_FREE_RANGES_PATH) or '.', exist_ok=True)
+    tmp_path = f"{FORMULA_FREE_RANGES_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(ranges.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, FORMULA_FREE_RANGES_PATH)
+
+
+def _has_formulas(values):
+    return any(isinstance(v, str) and v.startswith('=') for row in values for v in row)
+
+
+def create_sheet_backup(sheet):
+    '''
+    Делает скрытую копию листа на стороне Google (один запрос batch_update) и возвращает её id.
+    Данные при этом не читаются.
+    '''
+    backup_id = random.randint(10**8, 2**31 - 1)
+    sheet.spreadsheet.batch_update({'requests': [
+        {'duplicateSheet': {'sourceSheetId': sheet.id,
+                            'newSheetId': backup_id,
+                            'newSheetName': f'_backup_{backup_id}'}},
+        {'updateSheetProperties': {'properties': {'sheetId': backup_id, 'hidden': True},
+                                   'fields': 'hidden'}},
+    ]})
+    return backup_id
+
+
+def restore_sheet_backup(sheet, backup_id, sh_range = None):
+    '''
+    Возвращает данные из копии листа (весь лист или диапазон sh_range) и удаляет копию.
+    '''
+    source = gspread.utils.a1_range_to_grid_range(sh_range, backup_id) if sh_range else {'sheetId': backup_id}
+    destination = gspread.utils.a1_range_to_grid_range(sh_range, sheet.id) if sh_range else {'sheetId': sheet.id}
+    sheet.spreadsheet.batch_update({'requests': [
+        {'copyPaste': {'source': source, 'destination': destination, 'pasteType': 'PASTE_NORMAL'}},
+        {'deleteSheet': {'sheetId': backup_id}},
+    ]})
+
+
+def drop_sheet_backup(sheet, backup_id):
+    '''Удаляет копию листа'''
+    sheet.spreadsheet.batch_update({'requests': [{'deleteSheet': {'sheetId': backup_id}}]})
+
+
+def _prepare_backup(sheet, sh_range, backup):
+    # возвращает (данные для отката, id копии листа)
+    if backup == 'sheet':
+        return None, create_sheet_backup(sheet)
+    if backup == 'auto' and is_formula_free(sheet, sh_range):
+        # колонки без формул задача целиком заполняет своими данными - при ошибке их выгрузит следующий запуск
+        return None, None
+    if backup in ('read', 'auto'):
+        backup_data = sheet.get(sh_range, value_render_option="FORMULA")
+        if backup == 'auto':
+            if not _has_formulas(backup_data):
+                mark_formula_free(sheet, sh_range)
+            elif _range_key(sheet, sh_range) in _load_formula_free_ranges():
+                # при повторной проверке в колонках нашлись формулы
+                mark_formula_free(sheet, sh_range, formula_free=False)
+        return backup_data, None
+    return None, None
+
+
+def add_data_to_range(sheet, data, sh_range, clean_range = True, headers = False, backup = 'auto'):
     '''
     Обновляет данные в заданном диапазоне.
     Тип data: df, list
+
+    backup - как сохранить прежние данные для отката при ошибке:
+        'auto' - читает диапазон с формулами; если формул в нём нет, колонки диапазона запоминаются
+                 и следующие FORMULA_FREE_RECHECK_HOURS часов бэкап не делается, затем проверяются снова,
+        'read' - всегда читает диапазон с формулами,
+        'sheet' - скрытая копия листа на стороне Google вместо чтения,
+        None - без отката.
     '''
 
     # добавить проверку на размер данных?
     
     # сохраняем исходные данные
-    backup_data = sheet.get(sh_range, value_render_option="FORMULA")
+    backup_data, backup_sheet_id = _prepare_backup(sheet, sh_range, backup)
     
     try:
         
@@ -284,24 +592,42 @@ def add_data_to_range(sheet, data, sh_range, clean_range = True, headers = False
         sheet.update(data_to_insert, sh_range)
     
     except Exception as e:
-        sheet.batch_clear([sh_range])
-        sheet.update(backup_data, sh_range,  value_input_option="USER_ENTERED")
+        if backup_sheet_id is not None:
+            # если откат не удастся, копия листа останется для ручного восстановления
+            backup_id, backup_sheet_id = backup_sheet_id, None
+            restore_sheet_backup(sheet, backup_id, sh_range)
+        elif backup_data is not None:
+            sheet.batch_clear([sh_range])
+            sheet.update(backup_data, sh_range,  value_input_option="USER_ENTERED")
+        else:
+            print(f'Ошибка при работе с Google Sheets, бэкап диапазона {sh_range} не делался. \n{e}')
+            raise
         print(f'Ошибка при работе с Google Sheets. Прежние данные восстановлены. \n{e}')
         raise
 
+    finally:
+        if backup_sheet_id is not None:
+            drop_sheet_backup(sheet, backup_sheet_id)
+
 
 
-def add_data_to_google_sheet(sheet, data, take_headers_from_google_sheet = True):
+def add_data_to_google_sheet(sheet, data, take_headers_from_google_sheet = True, backup = 'sheet'):
     '''
-    Обновляет данные во всей таблице
+    Обновляет данные во всей таблице.
+    backup='sheet' - перед записью делается скрытая копия листа на стороне Google
+    (вместо чтения всего листа), 'read' - чтение всего листа с формулами, None - без отката.
     '''
+    backup_data, backup_sheet_id = None, None
     try: 
         # сохраняем исходные данные
-        backup_data = sheet.get_all_values(value_render_option="FORMULA")
+        if backup == 'sheet':
+            backup_sheet_id = create_sheet_backup(sheet)
+        elif backup:
+            backup_data = sheet.get_all_values(value_render_option="FORMULA")
 
         if take_headers_from_google_sheet == True:
             # берём названия колонок
-            headers = sheet.row_values(row = 1)
+            headers = get_headers(sheet, 1)
         else: 
             headers = list(data.columns)
 
@@ -312,14 +638,27 @@ def add_data_to_google_sheet(sheet, data, take_headers_from_google_sheet = True)
         data = my_pandas.process_decimal(data)
         data_to_insert = data.values.tolist()
         sheet.update([headers], 'A1')
+        invalidate_headers(sheet)
         sheet.update(data_to_insert, 'A2')
     
     except Exception as e:
-        sheet.clear()
-        sheet.update(backup_data, 'A1',  value_input_option="USER_ENTERED")
+        if backup_sheet_id is not None:
+            # если откат не удастся, копия листа останется для ручного восстановления
+            backup_id, backup_sheet_id = backup_sheet_id, None
+            restore_sheet_backup(sheet, backup_id)
+        elif backup_data is not None:
+            sheet.clear()
+            sheet.update(backup_data, 'A1',  value_input_option="USER_ENTERED")
+        else:
+            raise
+        invalidate_headers(sheet)
         print(f'Ошибка при работе с Google Sheets. Прежние данные восстановлены. \n{e}')
         raise
 
+    finally:
+        if backup_sheet_id is not None:
+            drop_sheet_backup(sheet, backup_sheet_id)
+
 
 
 
@@ -535,6 +874,69 @@ def remove_duplicates_from_col(sh, col_num=None, col_name=None, col_letter=None,
 
 
 
+# -------------------------------- ЗАГОЛОВКИ --------------------------------
+
+
+# {(id таблицы, id листа, строка заголовков): {'headers': [...], 'index': {название: номер колонки}}}
+_header_indexes = {}
+
+
+def _sheet_key(sh, header_row):
+    spreadsheet_id = getattr(sh, 'spreadsheet_id', None) or getattr(getattr(sh, 'spreadsheet', None), 'id', None)
+    return (spreadsheet_id, getattr(sh, 'id', id(sh)), header_row)
+
+
+def get_header_index(sh, header_row = 1, refresh = False):
+    '''
+    Индекс заголовков листа: строка заголовков читается один раз за процесс,
+    дальше название колонки разрешается в номер без запросов к API.
+    Перечитывается при refresh=True; после изменения колонок листа нужен invalidate_headers(sh)
+    (планировщик сбрасывает кэш перед каждой задачей).
+    '''
+    key = _sheet_key(sh, header_row)
+    entry = _header_indexes.get(key)
+    if refresh or entry is None:
+        headers = sh.row_values(header_row)
+        index = {}
+        for i, name in enumerate(headers):
+            index.setdefault(name, i + 1)   # как list.index - первая колонка с таким названием
+        entry = {'headers': headers, 'index': index}
+        _header_indexes[key] = entry
+    return entry
+
+
+def get_headers(sh, header_row = 1, refresh = False):
+    '''Строка заголовков листа из кэша (см. get_header_index)'''
+    return list(get_header_index(sh, header_row, refresh)['headers'])
+
+
+def header_col_num(sh, col_name, header_row = 1):
+    '''Номер колонки (с 1) по названию или None, если колонки нет'''
+    return get_header_index(sh, header_row)['index'].get(col_name)
+
+
+def header_col_letter(sh, col_name, header_row = 1):
+    '''Буква колонки по названию или None, если колонки нет'''
+    col_num = header_col_num(sh, col_name, header_row)
+    return column_number_to_letter(col_num - 1) if col_num else None
+
+
+def invalidate_headers(sh = None):
+    '''
+    Сбрасывает кэш заголовков листа (или всех листов, если sh не передан).
+    Нужно вызывать после переименования/вставки/удаления колонок.
+    '''
+    if sh is None:
+        _header_indexes.clear()
+        return
+    sheet_key = _sheet_key(sh, None)[:2]
+    for key in [k for k in list(_header_indexes) if k[:2] == sheet_key]:
+        _header_indexes.pop(key, None)
+
+
+
+
+
 # -------------------------------- ДИАПАЗОНЫ: ПОИСК, КОНВЕРТИРОВАНИЕ --------------------------------
 
 
@@ -628,7 +1030,7 @@ def find_gscol_num_by_name(col_name, sh, headers_col = 1, headers = None, **kwar
     int - номер колонки
     '''
     if not headers:
-        headers = sh.row_values(headers_col, **kwargs)
+        headers = sh.row_values(headers_col, **kwargs) if kwargs else get_headers(sh, headers_col)
     if col_name in headers:
         column_num = headers.index(col_name) + 1
         return column_num
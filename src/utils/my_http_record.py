@@ -0,0 +1,360 @@
+'''
+Запись и воспроизведение HTTP-ответов (requests и aiohttp) для повторного запуска скрипта без обращения к API.
+
+    HTTP_RECORD=1 python main/autopilot_hourly.py
+        -> HTTP_CASSETTES_PATH/autopilot_hourly_<время>.jsonl.gz
+    HTTP_REPLAY=data/cassettes/autopilot_hourly_20261019_060500.jsonl.gz python main/autopilot_hourly.py
+
+Подключается к my_metrics.start_job() (on_start), то есть во всех скриптах src/main: перехватываются requests.Session.send
+(get_json/post_json, requests.get/post в загрузчиках) и aiohttp.ClientSession._request (request_json, paginate).
+Кассета - gzip, по JSON-строке на запрос: метод, адрес, параметры, хэш тела запроса и ответ
+(статус, заголовки, тело). Заголовки запроса (токены) не пишутся. Ответы 429 и 5xx не пишутся -
+при воспроизведении сразу отдаётся итоговый ответ, без повторов и ожиданий. Ответы сервисов авторизации
+(AUTH_HOSTS: access_token Google для gspread) не пишутся никогда; при воспроизведении на них отдаётся
+фиктивный токен, так что кассета воспроизводится без ключей и без сети.
+
+При воспроизведении ответ ищется по методу, адресу, параметрам и телу запроса (одинаковые запросы
+получают записанные ответы по очереди); если запрос изменился (например, даты в параметрах при повторе
+на следующий день) - берётся следующий неиспользованный ответ того же метода и адреса, с предупреждением в лог.
+Лимитеры my_async_api при воспроизведении не ждут. Запрос без записанного ответа - ConnectionError.
+Google Sheets (gspread) тоже ходит через requests, поэтому при воспроизведении запись в таблицы не выполняется.
+Соединения с Postgres при воспроизведении открываются только на чтение (PGOPTIONS default_transaction_read_only):
+первая запись в БД завершится ошибкой, а не изменит данные. Писать в БД разрешает HTTP_REPLAY_DB_WRITE=1 -
+только вместе с явно заданной небоевой базой (HOST_2/NAME_2/..., как в bench.autopilot_bench run --replay FILE,
+где кассеты служат данными для бенчмарков разбора и записи в БД).
+'''
+import os
+import json
+import gzip
+import base64
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl
+
+# my packages
+from . import my_metrics
+from .my_lazy import when_imported
+from .env_loader import *
+
+HTTP_RECORD = os.getenv('HTTP_RECORD', '0') == '1'
+HTTP_REPLAY = os.getenv('HTTP_REPLAY')
+HTTP_CASSETTES_PATH = os.getenv('HTTP_CASSETTES_PATH', './data/cassettes')
+HTTP_REPLAY_DB_WRITE = os.getenv('HTTP_REPLAY_DB_WRITE', '0') == '1'
+
+# ответы с токенами доступа: не пишутся в кассету, при воспроизведении - фиктивный токен
+AUTH_HOSTS = ('oauth2.googleapis.com', 'accounts.google.com')
+_AUTH_ENTRY = {
+    'status': 200, 'reason': 'OK', 'headers': {'Content-Type': 'application/json'},
+    'content': json.dumps({'access_token': 'replay', 'expires_in': 3600, 'token_type': 'Bearer'}).encode('utf-8'),
+}
+_READ_ONLY_OPTION = '-c default_transaction_read_only=on'
+
+_lock = threading.Lock()
+_recorder = None
+_player = None
+_hooked = False
+_pgoptions = None   # PGOPTIONS до воспроизведения
+
+
+# -------------------------------- КАССЕТА --------------------------------
+
+
+def _request_key(method, url, params=None, body=None):
+    '''(метод, адрес без query, параметры, хэш тела): параметры из адреса и params, отсортированные.'''
+    parts = urlsplit(str(url))
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(str(k), str(v)) for k, v in (params.items() if isinstance(params, dict) else params)]
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(body).hexdigest()[:16] if body else None
+    address = parts._replace(query='', fragment='').geturl()
+    return method.upper(), address, json.dumps(sorted(query), ensure_ascii=False), digest
+
+
+def _is_auth(address):
+    return urlsplit(address).hostname in AUTH_HOSTS
+
+
+def _should_record(status):
+    return status != 429 and status < 500
+
+
+class CassetteRecorder:
+    '''Дописывает пары запрос/ответ в gzip-файл (потокобезопасно).'''
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, key, status, reason, headers, content):
+        method, url, query, digest = key
+        if _is_auth(url):
+            return
+        entry = {
+            'method': method, 'url': url, 'query': query, 'body_sha1': digest,
+            'status': status, 'reason': reason,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in ('set-cookie', 'content-encoding', 'transfer-encoding')},
+        }
+        try:
+            entry['body'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_b64'] = base64.b64encode(content).decode('ascii')
+        line = json.dumps(entry, ensure_ascii=False)
+        with _lock:
+            self._file.write(line + '\n')
+            self.count += 1
+
+    def close(self):
+        with _lock:
+            self._file.close()
+
+
+class CassettePlayer:
+    '''Отдаёт записанные ответы: сначала по точному ключу запроса, затем по методу и адресу.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self._exact = defaultdict(deque)
+        self._loose = defaultdict(deque)
+        self._used = set()
+        for i, line in enumerate(self._lines(path)):
+            entry = json.loads(line)
+            entry['content'] = (base64.b64decode(entry['body_b64']) if 'body_b64' in entry
+                                else entry['body'].encode('utf-8'))
+            self.entries.append(entry)
+            key = (entry['method'], entry['url'], entry['query'], entry['body_sha1'])
+            self._exact[key].append(i)
+            self._loose[key[:2]].append(i)
+
+    @staticmethod
+    def _lines(path):
+        # кассета упавшего процесса может быть не дописана - читаем до обрыва
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if line.endswith('\n'):
+                        yield line
+            except EOFError:
+                logging.warning(f"HTTP_REPLAY: кассета {path} оборвана, прочитаны целые записи")
+
+    def _pop(self, queue):
+        while queue:
+            i = queue.popleft()
+            if i not in self._used:
+                self._used.add(i)
+                return self.entries[i]
+        return None
+
+    def take(self, key):
+        if _is_auth(key[1]):
+            return _AUTH_ENTRY
+        with _lock:
+            entry = self._pop(self._exact[key])
+            if entry is None:
+                entry = self._pop(self._loose[key[:2]])
+                if entry is not None:
+                    logging.warning(f"HTTP_REPLAY: {key[0]} {key[1]} - параметры запроса не совпали с записью, взят следующий ответ")
+        if entry is None:
+            raise ConnectionError(f"HTTP_REPLAY: нет записанного ответа для {key[0]} {key[1]} {key[2]}")
+        return entry
+
+
+
+
+# -------------------------------- ПЕРЕХВАТ ЗАПРОСОВ --------------------------------
+
+
+def _patch_requests(requests):
+    send = requests.Session.send
+
+    def recorded_send(self, request, **kwargs):
+        if _player is None and _recorder is None:
+            return send(self, request, **kwargs)
+        key = _request_key(request.method, request.url, body=request.body)
+        if _player is not None:
+            entry = _player.take(key)
+            response = requests.Response()
+            response.status_code = entry['status']
+            response.reason = entry['reason']
+            response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+            response._content = entry['content']
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.elapsed = timedelta(0)
+            return response
+        response = send(self, request, **kwargs)
+        if _should_record(response.status_code):
+            _recorder.write(key, response.status_code, response.reason, response.headers, response.content)
+        return response
+
+    requests.Session.send = recorded_send
+
+
+class _ReplayResponse:
+    '''Записанный ответ с интерфейсом aiohttp.ClientResponse, который используют скрипты.'''
+
+    def __init__(self, aiohttp, method, url, entry):
+        from yarl import URL
+        from multidict import CIMultiDict, CIMultiDictProxy
+        self._aiohttp = aiohttp
+        self._body = entry['content']
+        self.method = method
+        self.url = self.real_url = URL(str(url))
+        self.status = entry['status']
+        self.reason = entry['reason']
+        self.headers = CIMultiDictProxy(CIMultiDict(entry['headers']))
+        self.content_type = self.headers.get('Content-Type', 'application/octet-stream').split(';')[0]
+        self.history = ()
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            info = self._aiohttp.RequestInfo(self.url, self.method, self.headers)
+            raise self._aiohttp.ClientResponseError(info, (), status=self.status, message=self.reason or '', headers=self.headers)
+
+    async def read(self):
+        return self._body
+
+    async def text(self, encoding=None, errors='strict'):
+        return self._body.decode(encoding or 'utf-8', errors)
+
+    async def json(self, *, encoding=None, loads=json.loads, content_type='application/json'):
+        text = self._body.decode(encoding or 'utf-8').strip()
+        return loads(text) if text else None
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_for_close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def _aiohttp_body(kwargs):
+    if kwargs.get('json') is not None:
+        return json.dumps(kwargs['json'], sort_keys=True, ensure_ascii=False)
+    data = kwargs.get('data')
+    return data if isinstance(data, (str, bytes)) else None
+
+
+def _patch_aiohttp(aiohttp):
+    _request = aiohttp.ClientSession._request
+
+    async def recorded_request(self, method, str_or_url, *args, **kwargs):
+        if _player is None and _recorder is None:
+            return await _request(self, method, str_or_url, *args, **kwargs)
+        key = _request_key(method, str_or_url, kwargs.get('params'), _aiohttp_body(kwargs))
+        if _player is not None:
+            return _ReplayResponse(aiohttp, method, str_or_url, _player.take(key))
+        response = await _request(self, method, str_or_url, *args, **kwargs)
+        if _should_record(response.status):
+            # тело читается один раз и остаётся в ответе для вызывающего кода
+            _recorder.write(key, response.status, response.reason, response.headers, await response.read())
+        return response
+
+    aiohttp.ClientSession._request = recorded_request
+
+
+def _read_only_postgres():
+    # libpq берёт PGOPTIONS при каждом новом соединении (psycopg2, sqlalchemy)
+    global _pgoptions
+    if _pgoptions is None:
+        _pgoptions = os.environ.get('PGOPTIONS', '')
+        os.environ['PGOPTIONS'] = f"{_pgoptions} {_READ_ONLY_OPTION}".strip()
+
+
+def _restore_postgres():
+    global _pgoptions
+    if _pgoptions is not None:
+        os.environ['PGOPTIONS'] = _pgoptions
+        _pgoptions = None
+
+
+def _no_wait_limiters():
+    from . import my_async_api
+
+    async def acquire(self):
+        pass
+
+    my_async_api.RateLimiter.acquire = acquire
+
+
+def _install_hooks():
+    global _hooked
+    if _hooked:
+        return
+    _hooked = True
+    for name, patch in (('requests', _patch_requests), ('aiohttp', _patch_aiohttp)):
+        try:
+            when_imported(name, patch)
+        except ImportError:
+            pass
+
+
+
+
+# -------------------------------- ЗАПУСК --------------------------------
+
+
+def start(job):
+    '''
+    Включает запись (HTTP_RECORD=1) или воспроизведение (HTTP_REPLAY=путь) для запуска job.
+    Возвращает функцию остановки (или None), которая возвращает путь к кассете.
+    '''
+    global _recorder, _player
+    if _recorder is not None or _player is not None:
+        return None
+    if HTTP_REPLAY:
+        _player = CassettePlayer(HTTP_REPLAY)
+        _no_wait_limiters()
+        if not HTTP_REPLAY_DB_WRITE:
+            _read_only_postgres()
+        logging.info(f"HTTP_REPLAY: ответы из {HTTP_REPLAY} ({len(_player.entries)} записей), "
+                     f"Postgres {'с записью' if HTTP_REPLAY_DB_WRITE else 'только чтение'}")
+    elif HTTP_RECORD:
+        path = os.path.join(HTTP_CASSETTES_PATH, f"{job}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+        _recorder = CassetteRecorder(path)
+        logging.info(f"HTTP_RECORD: запись ответов в {path}")
+    else:
+        return None
+    _install_hooks()
+    return stop
+
+
+def stop():
+    global _recorder, _player
+    recorder, player = _recorder, _player
+    _recorder = _player = None
+    if recorder is not None:
+        recorder.close()
+        logging.info(f"HTTP_RECORD: записано ответов {recorder.count} в {recorder.path}")
+        return recorder.path
+    if player is not None:
+        _restore_postgres()
+        unused = len(player.entries) - len(player._used)
+        if unused:
+            logging.warning(f"HTTP_REPLAY: не использовано записанных ответов: {unused}")
+        return player.path
+    return None
+
+
+my_metrics.on_start(start, 'http_cassette')
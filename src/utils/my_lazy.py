@@ -0,0 +1,70 @@
+'''
+Ленивый импорт тяжёлых зависимостей (pandas, gspread, aiohttp, requests ...):
+модуль загружается при первом обращении к его атрибуту, а не при импорте utils.
+
+    pd = lazy_import('pandas')
+    ...
+    df = pd.DataFrame(...)      # здесь pandas и загрузится
+
+Аннотации с такими модулями (df: pd.DataFrame) не должны вычисляться при импорте -
+в модулях с ними нужен from __future__ import annotations.
+Код, которому нужно доработать модуль после загрузки (патчи my_metrics), регистрируется через when_imported.
+Проверка времени импорта скриптов: python -m bench.import_budget.
+'''
+import sys
+import importlib
+import importlib.util
+
+_pending = {}   # ленивые модули, которые ещё не выполнялись: имя -> [when_imported hooks]
+
+
+class _HookedLoader:
+    '''Обёртка загрузчика: после выполнения модуля возвращает ему исходный загрузчик и вызывает hooks.'''
+
+    def __init__(self, loader, name):
+        self.loader = loader
+        self.name = name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.loader.exec_module(module)
+        module.__spec__.loader = module.__loader__ = self.loader
+        for hook in _pending.pop(self.name, ()):
+            hook(module)
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+def lazy_import(name):
+    '''
+    Возвращает модуль верхнего уровня name, который выполнится при первом обращении к атрибуту
+    (importlib.util.LazyLoader; для подмодулей find_spec всё равно загрузил бы пакет).
+    Уже загруженный модуль возвращается как есть; отсутствующий - ImportError сразу, как при обычном импорте.
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        return importlib.import_module(name)
+    _pending[name] = []
+    loader = importlib.util.LazyLoader(_HookedLoader(spec.loader, name))
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def when_imported(name, hook):
+    '''
+    Вызывает hook(module) сразу, если модуль уже загружен, иначе - при первом обращении к нему,
+    не загружая модуль раньше времени.
+    '''
+    lazy_import(name)
+    if name in _pending:
+        _pending[name].append(hook)
+    else:
+        hook(sys.modules[name])
@@ -0,0 +1,559 @@
+'''
+Инструментирование запусков скриптов: время этапов (span), счётчики и итог запуска.
+
+    from utils import my_metrics
+
+    @my_metrics.span('load_unit')
+    def load_unit(): ...
+
+    with my_metrics.span('push'):
+        ...
+
+    if __name__ == "__main__":
+        my_metrics.start_job()
+
+start_job() включает подсчёт HTTP-запросов (requests и aiohttp) по хостам и ошибкам логов,
+а при завершении процесса пишет итог запуска одной JSON-строкой в LOGS_PATH/job_runs.jsonl, в лог
+и в таблицу Postgres job_runs (JOB_RUNS_TO_DB=0 - без записи в БД, например локально). Счётчики Sheets, строк БД и повторов пишут сами утилиты
+(my_sheets_quota, my_async_api, курсор create_connection), без start_job они просто копятся в памяти.
+
+Учёт общий на процесс; планировщик выполняет задачи параллельно в своих потоках и вызывает isolate_run(),
+чтобы у каждой задачи были свои этапы, счётчики и итог (их видят и задачи asyncio, и asyncio.to_thread).
+
+Дополнения подключаются через on_start/on_finish: метрики Prometheus (my_openmetrics), профиль (my_profiler),
+запись и воспроизведение HTTP (my_http_record). Модуль дополнения импортируется только если задана
+его переменная окружения (PLUGINS) и сам регистрирует свои обработчики.
+'''
+import os
+import sys
+import json
+import time
+import atexit
+import socket
+import logging
+import re
+import threading
+import contextvars
+from datetime import datetime
+from contextlib import ContextDecorator
+from urllib.parse import urlsplit
+from importlib import import_module
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# my packages
+from .env_loader import *
+from .my_lazy import when_imported
+
+JOB_RUNS_LOG = os.getenv('JOB_RUNS_LOG') or os.path.join(os.getenv('LOGS_PATH', './logs'), 'job_runs.jsonl')
+JOB_RUNS_TABLE = os.getenv('JOB_RUNS_TABLE', 'job_runs')
+# 0 - не писать итог запуска в Postgres (например, локально без БД)
+JOB_RUNS_TO_DB = os.getenv('JOB_RUNS_TO_DB', '1') == '1'
+
+# (переменная окружения, модуль utils): модуль импортируется в start_job, если переменная задана и не '0'
+PLUGINS = (
+    ('METRICS_TEXTFILE_DIR', 'my_openmetrics'),
+    ('PUSHGATEWAY_URL', 'my_openmetrics'),
+    ('PROFILE', 'my_profiler'),
+    ('HTTP_RECORD', 'my_http_record'),
+    ('HTTP_REPLAY', 'my_http_record'),
+)
+
+_lock = threading.Lock()
+_local = threading.local()
+_start_hooks = []   # (hook, ключ итога)
+_finish_hooks = []
+_exit_hooked = False
+
+
+class _RunState:
+    '''Учёт одного запуска: этапы, счётчики, гистограммы, данные задачи и функции остановки дополнений.'''
+
+    def __init__(self):
+        self.spans = {}         # 'этап/подэтап' -> {'count', 'seconds', 'max_seconds'}
+        self.counters = {}      # (имя, ((метка, значение), ...)) -> значение
+        self.histograms = {}    # (имя, метки) -> {'bounds', 'buckets': [кол-во по корзинам], 'count', 'sum'}
+        self.job = None
+        self.stops = []         # (ключ итога, функция остановки)
+
+
+_process_state = _RunState()
+_current_state = contextvars.ContextVar('my_metrics_state', default=None)
+
+
+def _state():
+    return _current_state.get() or _process_state
+
+
+def isolate_run():
+    '''
+    Отдельный учёт для текущего контекста (потока задачи в планировщике) вместо общего на процесс.
+    Новые потоки начинают с пустого контекста, поэтому вызывается в начале потока задачи.
+    '''
+    _current_state.set(_RunState())
+
+
+# -------------------------------- ЭТАПЫ --------------------------------
+
+
+class span(ContextDecorator):
+    '''
+    Замер этапа: контекстный менеджер или декоратор.
+    Вложенные этапы складываются по пути 'внешний/внутренний', повторные вызовы суммируются.
+    Без имени декоратор берёт имя функции.
+    '''
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = func.__name__
+        return super().__call__(func)
+
+    def _recreate_cm(self):
+        # отдельный экземпляр на вызов: декорированная функция может выполняться в нескольких потоках
+        return span(self.name)
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        _local.stack.pop()
+        spans = _state().spans
+        with _lock:
+            stat = spans.get(self.path)
+            if stat is None:
+                stat = spans[self.path] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+            stat['count'] += 1
+            stat['seconds'] += seconds
+            stat['max_seconds'] = max(stat['max_seconds'], seconds)
+        return False
+
+
+
+
+# -------------------------------- СЧЁТЧИКИ --------------------------------
+
+
+def count(name, value=1, **labels):
+    '''
+    Увеличивает счётчик name (с метками, например host=...) на value.
+    '''
+    key = (name, tuple(sorted(labels.items())))
+    counters = _state().counters
+    with _lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+# границы корзин гистограмм длительности HTTP-запросов, сек.
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def observe(name, value, buckets=HISTOGRAM_BUCKETS, **labels):
+    '''
+    Добавляет значение в гистограмму name (например, длительность запроса к эндпоинту).
+    '''
+    key = (name, tuple(sorted(labels.items())))
+    histograms = _state().histograms
+    with _lock:
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = {'bounds': buckets, 'buckets': [0] * len(buckets), 'count': 0, 'sum': 0.0}
+        for i, bound in enumerate(hist['bounds']):
+            if value <= bound:
+                hist['buckets'][i] += 1
+                break
+        hist['count'] += 1
+        hist['sum'] += value
+
+
+def host_of(url):
+    return urlsplit(str(url)).netloc or 'unknown'
+
+
+def endpoint_of(url):
+    '''
+    Путь запроса без query, числовые и длинные шестнадцатеричные сегменты заменены на :id,
+    чтобы запросы к одной ручке попадали в одну метку.
+    '''
+    path = urlsplit(str(url)).path or '/'
+    return re.sub(r'/(?:\d+|[0-9a-fA-F-]{16,})(?=/|$)', '/:id', path)
+
+
+def snapshot():
+    '''
+    Текущее состояние: {'spans': {путь: {...}}, 'counters': {имя: число или {'метка=значение': число}},
+    'histograms': {имя: {'метка=значение': {'count', 'sum', 'buckets': {граница: накопленное кол-во}}}}}.
+    '''
+    state = _state()
+    with _lock:
+        spans = {path: dict(stat, seconds=round(stat['seconds'], 3), max_seconds=round(stat['max_seconds'], 3))
+                 for path, stat in state.spans.items()}
+        counters = {}
+        for (name, labels), value in sorted(state.counters.items()):
+            value = round(value, 3) if isinstance(value, float) else value
+            if labels:
+                label = ','.join(f'{k}={v}' for k, v in labels)
+                counters.setdefault(name, {})[label] = value
+            else:
+                counters[name] = value
+        histograms = {}
+        for (name, labels), hist in sorted(state.histograms.items()):
+            label = ','.join(f'{k}={v}' for k, v in labels)
+            cumulative, buckets = 0, {}
+            for bound, value in zip(hist['bounds'], hist['buckets']):
+                cumulative += value
+                buckets[str(bound)] = cumulative
+            histograms.setdefault(name, {})[label] = {
+                'count': hist['count'], 'sum': round(hist['sum'], 3), 'buckets': buckets,
+            }
+    return {'spans': spans, 'counters': counters, 'histograms': histograms}
+
+
+def reset():
+    state = _state()
+    with _lock:
+        state.spans.clear()
+        state.counters.clear()
+        state.histograms.clear()
+
+
+
+
+# -------------------------------- ХУКИ: HTTP, ЛОГИ, БД --------------------------------
+
+
+class _LogCounter(logging.Handler):
+    '''Считает предупреждения и ошибки логов запущенной задачи.'''
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+
+    def emit(self, record):
+        if _state().job is not None:
+            count('log_records', level=record.levelname)
+
+
+log_counter = _LogCounter()
+_http_hooked = False
+
+
+def _patch_requests(requests):
+    send = requests.Session.send
+
+    def counted_send(self, request, **kwargs):
+        host, endpoint = host_of(request.url), endpoint_of(request.url)
+        started = time.perf_counter()
+        try:
+            response = send(self, request, **kwargs)
+        except Exception:
+            count('http_errors', host=host, status='network')
+            raise
+        finally:
+            count('http_requests', host=host)
+            observe('http_request_seconds', time.perf_counter() - started, host=host, endpoint=endpoint)
+        if response.status_code >= 400:
+            count('http_errors', host=host, status=response.status_code)
+        return response
+
+    requests.Session.send = counted_send
+
+
+def _patch_aiohttp(aiohttp):
+    _request = aiohttp.ClientSession._request
+
+    async def counted_request(self, method, str_or_url, *args, **kwargs):
+        host, endpoint = host_of(str_or_url), endpoint_of(str_or_url)
+        started = time.perf_counter()
+        try:
+            response = await _request(self, method, str_or_url, *args, **kwargs)
+        except Exception:
+            count('http_errors', host=host, status='network')
+            raise
+        finally:
+            count('http_requests', host=host)
+            observe('http_request_seconds', time.perf_counter() - started, host=host, endpoint=endpoint)
+        if response.status >= 400:
+            count('http_errors', host=host, status=response.status)
+        return response
+
+    aiohttp.ClientSession._request = counted_request
+
+
+def _install_http_hooks():
+    '''
+    Оборачивает requests.Session.send и aiohttp.ClientSession._request:
+    счётчики запросов и ответов 429/ошибок по хостам, гистограмма длительности по эндпоинтам.
+    Библиотеки патчатся при первом использовании (my_lazy.when_imported), start_job их не загружает.
+    '''
+    global _http_hooked
+    if _http_hooked:
+        return
+    _http_hooked = True
+
+    for name, patch in (('requests', _patch_requests), ('aiohttp', _patch_aiohttp)):
+        try:
+            when_imported(name, patch)
+        except ImportError:
+            pass
+
+
+def _metrics_cursor_class():
+    from psycopg2.extensions import cursor as _pg_cursor
+
+    class MetricsCursor(_pg_cursor):
+        '''
+        Курсор psycopg2, считающий прочитанные и записанные строки (по статусу выполненной команды).
+        Подключается в create_connection через cursor_factory.
+        '''
+
+        def _count_rows(self):
+            if self.rowcount is None or self.rowcount < 0 or not self.statusmessage:
+                return
+            command = self.statusmessage.split(' ', 1)[0]
+            if command == 'SELECT':
+                count('db_rows_read', self.rowcount)
+            elif command in ('INSERT', 'UPDATE', 'DELETE', 'COPY', 'MERGE'):
+                count('db_rows_written', self.rowcount, command=command)
+
+        def execute(self, query, vars=None):
+            with span('db'):
+                result = super().execute(query, vars)
+            count('db_queries')
+            self._count_rows()
+            return result
+
+        def executemany(self, query, vars_list):
+            with span('db'):
+                result = super().executemany(query, vars_list)
+            count('db_queries')
+            self._count_rows()
+            return result
+
+        def copy_expert(self, sql, file, size=8192):
+            with span('db'):
+                result = super().copy_expert(sql, file, size)
+            count('db_queries')
+            self._count_rows()
+            return result
+
+    MetricsCursor.__qualname__ = 'MetricsCursor'
+    return MetricsCursor
+
+
+def __getattr__(name):
+    # MetricsCursor создаётся при первом обращении: импорт my_metrics не загружает psycopg2
+    if name == 'MetricsCursor':
+        global MetricsCursor
+        MetricsCursor = _metrics_cursor_class()
+        return MetricsCursor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+
+# -------------------------------- ИТОГ ЗАПУСКА --------------------------------
+
+
+def _install_exit_hooks():
+    # один раз на процесс: в планировщике start_job вызывается на каждый запуск задачи
+    global _exit_hooked
+    if _exit_hooked:
+        return
+    _exit_hooked = True
+    excepthook = sys.excepthook
+
+    def job_excepthook(exc_type, exc, tb):
+        job = _state().job
+        if job is not None and not issubclass(exc_type, KeyboardInterrupt):
+            job['status'] = 'failed'
+            job['error'] = f'{exc_type.__name__}: {exc}'[:1000]
+        elif job is not None:
+            job['status'] = 'interrupted'
+        excepthook(exc_type, exc, tb)
+
+    sys.excepthook = job_excepthook
+    atexit.register(finish_job)
+
+
+def _load_plugins():
+    # модули дополнений регистрируют обработчики при импорте; повторный импорт ничего не делает
+    for env, module in PLUGINS:
+        if os.getenv(env, '0') not in ('', '0'):
+            import_module(f'.{module}', __package__)
+
+
+def start_job(name=None):
+    '''
+    Начинает учёт запуска скрипта (по умолчанию имя - имя файла скрипта).
+    Итог записывается при завершении процесса; статус failed - если процесс упал с исключением.
+    '''
+    state = _state()
+    if state.job is not None:
+        return state.job
+    if name is None:
+        name = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+    state.job = {
+        'job': name,
+        'started_at': datetime.now(),
+        'started': time.perf_counter(),
+        'status': None,
+        'error': None,
+    }
+    _install_http_hooks()
+    root = logging.getLogger()
+    if log_counter not in root.handlers:
+        root.addHandler(log_counter)
+
+    _install_exit_hooks()
+    _load_plugins()
+
+    for hook, key in _start_hooks:
+        try:
+            stop = hook(name)
+        except Exception as e:
+            logging.warning(f"Ошибка обработчика начала запуска {hook.__name__}: {e!r}")
+            continue
+        if stop is not None:
+            state.stops.append((key, stop))
+    return state.job
+
+
+def on_start(hook, key=None):
+    '''
+    Регистрирует функцию hook(имя задачи), вызываемую в start_job (например, включение профайлера).
+    Если hook вернул функцию остановки, она вызывается в finish_job, а её непустой результат
+    попадает в итог запуска под ключом key.
+    '''
+    if all(hook is not registered for registered, _ in _start_hooks):
+        _start_hooks.append((hook, key))
+    return hook
+
+
+def on_finish(hook):
+    '''Регистрирует функцию hook(summary), вызываемую с итогом запуска (например, экспорт метрик).'''
+    if hook not in _finish_hooks:
+        _finish_hooks.append(hook)
+    return hook
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def finish_job(status=None, error=None):
+    '''
+    Завершает учёт запуска: JSON-строка в JOB_RUNS_LOG и в лог, строка в таблице job_runs.
+    Повторный вызов ничего не делает. Возвращает итог запуска.
+    '''
+    state = _state()
+    job, state.job = state.job, None
+    if job is None:
+        return None
+
+    results = {}
+    stops, state.stops = state.stops, []
+    for key, stop in stops:
+        try:
+            result = stop()
+        except Exception as e:
+            logging.warning(f"Ошибка остановки {getattr(stop, '__module__', stop)}: {e!r}")
+            continue
+        if result and key:
+            results[key] = result
+
+    data = snapshot()
+    errors = data['counters'].get('log_records', {}).get('level=ERROR', 0)
+    status = status or job['status'] or ('errors' if errors else 'ok')
+    summary = {
+        'job': job['job'],
+        'status': status,
+        'error': error or job['error'],
+        'started_at': job['started_at'].isoformat(timespec='seconds'),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_seconds': round(time.perf_counter() - job['started'], 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'spans': data['spans'],
+        'counters': data['counters'],
+        'histograms': data['histograms'],
+        **results,
+    }
+
+    line = json.dumps(summary, ensure_ascii=False, default=str)
+    try:
+        os.makedirs(os.path.dirname(JOB_RUNS_LOG) or '.', exist_ok=True)
+        with open(JOB_RUNS_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        logging.warning(f"Не удалось записать итог запуска в {JOB_RUNS_LOG}: {e}")
+    logging.info(f"job_run {line}")
+
+    if JOB_RUNS_TO_DB:
+        save_job_run(summary)
+    for hook in _finish_hooks:
+        try:
+            hook(summary)
+        except Exception as e:
+            logging.warning(f"Ошибка обработчика итога запуска {hook.__name__}: {e!r}")
+    return summary
+
+
+def save_job_run(summary, connection=None):
+    '''
+    Записывает итог запуска в таблицу job_runs (создаёт её при первом запуске).
+    Ошибки БД не роняют скрипт - только предупреждение в логе.
+    '''
+    from .my_db_functions import create_connection_w_env
+
+    own = connection is None
+    try:
+        connection = connection or create_connection_w_env()
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {JOB_RUNS_TABLE} (
+                    id bigserial PRIMARY KEY,
+                    job text NOT NULL,
+                    status text NOT NULL,
+                    error text,
+                    started_at timestamp NOT NULL,
+                    finished_at timestamp NOT NULL,
+                    duration_seconds double precision,
+                    peak_rss_mb double precision,
+                    host text,
+                    pid integer,
+                    spans jsonb,
+                    counters jsonb
+                )
+            ''')
+            cursor.execute(f'''
+                INSERT INTO {JOB_RUNS_TABLE}
+                    (job, status, error, started_at, finished_at, duration_seconds, peak_rss_mb, host, pid, spans, counters)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)
+            ''', (
+                summary['job'], summary['status'], summary['error'], summary['started_at'], summary['finished_at'],
+                summary['duration_seconds'], summary['peak_rss_mb'], summary['host'], summary['pid'],
+                json.dumps(summary['spans'], ensure_ascii=False), json.dumps(summary['counters'], ensure_ascii=False),
+            ))
+        connection.commit()
+    except Exception as e:
+        logging.warning(f"Не удалось записать итог запуска в {JOB_RUNS_TABLE}: {e!r}")
+    finally:
+        if own and connection is not None:
+            connection.close()
@@ -0,0 +1,221 @@
+'''
+Экспорт итогов запусков (my_metrics) в формате Prometheus: textfile collector node_exporter
+и/или Pushgateway.
+
+    METRICS_TEXTFILE_DIR=/var/lib/node_exporter/textfile   -> <dir>/<скрипт>.prom после каждого запуска
+    PUSHGATEWAY_URL=http://localhost:9091                   -> PUT /metrics/job/<скрипт>/instance/<хост>
+
+Счётчики Prometheus не должны убывать, а каждый запуск - новый процесс, поэтому значения
+копятся между запусками в METRICS_STATE_PATH/<скрипт>.json; метрики last_run_* - значения последнего запуска.
+Экспорт подключается к my_metrics.start_job() (on_finish), если задана хотя бы одна из переменных.
+'''
+import os
+import json
+import socket
+import logging
+from datetime import datetime
+
+# my packages
+from . import my_metrics
+from .env_loader import *
+
+METRICS_TEXTFILE_DIR = os.getenv('METRICS_TEXTFILE_DIR')
+PUSHGATEWAY_URL = os.getenv('PUSHGATEWAY_URL')
+METRICS_STATE_PATH = os.getenv('METRICS_STATE_PATH', './data/metrics_state')
+EXPORT_ENABLED = bool(METRICS_TEXTFILE_DIR or PUSHGATEWAY_URL)
+
+PREFIX = 'wb_job'
+# границы корзин гистограммы длительности запуска, сек.
+DURATION_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+HELP = {
+    'runs': 'Запуски скрипта по статусу',
+    'duration_seconds': 'Длительность запуска, сек.',
+    'stage_seconds': 'Время этапов (span), сек.',
+    'http_requests': 'HTTP-запросы по хостам',
+    'http_errors': 'HTTP-ответы с ошибкой и сетевые ошибки',
+    'http_retries': 'Повторы запросов к API WB (429, 5xx, сеть)',
+    'http_request_seconds': 'Длительность HTTP-запросов по эндпоинтам, сек.',
+    'rate_limit_wait_seconds': 'Ожидание лимитера запросов к API WB, сек.',
+    'sheets_requests': 'Запросы к Google Sheets API (чтение/запись)',
+    'sheets_errors': 'Ошибки Google Sheets API',
+    'sheets_bytes_written': 'Объём записи в Google Sheets, байт',
+    'sheets_quota_wait_seconds': 'Ожидание квоты Google Sheets, сек.',
+    'db_queries': 'Запросы к Postgres',
+    'db_rows_read': 'Строки, прочитанные из Postgres',
+    'db_rows_written': 'Строки, записанные в Postgres',
+    'log_records': 'Предупреждения и ошибки в логе',
+    'api_cache': 'Обращения к кэшу ответов API (hit/miss/replay)',
+}
+
+
+# -------------------------------- НАКОПЛЕНИЕ МЕЖДУ ЗАПУСКАМИ --------------------------------
+
+
+def _add_histogram(histograms, name, label, count, total, buckets):
+    hist = histograms.setdefault(name, {}).setdefault(label, {'count': 0, 'sum': 0.0, 'buckets': {}})
+    hist['count'] += count
+    hist['sum'] += total
+    for bound, value in buckets.items():
+        hist['buckets'][bound] = hist['buckets'].get(bound, 0) + value
+
+
+def accumulate(state, summary):
+    '''
+    Прибавляет итог запуска (my_metrics.finish_job) к накопленному состоянию скрипта.
+    '''
+    counters = state.setdefault('counters', {})
+    histograms = state.setdefault('histograms', {})
+
+    def add(name, label, value):
+        by_label = counters.setdefault(name, {})
+        by_label[label] = by_label.get(label, 0) + value
+
+    add('runs', f"status={summary['status']}", 1)
+    for path, stat in summary['spans'].items():
+        add('stage_seconds', f'stage={path}', stat['seconds'])
+    for name, value in summary['counters'].items():
+        for label, v in (value.items() if isinstance(value, dict) else [('', value)]):
+            add(name, label, v)
+
+    for name, by_label in summary.get('histograms', {}).items():
+        for label, hist in by_label.items():
+            _add_histogram(histograms, name, label, hist['count'], hist['sum'], hist['buckets'])
+    duration = summary['duration_seconds']
+    _add_histogram(histograms, 'duration_seconds', '', 1, duration,
+                   {str(bound): int(duration <= bound) for bound in DURATION_BUCKETS})
+
+    state['last_run'] = {
+        'duration_seconds': duration,
+        'timestamp_seconds': datetime.fromisoformat(summary['finished_at']).timestamp(),
+        'success': int(summary['status'] == 'ok'),
+        'peak_rss_bytes': int((summary['peak_rss_mb'] or 0) * 1024 * 1024),
+        'stage_seconds': {path: stat['seconds'] for path, stat in summary['spans'].items()},
+    }
+    return state
+
+
+def _state_path(job):
+    return os.path.join(METRICS_STATE_PATH, f'{job}.json')
+
+
+def load_state(job):
+    try:
+        with open(_state_path(job), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+
+
+# -------------------------------- ФОРМАТ ЭКСПОЗИЦИИ --------------------------------
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(script, label='', **extra):
+    # метка script, а не job: job занята Prometheus/Pushgateway
+    pairs = [('script', script)]
+    if label:
+        pairs += [pair.split('=', 1) for pair in label.split(',')]
+    pairs += extra.items()
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(job, state):
+    '''
+    Текст метрик скрипта в формате экспозиции Prometheus (text/plain; version=0.0.4).
+    '''
+    lines = []
+
+    def header(metric, name, kind):
+        lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {metric} {kind}")
+
+    last = state.get('last_run', {})
+    for name, kind in (('duration_seconds', 'gauge'), ('timestamp_seconds', 'gauge'),
+                       ('success', 'gauge'), ('peak_rss_bytes', 'gauge')):
+        if name in last:
+            metric = f'{PREFIX}_last_run_{name}'
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{_labels(job)} {_number(last[name])}")
+    if last.get('stage_seconds'):
+        metric = f'{PREFIX}_last_run_stage_seconds'
+        lines.append(f"# TYPE {metric} gauge")
+        for path, seconds in sorted(last['stage_seconds'].items()):
+            lines.append(f"{metric}{_labels(job, stage=path)} {_number(seconds)}")
+
+    for name, by_label in sorted(state.get('counters', {}).items()):
+        metric = f'{PREFIX}_{name}_total'
+        header(metric, name, 'counter')
+        for label, value in sorted(by_label.items()):
+            lines.append(f"{metric}{_labels(job, label)} {_number(value)}")
+
+    for name, by_label in sorted(state.get('histograms', {}).items()):
+        metric = f'{PREFIX}_{name}'
+        header(metric, name, 'histogram')
+        for label, hist in sorted(by_label.items()):
+            for bound, value in sorted(hist['buckets'].items(), key=lambda item: float(item[0])):
+                lines.append(f"{metric}_bucket{_labels(job, label, le=bound)} {value}")
+            lines.append(f"{metric}_bucket{_labels(job, label, le='+Inf')} {hist['count']}")
+            lines.append(f"{metric}_sum{_labels(job, label)} {_number(round(hist['sum'], 3))}")
+            lines.append(f"{metric}_count{_labels(job, label)} {hist['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+
+
+# -------------------------------- ЭКСПОРТ --------------------------------
+
+
+def push(job, text, url=PUSHGATEWAY_URL):
+    import requests
+
+    response = requests.put(
+        f"{url.rstrip('/')}/metrics/job/{job}/instance/{socket.gethostname()}",
+        data=text.encode('utf-8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4'},
+        timeout=10,
+    )
+    response.raise_for_status()
+
+
+def export(summary):
+    '''
+    Обработчик my_metrics.on_finish: копит итог запуска и выгружает метрики в textfile collector / Pushgateway.
+    Ошибки экспорта не роняют скрипт.
+    '''
+    job = summary['job']
+    state = accumulate(load_state(job), summary)
+    _write_atomic(_state_path(job), json.dumps(state, ensure_ascii=False))
+    text = render(job, state)
+
+    if METRICS_TEXTFILE_DIR:
+        # node_exporter читает только *.prom, временный файл ему не виден
+        _write_atomic(os.path.join(METRICS_TEXTFILE_DIR, f'{job}.prom'), text)
+    if PUSHGATEWAY_URL:
+        try:
+            push(job, text)
+        except Exception as e:
+            logging.warning(f"Не удалось отправить метрики {job} в Pushgateway: {e!r}")
+    return text
+
+
+if EXPORT_ENABLED:
+    my_metrics.on_finish(export)
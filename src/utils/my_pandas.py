@@ -1,6 +1,10 @@
-import pandas as pd
 from decimal import Decimal
 
+# my packages
+from .my_lazy import lazy_import
+
+pd = lazy_import('pandas')
+
 def convert_col_to_numeric(data):
     df = data.copy()
     obj_cols = df.select_dtypes(include='object').columns
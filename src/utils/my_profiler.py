@@ -0,0 +1,168 @@
+'''
+Профилирование запуска скрипта без правки кода: переменная окружения PROFILE.
+
+    PROFILE=1 python main/autopilot_hourly.py          - семплирующий профайлер + tracemalloc
+    PROFILE=cprofile python main/autopilot_hourly.py   - cProfile (точнее, но медленнее) + tracemalloc
+
+Подключается к my_metrics.start_job() (on_start), то есть во всех скриптах src/main. Результаты пишутся
+рядом с логами, в LOGS_PATH/profiles:
+    <скрипт>_<время>.collapsed - стеки в формате flamegraph.pl / speedscope / py-spy --format raw
+    <скрипт>_<время>.pstats    - статистика cProfile (PROFILE=cprofile), смотреть snakeviz / pstats
+    <скрипт>_<время>.txt       - топ функций и топ мест выделения памяти
+Семплер раз в PROFILE_INTERVAL сек. (по умолчанию 0.01) снимает стеки всех потоков из отдельного потока,
+поэтому накладные расходы малы и его можно изредка включать в проде; tracemalloc хранит PROFILE_MEMORY_FRAMES
+кадров на выделение (0 - не следить за памятью).
+'''
+import os
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# my packages
+from . import my_metrics
+from .env_loader import *
+
+PROFILE = os.getenv('PROFILE', '').lower()
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))
+PROFILE_MEMORY_FRAMES = int(os.getenv('PROFILE_MEMORY_FRAMES', 1))
+PROFILES_PATH = os.getenv('PROFILES_PATH') or os.path.join(os.getenv('LOGS_PATH', './logs'), 'profiles')
+PROFILE_TOP = 30
+
+_profile = None
+
+
+# -------------------------------- СЕМПЛЕР --------------------------------
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    '''
+    Семплирующий профайлер: фоновый поток раз в interval сек. снимает стеки всех потоков
+    (sys._current_frames) и считает одинаковые стеки.
+    '''
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=PROFILE_TOP):
+        '''Строки отчёта: функции по собственному и полному времени (в семплах).'''
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        all_samples = sum(self.stacks.values()) or 1
+        lines = [f"Семплов: {self.samples}, интервал {self.interval} сек.", '', 'Собственное время:']
+        lines += [f"{100 * c / all_samples:6.1f}%  {name}" for name, c in own.most_common(limit)]
+        lines += ['', 'Полное время (с вызываемыми функциями):']
+        lines += [f"{100 * c / all_samples:6.1f}%  {name}" for name, c in total.most_common(limit)]
+        return lines
+
+
+
+
+# -------------------------------- ЗАПУСК И ОТЧЁТ --------------------------------
+
+
+def start(job):
+    '''
+    Включает профилирование, если задан PROFILE. Возвращает функцию остановки (или None),
+    которая пишет файлы профиля и возвращает путь к отчёту.
+    '''
+    global _profile
+    if PROFILE in ('', '0') or _profile is not None:
+        return None
+
+    if PROFILE_MEMORY_FRAMES and not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILE_MEMORY_FRAMES)
+    if PROFILE == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler()
+        profiler.start()
+    _profile = {'job': job, 'profiler': profiler, 'started': time.perf_counter()}
+    return stop
+
+
+def stop(summary=None):
+    global _profile
+    profile, _profile = _profile, None
+    if profile is None:
+        return None
+
+    profiler = profile['profiler']
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+    else:
+        profiler.disable()
+
+    os.makedirs(PROFILES_PATH, exist_ok=True)
+    base = os.path.join(PROFILES_PATH, f"{profile['job']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    lines = [f"{profile['job']}: {time.perf_counter() - profile['started']:.1f} сек.", '']
+
+    if isinstance(profiler, StackSampler):
+        profiler.write_collapsed(f"{base}.collapsed")
+        lines += profiler.top()
+    else:
+        import io
+        import pstats
+        profiler.dump_stats(f"{base}.pstats")
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        lines.append(out.getvalue())
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics('lineno')
+        tracemalloc.stop()
+        lines += ['', f"Память (tracemalloc): сейчас {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ",
+                  'Топ мест выделения памяти:']
+        lines += [f"{stat.size / 2**20:9.2f} МБ  {stat.count:8d} блоков  {stat.traceback}" for stat in stats[:PROFILE_TOP]]
+
+    report = f"{base}.txt"
+    with open(report, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    logging.info(f"Профиль {profile['job']} записан: {base}.*")
+    return report
+
+
+my_metrics.on_start(start, 'profile')
@@ -1,9 +1,11 @@
-import requests
-import pandas as pd
-
 # my packages
 from . import my_db_functions as db
 from .utils import load_api_tokens
+from .my_general import wb_url
+from .my_lazy import lazy_import
+
+requests = lazy_import('requests')
+pd = lazy_import('pandas')
 
 def check_orders_region(sku, limit = 50):
     '''
@@ -42,7 +44,7 @@ def check_sku_price(sku, client_name):
     tokens = load_api_tokens()
     api_token = tokens[client_name]
     sku = int(sku)
-    url = 'https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter'
+    url = wb_url('https://discounts-prices-api.wildberries.ru/api/v2/list/goods/filter')
     params = {
             'limit': 10,
             'filterNmID': sku}
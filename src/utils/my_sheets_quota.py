@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from gspread.http_client import HTTPClient
+from gspread.exceptions import APIError
+
+try:
+    import fcntl
+except ImportError:     # Windows: общий бюджет только внутри процесса
+    fcntl = None
+
+# my packages
+from .env_loader import *
+from .my_metrics import count
+
+# Квоты Sheets API на пользователя (сервисный аккаунт): 60 чтений и 60 записей в минуту
+SHEETS_READ_PER_MINUTE = int(os.getenv('SHEETS_READ_PER_MINUTE', 60))
+SHEETS_WRITE_PER_MINUTE = int(os.getenv('SHEETS_WRITE_PER_MINUTE', 60))
+SHEETS_BURST = int(os.getenv('SHEETS_BURST', 10))
+SHEETS_QUOTA_PATH = os.getenv('SHEETS_QUOTA_PATH', './data/sheets_quota')
+
+SHEETS_RETRIES = 6
+SHEETS_BASE_DELAY = 2
+SHEETS_MAX_DELAY = 64
+RETRY_STATUSES = (429, 500, 502, 503)
+
+
+# -------------------------------- ОБЩИЙ БЮДЖЕТ ЗАПРОСОВ --------------------------------
+
+
+class SharedTokenBucket:
+    '''
+    Token bucket, состояние которого лежит в файле: все процессы (кроны), работающие
+    с одним сервисным аккаунтом, делят один бюджет запросов.
+    Доступ к файлу - под fcntl.flock; без fcntl бюджет общий только для потоков процесса.
+    '''
+
+    def __init__(self, path, rate, period=60.0, burst=None):
+        self.path = path
+        self.rate = rate
+        self.period = period
+        self.capacity = burst or 1
+        self._lock = threading.Lock()
+
+    def _take(self, f):
+        # возвращает 0, если токен взят, иначе сколько секунд подождать
+        f.seek(0)
+        try:
+            state = json.loads(f.read() or '{}')
+        except ValueError:
+            state = {}
+        now = time.time()
+        tokens = state.get('tokens', self.capacity)
+        updated_at = state.get('updated_at', now)
+        tokens = min(self.capacity, tokens + max(now - updated_at, 0) * self.rate / self.period)
+
+        wait = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) * self.period / self.rate
+
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps({'tokens': tokens, 'updated_at': now}))
+        f.flush()
+        return wait
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        while True:
+            with self._lock, open(self.path, 'a+', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    wait = self._take(f)
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            if not wait:
+                return
+            count('sheets_quota_wait_seconds', wait)
+            time.sleep(wait)
+
+
+_buckets = {}
+
+
+def get_bucket(account, kind):
+    '''
+    Бюджет запросов сервисного аккаунта: kind = 'read' или 'write'.
+    '''
+    key = (account, kind)
+    if key not in _buckets:
+        rate = SHEETS_READ_PER_MINUTE if kind == 'read' else SHEETS_WRITE_PER_MINUTE
+        name = hashlib.sha1(account.encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(SHEETS_QUOTA_PATH, f"{name}_{kind}.json")
+        _buckets[key] = SharedTokenBucket(path, rate, 60.0, SHEETS_BURST)
+    return _buckets[key]
+
+
+
+
+# -------------------------------- HTTP-КЛИЕНТ GSPREAD --------------------------------
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class QuotaHTTPClient(HTTPClient):
+    '''
+    HTTP-клиент gspread, через который идут все запросы к таблицам:
+    перед запросом берёт токен из общего бюджета аккаунта (чтение/запись),
+    на 429 и 5xx повторяет запрос с экспоненциальной задержкой и случайным разбросом.
+    Подключается через gspread.service_account(..., http_client=QuotaHTTPClient).
+    '''
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        self.account = getattr(auth, 'service_account_email', None) or 'default'
+
+    def request(self, method, endpoint, *args, **kwargs):
+        kind = 'read' if method.upper() == 'GET' else 'write'
+        bucket = get_bucket(self.account, kind)
+
+        for attempt in range(SHEETS_RETRIES + 1):
+            bucket.acquire()
+            count('sheets_requests', kind=kind)
+            try:
+                response = super().request(method, endpoint, *args, **kwargs)
+                if kind == 'write' and response.request.body:
+                    count('sheets_bytes_written', len(response.request.body))
+                return response
+            except APIError as e:
+                status = e.response.status_code
+                count('sheets_errors', status=status)
+                if status not in RETRY_STATUSES or attempt == SHEETS_RETRIES:
+                    raise
+                delay = _retry_after(e.response) or min(SHEETS_BASE_DELAY * 2 ** attempt, SHEETS_MAX_DELAY)
+                delay += random.uniform(0, 1)
+                logging.warning(f"Google Sheets: HTTP {status}, попытка {attempt + 1}/{SHEETS_RETRIES + 1}, повтор через {delay:.1f} сек.")
+                time.sleep(delay)
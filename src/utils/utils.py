@@ -1,28 +1,48 @@
+from __future__ import annotations
+
 import re
 import hashlib
 import json
-from pandas import DataFrame
-from gspread import worksheet
 from datetime import timedelta, datetime
-from gspread_dataframe import set_with_dataframe
 import psycopg2
 from psycopg2 import OperationalError
-from sqlalchemy import create_engine
-from typing import List
-from gspread.exceptions import APIError
+from typing import List, TYPE_CHECKING
 import time
 import logging
-import requests
+import threading
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 from .env_loader import *
+from .my_lazy import lazy_import
+from .my_gspread import get_headers
+from . import my_metrics
+
+# тяжёлые зависимости загружаются при первом использовании (см. my_lazy)
+pd = lazy_import('pandas')
+gspread = lazy_import('gspread')
+pytz = lazy_import('pytz')
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+    from gspread import worksheet
 
 TOKENS_PATH = os.getenv("TOKENS_PATH")
 
+_tokens_cache = {}
+
 # Функция для загрузки API токенов из файла tokens.json
 def load_api_tokens(filename = TOKENS_PATH):
-    with open(filename, encoding= 'utf-8') as f:
-        tokens = json.load(f)
-        return tokens
+    # файл перечитывается только при изменении: в долгоживущем процессе (scheduler) токены читает каждая задача
+    mtime = os.path.getmtime(filename)
+    cached = _tokens_cache.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, encoding= 'utf-8') as f:
+            cached = _tokens_cache[filename] = (mtime, json.load(f))
+    return dict(cached[1])
     
 def camel_to_snake(name):
     """
@@ -38,18 +58,51 @@ def camel_to_snake(name):
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
-def calculate_hash(record):
+HASH_METHODS = ('sha256', 'blake2b', 'xxhash')
+
+
+def _str_keys(value):
+    # ключи-не-строки (int, date ...) приводятся к str, чтобы сортировка ключей не падала на смешанных типах
+    if isinstance(value, dict):
+        return {k if isinstance(k, str) else str(k): _str_keys(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_str_keys(v) for v in value]
+    return value
+
+
+def canonical_json(record):
     """
-    Calculates a SHA-256 hash for a given record.
+    Serializes a record into compact JSON bytes with sorted keys.
+
+    Always uses the standard json module, so the bytes (and the hashes built from them) do not
+    depend on which optional packages are installed on the host. Non-string dict keys are converted with str().
+    """
+    return json.dumps(_str_keys(record), ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+
+def calculate_hash(record, method='sha256'):
+    """
+    Calculates a hash for a given record.
 
     Parameters:
     - record: A dictionary representing the record.
+    - method: 'sha256' (default, same values as the hashes already stored in the DB),
+      'blake2b' (16-byte digest) or 'xxhash' (xxh3_128, requires the xxhash package).
+      The fast methods hash the canonical_json() form and are stable between runs.
 
     Returns:
-    - A SHA-256 hash of the record's JSON string representation.
+    - A hex digest of the record's JSON representation.
     """
-    record_str = json.dumps(record, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(record_str.encode()).hexdigest()
+    if method == 'sha256':
+        record_str = json.dumps(record, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(record_str.encode()).hexdigest()
+    if method == 'blake2b':
+        return hashlib.blake2b(canonical_json(record), digest_size=16).hexdigest()
+    if method == 'xxhash':
+        if xxhash is None:
+            raise ImportError("Для method='xxhash' нужен пакет xxhash")
+        return xxhash.xxh3_128_hexdigest(canonical_json(record))
+    raise ValueError(f"Неизвестный метод хеширования: {method}. Доступны: {', '.join(HASH_METHODS)}")
 
 
 def batchify(data, batch_size):
@@ -67,11 +120,11 @@ def batchify(data, batch_size):
         yield data[i:i + batch_size]
 
 
-def prepare_nms_record(record, account_id):
+def prepare_nms_record(record, account_id, hash_method='sha256'):
     record.pop('photos', None)
     record['account_id'] = account_id
     record = {camel_to_snake(k): v for k, v in record.items() if k != 'photos'}
-    record['data_hash'] = calculate_hash(record)
+    record['data_hash'] = calculate_hash(record, hash_method)
     # Ensure 'dimensions', 'characteristics', and 'sizes' are JSON strings
     for key in ['dimensions', 'characteristics', 'sizes']:
         if key in record:
@@ -79,10 +132,10 @@ def prepare_nms_record(record, account_id):
     return record
 
 
-def prepare_campaign_record(record, account_id):
+def prepare_campaign_record(record, account_id, hash_method='sha256'):
     record['account_id'] = account_id
     record = {camel_to_snake(k): v for k, v in record.items()}
-    record['data_hash'] = calculate_hash(record)
+    record['data_hash'] = calculate_hash(record, hash_method)
     record['search_pluse_state'] = record.get('search_pluse_state', None)
     for key in ['auto_params', 'params', 'united_params']:
         if key in record:
@@ -92,8 +145,8 @@ def prepare_campaign_record(record, account_id):
     return record
 
 
-def prepare_account_record(record):
-    record['data_hash'] = calculate_hash(record)
+def prepare_account_record(record, hash_method='sha256'):
+    record['data_hash'] = calculate_hash(record, hash_method)
     return record
 
 
@@ -120,9 +173,96 @@ def map_colnames(colnames):
         'buyoutsSumRub': 'выкуплено всего, руб.',
     }
     return [col_name_mapping.get(cn, cn) for cn in colnames]
+# Ограничения Sheets API: запрос до 10 МБ - шлём куски заметно меньше
+SHEETS_CHUNK_MAX_BYTES = 2 * 1024 * 1024
+SHEETS_CHUNK_MAX_ROWS = 5000
+
+
+def df_to_sheet_rows(df, header=True):
+    """
+    Преобразует DataFrame в список строк для gspread поколоночно (без обхода каждой ячейки):
+    NaN/None -> '', числа остаются числами, даты -> 'YYYY-MM-DD HH:MM:SS', остальное (Decimal, date и т.п.) -> str.
+    """
+    columns = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if pd.api.types.is_bool_dtype(col) or pd.api.types.is_numeric_dtype(col):
+            col = col.astype(object).where(col.notna(), '')
+        elif pd.api.types.is_datetime64_any_dtype(col):
+            col = col.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        else:
+            mask = col.notna()
+            col = col.astype(str).where(mask, '')
+        columns.append(col.to_numpy(dtype=object))
+
+    rows = pd.DataFrame(dict(enumerate(columns)), index=range(len(df))).values.tolist() if columns else [[] for _ in range(len(df))]
+    if header:
+        rows = [[str(c) for c in df.columns]] + rows
+    return rows
+
+
+def iter_row_chunks(rows, max_bytes=SHEETS_CHUNK_MAX_BYTES, max_rows=SHEETS_CHUNK_MAX_ROWS):
+    """
+    Делит строки на куски не больше max_rows строк и примерно max_bytes байт (по размеру json).
+    """
+    chunk, size = [], 0
+    for row in rows:
+        row_size = len(json.dumps(row, ensure_ascii=False, default=str)) + 1
+        if chunk and (len(chunk) >= max_rows or size + row_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+
+def upload_rows_chunked(sheet, rows, start_row=1, value_input_option='USER_ENTERED',
+                        max_bytes=SHEETS_CHUNK_MAX_BYTES, max_rows=SHEETS_CHUNK_MAX_ROWS):
+    """
+    Записывает строки на лист, начиная со строки start_row, кусками ограниченного размера.
+    Сетка листа расширяется один раз заранее (а не при каждой записи),
+    поэтому ошибка лимита ячеек возникает до записи первых данных.
+    Возвращает номер строки, следующей за записанными.
+    """
+    if not rows:
+        return start_row
+
+    width = max(len(row) for row in rows)
+    last_row = start_row + len(rows) - 1
+    if sheet.row_count < last_row:
+        sheet.add_rows(last_row - sheet.row_count)
+    if sheet.col_count < width:
+        sheet.add_cols(width - sheet.col_count)
+
+    row_num = start_row
+    for chunk in iter_row_chunks(rows, max_bytes, max_rows):
+        sheet.update(chunk, f"A{row_num}", value_input_option=value_input_option)
+        row_num += len(chunk)
+    return row_num
+
+
+def append_rows_chunked(sheet, rows, value_input_option='USER_ENTERED',
+                        max_bytes=SHEETS_CHUNK_MAX_BYTES, max_rows=SHEETS_CHUNK_MAX_ROWS):
+    """
+    Дописывает строки в конец таблицы на листе (append_rows) кусками ограниченного размера.
+    Место вставки определяет Google, как и при одном вызове append_rows.
+    """
+    for chunk in iter_row_chunks(rows, max_bytes, max_rows):
+        sheet.append_rows(chunk, value_input_option=value_input_option)
+
+
+def _mark_update_time(sheet):
+    # Записываем дату и время в первую строку последней колонки
+    formatted_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sheet.update_cell(1, sheet.col_count, formatted_time)
+    print(f"Дата и время последнего обновления: {formatted_time}")
+
+
 def send_df_to_google(df, sheet):
     """
     Отправляет DataFrame на указанный лист Google Таблицы.
+    Данные дописываются в конец таблицы кусками (append_rows_chunked).
 
     Параметры:
     df (DataFrame): DataFrame, который нужно отправить.
@@ -132,37 +272,17 @@ def send_df_to_google(df, sheet):
     None
     """
     try:
-        # Данные, которые нужно добавить
-        df_data_to_append = [df.columns.values.tolist()] + df.values.tolist()
-        
-        # Проверка существующих данных на листе
-        existing_data = sheet.get_all_values()
+        # Проверка существующих данных на листе (достаточно первой колонки)
+        existing_rows = len(sheet.col_values(1))
         
-        if len(existing_data) <= 1:  # Если данных нет
+        if existing_rows <= 1:  # Если данных нет
             print("Добавляем заголовки и данные")
-            sheet.append_rows(df_data_to_append, value_input_option='USER_ENTERED')
-             # Получаем текущую дату и время
-            now = datetime.now()
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Получаем количество колонок на листе
-            max_columns = sheet.col_count
-            
-            # Записываем дату и время в первую строку последней колонки
-            sheet.update_cell(1, max_columns, formatted_time)
-            print(f"Дата и время последнего обновления: {formatted_time}")
+            append_rows_chunked(sheet, df_to_sheet_rows(df, header=True))
         else:
             print("Добавляем только данные")
-            sheet.append_rows(df_data_to_append[1:], value_input_option='USER_ENTERED')
-            now = datetime.now()
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Получаем количество колонок на листе
-            max_columns = sheet.col_count
-            
-            # Записываем дату и время в первую строку последней колонки
-            sheet.update_cell(1, max_columns, formatted_time)
-            print(f"Дата и время последнего обновления: {formatted_time}")
+            append_rows_chunked(sheet, df_to_sheet_rows(df, header=False))
+
+        _mark_update_time(sheet)
             
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -170,13 +290,10 @@ def send_df_to_google(df, sheet):
 
 
 
-import gspread
-from gspread_dataframe import set_with_dataframe
-import pandas as pd
 
 def update_df_in_google(df: pd.DataFrame, sheet):
     """
-    Перезаписывает данные DataFrame на указанный лист Google Таблицы.
+    Перезаписывает данные DataFrame на указанный лист Google Таблицы (кусками, см. upload_rows_chunked).
     Также добавляет дату и время последнего обновления в первую строку последней колонки.
     
     Параметры:
@@ -187,9 +304,6 @@ def update_df_in_google(df: pd.DataFrame, sheet):
     None
     """
     try:
-        # Обрабатываем NaN значения в DataFrame (заменяем на пустые строки)
-        df = df.fillna('')
-
         # Проверка на наличие новых данных
         if df.empty:
             print("DataFrame пуст. Создание резервной копии...")
@@ -199,31 +313,22 @@ def update_df_in_google(df: pd.DataFrame, sheet):
             print("Создана резервная копия текущих данных.")
             return  # Прекращаем выполнение, чтобы не перезаписывать пустыми данными
 
+        # Подготовка данных для записи (NaN -> пустые строки)
+        rows = df_to_sheet_rows(df, header=True)
+
         # Очищаем лист перед записью новых данных
         sheet.clear()
 
-        # Подготовка данных для записи
-        df_data_to_append = [df.columns.values.tolist()] + df.values.tolist()
-
         # Запись данных на лист
-        sheet.append_rows(df_data_to_append, value_input_option='USER_ENTERED')
+        upload_rows_chunked(sheet, rows, start_row=1)
         print("Данные успешно перезаписаны на лист.")
         
-        # Получаем текущую дату и время
-        now = datetime.now()
-        formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Получаем количество колонок на листе
-        max_columns = sheet.col_count
-        
-        # Записываем дату и время в первую строку последней колонки
-        sheet.update_cell(1, max_columns, formatted_time)
-        print(f"Дата и время последнего обновления: {formatted_time}")
+        _mark_update_time(sheet)
 
     except Exception as e:
         print(f"Произошла ошибка: {e}")
         # Проверяем на ошибку, связанную с лимитом ячеек
-        if "APIError: [400]: This action would increase the number of cells in the workbook" in str(e):
+        if "This action would increase the number of cells in the workbook" in str(e):
             print("Превышен лимит ячеек Google Таблицы. Создание резервной копии в Excel...")
             # Создание резервной копии данных в Excel
             backup_file = f"Копия БД тестовых заданий {datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.xlsx"
@@ -231,52 +336,100 @@ def update_df_in_google(df: pd.DataFrame, sheet):
             print(f"Данные сохранены в резервную копию: {backup_file}")
 
 
-def send_unique_id_to_google(df: DataFrame, sheet: worksheet):
+SHEET_ID_INDEX_PATH = os.getenv("SHEET_ID_INDEX_PATH", "./data/sheet_id_index")
+
+
+def _id_index_file(sheet, id_col):
+    return os.path.join(SHEET_ID_INDEX_PATH, f"{sheet.spreadsheet_id}_{sheet.id}_{id_col}.json")
+
+
+def load_sheet_ids(sheet, id_col='id', rebuild=False):
+    """
+    Возвращает (множество id на листе, кол-во заполненных строк в колонке id вместе с заголовком,
+    значение в последней из этих строк).
+    Читается только колонка id: целиком - при первом вызове или rebuild=True,
+    дальше - от последней строки сохранённого индекса вниз (строки, дописанные другими процессами).
+    Если в последней строке индекса теперь другое значение (строки удаляли, лист сортировали
+    или очищали), индекс пересобирается по всей колонке.
+    """
+    headers = get_headers(sheet)
+    if not headers:
+        return set(), 0, None
+    if id_col not in headers:
+        raise ValueError(f"Колонка '{id_col}' не найдена на листе '{sheet.title}'")
+
+    col_letter = gspread.utils.rowcol_to_a1(1, headers.index(id_col) + 1)[:-1]
+    path = _id_index_file(sheet, id_col)
+
+    if not rebuild and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        rows = index['rows']
+        values = [row[0] if row else '' for row in sheet.get(f"{col_letter}{rows}:{col_letter}")] if rows else []
+        if values and values[0] == index.get('last'):
+            ids = set(index['ids'])
+            ids.update(value for value in values[1:] if value)
+            return ids, rows + len(values) - 1, values[-1]
+        if rows:
+            logging.warning(f"{sheet.title}: лист изменился с момента сохранения индекса id, индекс пересобирается")
+
+    values = sheet.col_values(headers.index(id_col) + 1)
+    return set(values[1:]), len(values), values[-1] if values else None
+
+
+def save_sheet_ids(sheet, ids, rows, last, id_col='id'):
+    """
+    Сохраняет индекс id листа (см. load_sheet_ids); last - значение в строке rows колонки id.
+    """
+    os.makedirs(SHEET_ID_INDEX_PATH, exist_ok=True)
+    path = _id_index_file(sheet, id_col)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'rows': rows, 'last': last, 'ids': sorted(ids)}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def send_unique_id_to_google(df: DataFrame, sheet: worksheet, id_col: str = 'id', use_index: bool = True):
     """
-    Отправляет DataFrame на указанный лист Google Таблицы, добавляя только уникальные строки по столбцу 'parametr'.
+    Отправляет DataFrame на указанный лист Google Таблицы, добавляя только строки с новыми id.
+    Существующие id берутся из индекса листа (load_sheet_ids), а не из всего листа,
+    поэтому стоимость проверки не растёт вместе с историей на листе.
 
     Параметры:
     df (DataFrame): DataFrame, который нужно отправить.
     sheet (gspread.models.Worksheet): Объект листа, на который будут добавлены данные.
+    id_col (str): колонка с уникальным id.
+    use_index (bool): False - перечитать колонку id с листа целиком и пересобрать индекс.
 
     Возвращаемое значение:
     None
     """
     try:
-        # Получаем существующие данные с листа
-        existing_data = sheet.get_all_values()
-
-        # Проверяем, есть ли данные на листе
-        if len(existing_data) > 1:
-            # Получаем заголовки и существующие id
-            existing_headers = existing_data[0]
-            id_index = existing_headers.index('id')
-            existing_ids = {row[id_index] for row in existing_data[1:]}
-
-            # Фильтруем новые данные, оставляя только уникальные id
-            df_unique = df[~df['id'].astype(str).isin(existing_ids)]
-        else:
-            df_unique = df
-
-        if not df_unique.empty:
-            # Подготавливаем данные для добавления
-            df_data_to_append = [df_unique.columns.values.tolist()] + df_unique.values.tolist()
-            result = [[str(item).encode('utf-8').decode('utf-8') for item in row] for row in df_data_to_append]
+        # Получаем существующие id с листа
+        existing_ids, existing_rows, last_id = load_sheet_ids(sheet, id_col, rebuild=not use_index)
 
+        # Фильтруем новые данные, оставляя только уникальные id
+        new_ids = df[id_col].astype(str)
+        df_unique = df[~new_ids.isin(existing_ids)] if existing_rows > 1 else df
 
-            if len(existing_data) <= 1:
+        if not df_unique.empty:
+            if existing_rows <= 1:
                 print("Добавляем заголовки и данные")
-                sheet.append_rows(result, value_input_option='USER_ENTERED')
+                append_rows_chunked(sheet, df_to_sheet_rows(df_unique, header=True))
             else:
                 print("Добавляем только уникальные данные")
-                sheet.append_rows(result[1:], value_input_option='USER_ENTERED')
+                append_rows_chunked(sheet, df_to_sheet_rows(df_unique, header=False))
+            existing_ids.update(df_unique[id_col].astype(str))
         else:
             print("Нет уникальных данных для добавления")
 
+        # индекс сохраняется только после успешной записи; строки и последний id - прочитанные с листа:
+        # куда легли дописанные строки (и строки других процессов), покажет следующий load_sheet_ids
+        save_sheet_ids(sheet, existing_ids, existing_rows, last_id, id_col)
+
     except Exception as e:
         print(f"An error occurred: {e}")
 
-import pytz
 # Устанавливаем московское время
 # Функция для получения временной метки "за 24 часа назад"
 def get_udf():
@@ -307,9 +460,61 @@ def collect_for_all(function, tokens:dict):
             info_list.append(function(account, headers))
     return info_list
 
+# Пул соединений для долгоживущего процесса (scheduler): close() возвращает соединение в пул,
+# следующий create_connection с теми же параметрами получает его без нового подключения
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+_pool = None    # (база, пользователь, хост, порт) -> [свободные соединения]
+_pool_lock = threading.Lock()
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    def close(self):
+        key = getattr(self, 'pool_key', None)
+        if _pool is None or key is None or self.closed:
+            return super().close()
+        try:
+            self.reset()    # откат транзакции и RESET сессии
+            self.autocommit = False
+        except psycopg2.Error:
+            return super().close()
+        with _pool_lock:
+            idle = _pool.setdefault(key, [])
+            if len(idle) < DB_POOL_SIZE:
+                idle.append(self)
+                return
+        super().close()
+
+
+def enable_connection_pool():
+    global _pool
+    if _pool is None:
+        _pool = {}
+
+
+def _pooled_connection(key):
+    while True:
+        with _pool_lock:
+            idle = _pool.get(key)
+            if not idle:
+                return None
+            connection = idle.pop()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return connection
+        except psycopg2.Error:
+            psycopg2.extensions.connection.close(connection)
+
+
 # Подключение к базе данных
 def create_connection(db_name, db_user, db_password, db_host, db_port):
     connection = None
+    key = (db_name, db_user, db_host, db_port)
+    if _pool is not None:
+        connection = _pooled_connection(key)
+        if connection is not None:
+            return connection
     try:
         connection = psycopg2.connect(
             database=db_name,
@@ -317,7 +522,11 @@ def create_connection(db_name, db_user, db_password, db_host, db_port):
             password=db_password,
             host=db_host,
             port=db_port,
+            cursor_factory=my_metrics.MetricsCursor,
+            connection_factory=PooledConnection if _pool is not None else None,
         )
+        if _pool is not None:
+            connection.pool_key = key
         print(f"Соединение с БД PostgreSQL успешно установлено в {datetime.now().strftime('%Y-%m-%d')}")
     except OperationalError as error:
         print(f"Произошла ошибка при подключении к БД PostgreSQL {error}")
@@ -385,159 +594,3 @@ def get_db_table(db_query: str, connection):
         return df_db
     except Exception as e:
         print(f'Ошибка получения данных из БД {e}')
-
-import re
-import hashlib
-import json
-from pandas import DataFrame
-from gspread import worksheet
-import openpyxl
-from gspread_dataframe import set_with_dataframe
-import psycopg2
-from psycopg2 import OperationalError
-from sqlalchemy import create_engine
-from typing import List
-
-
-def camel_to_snake(name):
-    """
-    Converts a camelCase string to snake_case.
-
-    Parameters:
-    - name: The camelCase string to convert.
-
-    Returns:
-    - A snake_case version of the input string.
-    """
-    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
-    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
-
-
-def calculate_hash(record):
-    """
-    Calculates a SHA-256 hash for a given record.
-
-    Parameters:
-    - record: A dictionary representing the record.
-
-    Returns:
-    - A SHA-256 hash of the record's JSON string representation.
-    """
-    record_str = json.dumps(record, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(record_str.encode()).hexdigest()
-
-
-def batchify(data, batch_size):
-    """
-    Splits data into batches of a specified size.
-
-    Parameters:
-    - data: The list of items to be batched.
-    - batch_size: The size of each batch.
-
-    Returns:
-    - A generator yielding batches of data.
-    """
-    for i in range(0, len(data), batch_size):
-        yield data[i:i + batch_size]
-
-
-def prepare_nms_record(record, account_id):
-    record.pop('photos', None)
-    record['account_id'] = account_id
-    record = {camel_to_snake(k): v for k, v in record.items() if k != 'photos'}
-    record['data_hash'] = calculate_hash(record)
-    # Ensure 'dimensions', 'characteristics', and 'sizes' are JSON strings
-    for key in ['dimensions', 'characteristics', 'sizes']:
-        if key in record:
-            record[key] = json.dumps(record[key], ensure_ascii=False)
-    return record
-
-
-def prepare_campaign_record(record, account_id):
-    record['account_id'] = account_id
-    record = {camel_to_snake(k): v for k, v in record.items()}
-    record['data_hash'] = calculate_hash(record)
-    record['search_pluse_state'] = record.get('search_pluse_state', None)
-    for key in ['auto_params', 'params', 'united_params']:
-        if key in record:
-            record[key] = json.dumps(record[key], ensure_ascii=False)
-        else:
-            record[key] = None
-    return record
-
-
-def prepare_account_record(record):
-    record['data_hash'] = calculate_hash(record)
-    return record
-
-
-def map_colnames(colnames):
-    col_name_mapping = {
-        'dt': 'дата',
-        'month': 'месяц',
-        'week': 'неделя',
-        'nm_id': 'артикул',
-        'item_name': 'товар',
-        'campaign_name': 'название рк',
-        'campaign_id': 'номера рк',
-        'views': 'показы',
-        'clicks': 'клики',
-        'ad_spend': 'расходы',
-        'orders': 'заказы с рекламы',
-        'items_sold': 'продажи рк, шт.',
-        'sum_price': 'продажи рк, руб.',
-        'openCardCount': 'переход в карточку',
-        'addToCartCount': 'добавить в корзину',
-        'ordersCount': 'продажи всего, шт.',
-        'ordersSumRub': 'продажи всего, руб',
-        'buyoutsCount': 'выкуплено всего, шт.',
-        'buyoutsSumRub': 'выкуплено всего, руб.',
-    }
-    return [col_name_mapping.get(cn, cn) for cn in colnames]
-def send_df_to_google(df, sheet):
-    """
-    Отправляет DataFrame на указанный лист Google Таблицы.
-
-    Параметры:
-    df (DataFrame): DataFrame, который нужно отправить.
-    sheet (gspread.models.Worksheet): Объект листа, на который будут добавлены данные.
-
-    Возвращаемое значение:
-    None
-    """
-    try:
-        # Данные, которые нужно добавить
-        df_data_to_append = [df.columns.values.tolist()] + df.values.tolist()
-        
-        # Проверка существующих данных на листе
-        existing_data = sheet.get_all_values()
-        
-        if len(existing_data) <= 1:  # Если данных нет
-            print("Добавляем заголовки и данные")
-            sheet.append_rows(df_data_to_append, value_input_option='USER_ENTERED')
-             # Получаем текущую дату и время
-            now = datetime.now()
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Получаем количество колонок на листе
-            max_columns = sheet.col_count
-            
-            # Записываем дату и время в первую строку последней колонки
-            sheet.update_cell(1, max_columns, formatted_time)
-            print(f"Дата и время последнего обновления: {formatted_time}")
-        else:
-            print("Добавляем только данные")
-            sheet.append_rows(df_data_to_append[1:], value_input_option='USER_ENTERED')
-            now = datetime.now()
-            formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Получаем количество колонок на листе
-            max_columns = sheet.col_count
-            
-            # Записываем дату и время в первую строку последней колонки
-            sheet.update_cell(1, max_columns, formatted_time)
-            print(f"Дата и время последнего обновления: {formatted_time}")
-            
-    except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file